@@ -5,24 +5,158 @@ from flask import (
     url_for,
     render_template,
     render_template_string,
-    send_file,
     session,
     flash,
+    g,
+    jsonify,
+    has_app_context,
+    Response,
+    stream_with_context,
+    get_template_attribute,
+    abort,
+    send_file,
+    before_render_template,
+    template_rendered,
 )
+import queue
 import sqlite3
+import threading
+import time
+import hashlib
+import json
+import mimetypes
+import re
+import tempfile
 from datetime import datetime, date, timedelta
-import io
-from openpyxl import Workbook
 
-from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+from functools import lru_cache, wraps
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 import os
+import pathlib
+
+import instrumentation
+import static_assets
+from compression import CompressionMiddleware
 
 BASE_DIR = os.path.dirname(__file__)
-DB_PATH = os.path.join(BASE_DIR, "gate_app.db")
+DB_PATH = os.environ.get("GATE_APP_DB") or os.path.join(BASE_DIR, "gate_app.db")
+
+# Broj "toplih" konekcija koje jedan worker proces drži otvorene
+DB_POOL_SIZE = int(os.environ.get("GATE_APP_DB_POOL_SIZE", "5"))
+
+# Profili podešavanja SQLite-a. "wal" omogućava da čitanja (security
+# pregledi) i upisi (portirnica) ne blokiraju jedni druge.
+DB_PROFILES = {
+    "wal": {
+        "journal_mode": "wal",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -32000,  # u KiB (~32 MB)
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # ms
+    },
+    "rollback": {
+        "journal_mode": "delete",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -2000,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+}
+DB_PROFILE = os.environ.get("GATE_APP_DB_PROFILE", "wal")
 
 app = Flask(__name__)
 
+# HTML/JSON odgovori se sabijaju (gzip/deflate, br ako postoji paket brotli);
+# bajtovi po endpoint-u su na /admin/compression-stats
+compression = CompressionMiddleware(app.wsgi_app)
+app.wsgi_app = compression
+
+# Kompajlirani šabloni se čuvaju na disku i dele između FastCGI procesa:
+# novi worker posle recikliranja učitava bytecode umesto da ponovo parsira
+# i kompajlira Jinja šablone. Keš se sam poništava kada se šablon promeni.
+JINJA_CACHE_DIR = os.environ.get("GATE_APP_JINJA_CACHE") or os.path.join(
+    tempfile.gettempdir(), "gate_app_jinja"
+)
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_options = {
+    **app.jinja_options,
+    "bytecode_cache": FileSystemBytecodeCache(JINJA_CACHE_DIR),
+}
+
+
+def precompile_templates() -> int:
+    """Kompajlira sve šablone u bytecode keš (pri migraciji/deploy-u)."""
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=("html",)):
+        app.jinja_env.get_template(name)
+        count += 1
+    return count
+
+
+# Statički fajlovi sa otiskom sadržaja (static_assets.py): šabloni koriste
+# asset_url(), fajl se kešira godinu dana, a .gz varijanta ide browserima
+# koji je prihvataju. Heševi se računaju jednom po procesu.
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+@lru_cache(maxsize=1)
+def _asset_digests() -> dict:
+    return static_assets.compute_digests(app.static_folder)
+
+
+@app.template_global()
+def asset_url(filename: str) -> str:
+    digest = _asset_digests().get(filename)
+    if digest is None:
+        return url_for("static", filename=filename)
+    return url_for("asset", digest=digest, filename=filename)
+
+
+@lru_cache(maxsize=1)
+def _datatables_language() -> dict:
+    with open(os.path.join(app.static_folder, "vendor", "datatables", "i18n", "sr-SP.json"),
+              encoding="utf-8") as f:
+        return json.load(f)
+
+
+@app.template_global()
+def datatables_language() -> dict:
+    # prevod ide u stranicu, bez posebnog zahteva pri svakoj inicijalizaciji tabele
+    return _datatables_language()
+
+
+@app.route("/assets/<digest>/<path:filename>")
+def asset(digest: str, filename: str):
+    current = _asset_digests().get(filename)
+    if current is None:
+        abort(404)
+    path = safe_join(app.static_folder, filename)
+
+    encoding = None
+    if "gzip" in request.accept_encodings and os.path.exists(path + ".gz"):
+        encoding = "gzip"
+        path += ".gz"
+    response = send_file(
+        path,
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        conditional=True,
+        etag=f"{current}-{encoding or 'identity'}",
+        max_age=ASSET_MAX_AGE if digest == current else 0,
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if digest == current:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        # stara stranica traži fajl koji se u međuvremenu promenio
+        response.cache_control.no_cache = True
+    return response
+
 
 @app.template_filter('date_sr')
 def date_sr_filter(value):
@@ -69,16 +203,1018 @@ FORM_LOOKUP_CONFIG = {
 
 # DB helperi
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def _db_profile() -> dict:
+    try:
+        return DB_PROFILES[DB_PROFILE]
+    except KeyError:
+        raise RuntimeError(f"Nepoznat DB profil: {DB_PROFILE}")
+
+
+# Kolacija "SR" za imena i nazive: srpska abeceda (č, ć, dž, đ, lj, nj, š, ž
+# na svojim mestima, ćirilica poravnata sa latinicom), bez razlike velikih i
+# malih slova pri sortiranju. Registruje je samo aplikacija, pa se koristi
+# samo pri čitanju (ORDER BY ... COLLATE SR ili sr_sort_key), nikad u šemi –
+# bazu mora da otvori i sqlite3 CLI, backup i integrity_check.
+_SR_ALPHABET = [
+    "a", "b", "c", "č", "ć", "d", "dž", "đ", "e", "f", "g", "h", "i", "j", "k",
+    "l", "lj", "m", "n", "nj", "o", "p", "q", "r", "s", "š", "t", "u", "v",
+    "w", "x", "y", "z", "ž",
+]
+_SR_CYRILLIC = dict(zip(
+    "абвгдђежзијклљмнњопрстћуфхцчџш",
+    ["a", "b", "v", "g", "d", "đ", "e", "ž", "z", "i", "j", "k", "l", "lj", "m",
+     "n", "nj", "o", "p", "r", "s", "t", "ć", "u", "f", "h", "c", "č", "dž", "š"],
+))
+_SR_RANK = {letter: i for i, letter in enumerate(_SR_ALPHABET)}
+
+
+@lru_cache(maxsize=8192)
+def sr_sort_key(value: str) -> tuple:
+    text = value.casefold()
+    key = []
+    i = 0
+    while i < len(text):
+        pair = text[i:i + 2]
+        if pair in _SR_RANK and len(pair) == 2:
+            letter = pair
+            i += 2
+        else:
+            letter = _SR_CYRILLIC.get(text[i], text[i])
+            i += 1
+        rank = _SR_RANK.get(letter)
+        if rank is not None:
+            key.append(1000 + rank)
+        else:
+            # cifre i ASCII znakovi pre slova, ostala pisma posle
+            code = ord(letter)
+            key.append(code if code < 128 else 2000 + code)
+    return tuple(key)
+
+
+def sr_collate(a: str, b: str) -> int:
+    ka, kb = sr_sort_key(a), sr_sort_key(b)
+    if ka == kb:
+        ka, kb = a, b
+    return (ka > kb) - (ka < kb)
+
+
+def _connect():
+    profile = _db_profile()
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=profile["busy_timeout"] / 1000,
+        check_same_thread=False,
+        factory=instrumentation.InstrumentedConnection,
+        uri=True,  # ATTACH arhive sa file:...?mode=ro
+    )
     conn.row_factory = sqlite3.Row
+    conn.set_trace_callback(instrumentation.trace_statement)
+    conn.create_collation("SR", sr_collate)
+    # journal_mode je trajno podešavanje baze i postavlja ga init_db()
+    for name in ("synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+        conn.execute(f"PRAGMA {name} = {profile[name]}")
     return conn
 
 
-def init_db() -> None:
-    conn = get_db()
-    cur = conn.cursor()
+def check_db_profile(conn) -> dict:
+    """Vraća {pragma: (očekivano, stvarno)} za podešavanja koja odstupaju."""
+    profile = _db_profile()
+    expected = {
+        "journal_mode": profile["journal_mode"],
+        "synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}[profile["synchronous"]],
+        "cache_size": profile["cache_size"],
+        "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}[profile["temp_store"]],
+        "busy_timeout": profile["busy_timeout"],
+    }
+    mismatches = {}
+    for name, want in expected.items():
+        actual = conn.execute(f"PRAGMA {name}").fetchone()[0]
+        if isinstance(want, str):
+            actual = str(actual).lower()
+        if actual != want:
+            mismatches[name] = (want, actual)
+    return mismatches
+
+
+class ConnectionPool:
+    """Pool SQLite konekcija po worker procesu.
+
+    Konekcija se uzima na početku zahteva i vraća u pool u teardown-u,
+    tako da sledeći zahtev dobija već "toplu" konekciju (otvoren fajl,
+    popunjen page cache). Pre ponovne upotrebe konekcija se proverava
+    sa SELECT 1; neispravne se zatvaraju i otvaraju nove.
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.stats = {"acquired": 0, "opened": 0, "reused": 0, "discarded": 0}
+
+    def _check_pid(self) -> None:
+        # konekcije se ne smeju deliti između procesa
+        if self._pid != os.getpid():
+            self._idle = []
+            self._pid = os.getpid()
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        with self._lock:
+            self._check_pid()
+            self.stats["acquired"] += 1
+            while self._idle:
+                conn = self._idle.pop()
+                if self._is_healthy(conn):
+                    self.stats["reused"] += 1
+                    return conn
+                self.stats["discarded"] += 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self.stats["opened"] += 1
+        return _connect()
+
+    def release(self, conn) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._lock:
+                self.stats["discarded"] += 1
+            conn.close()
+            return
+
+        with self._lock:
+            self._check_pid()
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+db_pool = ConnectionPool()
+
+
+def get_db():
+    """Konekcija vezana za tekući zahtev (app context).
+
+    Rute ne zatvaraju konekciju same – vraća se u pool u close_db().
+    Van app context-a (skripte, init_db) vraća se obična nova konekcija
+    koju pozivalac zatvara.
+    """
+    if not has_app_context():
+        return _connect()
+    if "db" not in g:
+        with instrumentation.timed("connect_seconds"):
+            g.db = db_pool.acquire()
+        instrumentation.add("connections")
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(exc=None) -> None:
+    conn = g.pop("db", None)
+    if conn is not None:
+        db_pool.release(conn)
+
+
+# Latencija, broj SQL naredbi/konekcija i vreme renderovanja po endpoint-u
+# (instrumentation.py); čita se na /admin/metrics u Prometheus formatu.
+request_metrics = instrumentation.RequestMetrics()
+before_render_template.connect(instrumentation.template_started, app)
+template_rendered.connect(instrumentation.template_finished, app)
+
+
+@app.before_request
+def _begin_request_metrics() -> None:
+    instrumentation.begin_request()
+
+
+@app.teardown_request
+def _end_request_metrics(exc=None) -> None:
+    stats = instrumentation.end_request()
+    if stats is not None:
+        request_metrics.observe(request.endpoint or "-", stats)
+
+
+# Upisi sa kapije (ulaz/izlaz) podrazumevano idu direktno: commit po zahtevu
+# preko konekcije iz pool-a. Sa GATE_APP_GATE_WRITER=1 idu kroz jedan writer
+# thread po procesu: sve što se nakupi u redu dok traje prethodni commit
+# upisuje se u jednoj transakciji (group commit). To pomaže samo kada se
+# zahtevi preklapaju unutar procesa (threaded server); pod wfastcgi (jedan
+# zahtev po procesu) nema šta da se grupiše, pa je direktan upis brži
+# (benchmarks.py gate_processes).
+# GATE_WRITER_BATCH_MS > 0 dodatno čeka na grupu (veće grupe, veća latencija).
+GATE_WRITER_ENABLED = os.environ.get("GATE_APP_GATE_WRITER", "0") == "1"
+GATE_WRITER_BATCH_MS = float(os.environ.get("GATE_APP_WRITER_BATCH_MS", "0"))
+GATE_WRITER_MAX_BATCH = int(os.environ.get("GATE_APP_WRITER_MAX_BATCH", "200"))
+GATE_WRITER_TIMEOUT = float(os.environ.get("GATE_APP_WRITER_TIMEOUT", "10"))
+# prazno = synchronous iz DB profila (NORMAL); FULL samo ako je eksplicitno traženo
+GATE_WRITER_SYNCHRONOUS = os.environ.get("GATE_APP_WRITER_SYNCHRONOUS", "")
+
+
+class GateWrite:
+    """Jedan upis u redu čekanja; wait() se vraća kada je commit završen.
+
+    Stanje: queued -> running (writer ga je uzeo) ili queued -> cancelled
+    (wait() je istekao pre toga, pa ga writer preskače i ruta sme da javi
+    grešku bez straha da će upis ipak proći).
+    """
+
+    def __init__(self, sql: str, params=()):
+        self.sql = sql
+        self.params = params
+        self.rowcount = None
+        self.error = None
+        self._state = "queued"
+        self._state_lock = threading.Lock()
+        self._done = threading.Event()
+
+    def claim(self) -> bool:
+        """Writer uzima upis; False ako je pozivalac već odustao."""
+        with self._state_lock:
+            if self._state != "queued":
+                return False
+            self._state = "running"
+            return True
+
+    def cancel(self) -> bool:
+        """Povlači upis koji writer još nije uzeo."""
+        with self._state_lock:
+            if self._state != "queued":
+                return False
+            self._state = "cancelled"
+            return True
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def finish(self, rowcount=None, error=None) -> None:
+        self.rowcount = rowcount
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: float = None) -> int:
+        if not self._done.wait(GATE_WRITER_TIMEOUT if timeout is None else timeout):
+            if self.cancel():
+                raise sqlite3.OperationalError("Upis nije potvrđen na vreme")
+            # writer ga već upisuje – ishod (commit ili greška) stiže uskoro
+            self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.rowcount
+
+
+class GateWriter:
+    """Single-writer red za upise sa kapije, sa group commit-om.
+
+    Rute pozivaju execute() i dobijaju odgovor tek kada je njihov upis
+    commit-ovan. Ako grupa padne, svaki upis se ponavlja zasebno da
+    jedan neispravan upis ne obori ostale.
+    """
 
+    def __init__(self, batch_ms: float = GATE_WRITER_BATCH_MS, max_batch: int = GATE_WRITER_MAX_BATCH):
+        self.batch_ms = batch_ms
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.stats = {"events": 0, "batches": 0, "max_batch": 0, "errors": 0, "cancelled": 0}
+
+    def _ensure_thread(self) -> None:
+        # thread ne preživljava fork, pa se posle promene pid-a pokreće novi
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name="gate-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, sql: str, params=()) -> GateWrite:
+        self._ensure_thread()
+        write = GateWrite(sql, params)
+        self._queue.put(write)
+        return write
+
+    def execute(self, sql: str, params=(), timeout: float = None) -> int:
+        return self.submit(sql, params).wait(timeout)
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None and thread.is_alive():
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _collect(self, work_queue, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = work_queue.get(timeout=remaining) if remaining > 0 else work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                work_queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self, work_queue) -> None:
+        conn = _connect()
+        if GATE_WRITER_SYNCHRONOUS:
+            conn.execute(f"PRAGMA synchronous = {GATE_WRITER_SYNCHRONOUS}")
+        try:
+            while True:
+                first = work_queue.get()
+                if first is None:
+                    return
+                batch = self._collect(work_queue, first)
+                claimed = [w for w in batch if w.claim()]
+                self.stats["cancelled"] += len(batch) - len(claimed)
+                if not claimed:
+                    continue
+                try:
+                    self._write_batch(conn, claimed)
+                except Exception as exc:
+                    # thread mora da preživi; niko od pozivalaca ne sme da ostane da čeka
+                    app.logger.exception("Greška u gate writer-u")
+                    for write in claimed:
+                        if not write.done:
+                            write.finish(error=exc)
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch) -> None:
+        try:
+            with conn:
+                rowcounts = [conn.execute(w.sql, w.params).rowcount for w in batch]
+        except Exception:
+            # ponovo jedan po jedan, greška ide samo upisu koji ju je izazvao
+            for write in batch:
+                try:
+                    with conn:
+                        rowcount = conn.execute(write.sql, write.params).rowcount
+                except Exception as exc:
+                    self.stats["errors"] += 1
+                    write.finish(error=exc)
+                else:
+                    write.finish(rowcount)
+        else:
+            for write, rowcount in zip(batch, rowcounts):
+                write.finish(rowcount)
+        self.stats["events"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+
+gate_writer = GateWriter()
+
+
+class LookupCache:
+    """Keš vrednosti za padajuće menije (zaposleni, objekti, odredišta).
+
+    Svaka izmena tabele lookups (admin_lookups, load_lookups_from_excel.py)
+    preko trigera uvećava 'lookups_generation' u app_meta. Keš proverava
+    generaciju najviše jednom u check_interval sekundi, pa ostali FastCGI
+    procesi vide izmenu u tom roku, a forme između provera ne diraju SQLite.
+    """
+
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._values = None
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "checks": 0}
+
+    def _current_generation(self, conn) -> int:
+        row = conn.execute(
+            "SELECT value FROM app_meta WHERE key = 'lookups_generation'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get(self, lookup_type: str) -> list:
+        with self._lock:
+            now = time.monotonic()
+            if self._values is not None and now - self._checked_at < self.check_interval:
+                self.stats["hits"] += 1
+                return self._values.get(lookup_type, [])
+
+            conn = get_db()
+            self.stats["checks"] += 1
+            generation = self._current_generation(conn)
+            self._checked_at = now
+            if self._values is not None and generation == self._generation:
+                self.stats["hits"] += 1
+                return self._values.get(lookup_type, [])
+
+            self.stats["misses"] += 1
+            values = {}
+            for row in conn.execute(
+                "SELECT type, value FROM lookups WHERE active = 1 ORDER BY type, value"
+            ):
+                values.setdefault(row["type"], []).append({"value": row["value"]})
+            for items in values.values():
+                items.sort(key=lambda item: sr_sort_key(item["value"]))
+            self._values = values
+            self._generation = generation
+            return values.get(lookup_type, [])
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._values = None
+
+
+lookup_cache = LookupCache(float(os.environ.get("GATE_APP_LOOKUP_CHECK_SECONDS", "5")))
+
+
+# Indeksi za "vruće" upite. Parcijalni indeksi pokrivaju samo otvorene
+# posete i kamione na placu, pa rastu sa brojem aktivnih, a ne sa istorijom.
+DB_INDEXES = [
+    # security pregledi i export – opseg po datumu
+    "CREATE INDEX IF NOT EXISTS idx_visits_arrival ON visits (arrival_date, expected_time)",
+    # portirnica – današnje posete bez evidentiranog izlaza
+    """CREATE INDEX IF NOT EXISTS idx_visits_open ON visits (arrival_date, expected_time)
+       WHERE NOT (entry_time IS NOT NULL AND exit_time IS NOT NULL)""",
+    # moje najave
+    "CREATE INDEX IF NOT EXISTS idx_visits_created_by ON visits (created_by, arrival_date)",
+    "CREATE INDEX IF NOT EXISTS idx_trucks_arrival ON trucks (arrival_date, arrival_time)",
+    # kamioni na placu
+    """CREATE INDEX IF NOT EXISTS idx_trucks_on_site ON trucks (arrival_date, arrival_time)
+       WHERE departure_datetime IS NULL""",
+]
+
+
+# Full-text pretraga (FTS5) za tekstualne filtere. Tabele su "contentless"
+# (content=''), a trigeri ih drže u skladu sa visits/trucks. Tokenizer skida
+# dijakritike (Laković ≈ Lakovic); "đ" nema dekompoziciju pa se pre indeksiranja
+# menja u "dj", isto kao i u upitu (fts_normalize).
+FTS_TABLES = {
+    "visits": ("visits_fts", ("host_employee", "object_name", "guest_name", "vehicle_plate")),
+    "trucks": ("trucks_fts", ("driver_name", "codriver_name", "plate", "destination")),
+}
+
+
+def _fts_sql_value(column: str) -> str:
+    return f"replace(replace(COALESCE({column}, ''), 'đ', 'dj'), 'Đ', 'dj')"
+
+
+def fts_normalize(text: str) -> str:
+    return text.replace("đ", "dj").replace("Đ", "dj")
+
+
+def _init_fts(cur) -> None:
+    for table, (fts_table, columns) in FTS_TABLES.items():
+        exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).fetchone()
+
+        if not exists:
+            cur.execute(
+                f"""
+                CREATE VIRTUAL TABLE {fts_table} USING fts5(
+                    {", ".join(columns)},
+                    content='',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """
+            )
+            cur.execute(
+                f"""
+                INSERT INTO {fts_table} (rowid, {", ".join(columns)})
+                SELECT id, {", ".join(_fts_sql_value(c) for c in columns)} FROM {table}
+                """
+            )
+
+        column_list = ", ".join(columns)
+        new_values = ", ".join(_fts_sql_value(f"new.{c}") for c in columns)
+        old_values = ", ".join(_fts_sql_value(f"old.{c}") for c in columns)
+        delete_old = (
+            f"INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) "
+            f"VALUES ('delete', old.id, {old_values});"
+        )
+        insert_new = (
+            f"INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} "
+            f"BEGIN {insert_new} END"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} "
+            f"BEGIN {delete_old} END"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column_list} ON {table} "
+            f"BEGIN {delete_old} {insert_new} END"
+        )
+
+
+# Feed izmena za portirnicu: trigeri upisuju svaku promenu poseta i kamiona
+# u change_feed, a ekrani portirnice ih dobijaju preko SSE (/portirnica/stream).
+# Nove posete ulaze u feed samo ako su za danas – samo njih portirnica vidi.
+CHANGE_FEED_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS change_feed_visits_ai AFTER INSERT ON visits
+       WHEN new.arrival_date = date('now', 'localtime')
+       BEGIN
+           INSERT INTO change_feed (entity, entity_id, kind) VALUES ('visit', new.id, 'visit_announced');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS change_feed_visits_au AFTER UPDATE ON visits
+       BEGIN
+           INSERT INTO change_feed (entity, entity_id, kind) VALUES ('visit', new.id,
+               CASE
+                   WHEN old.entry_time IS NULL AND new.entry_time IS NOT NULL THEN 'visit_entry'
+                   WHEN old.exit_time IS NULL AND new.exit_time IS NOT NULL THEN 'visit_exit'
+                   ELSE 'visit_changed'
+               END);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS change_feed_visits_ad AFTER DELETE ON visits
+       BEGIN
+           INSERT INTO change_feed (entity, entity_id, kind) VALUES ('visit', old.id, 'visit_deleted');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS change_feed_trucks_ai AFTER INSERT ON trucks
+       BEGIN
+           INSERT INTO change_feed (entity, entity_id, kind) VALUES ('truck', new.id, 'truck_arrived');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS change_feed_trucks_au AFTER UPDATE ON trucks
+       BEGIN
+           INSERT INTO change_feed (entity, entity_id, kind) VALUES ('truck', new.id,
+               CASE
+                   WHEN old.departure_datetime IS NULL AND new.departure_datetime IS NOT NULL
+                       THEN 'truck_departed'
+                   ELSE 'truck_changed'
+               END);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS change_feed_trucks_ad AFTER DELETE ON trucks
+       BEGIN
+           INSERT INTO change_feed (entity, entity_id, kind) VALUES ('truck', old.id, 'truck_deleted');
+       END""",
+]
+
+# koliko dugo se čuvaju stavke feed-a (ekran koji je duže offline radi reload)
+CHANGE_FEED_KEEP_DAYS = 2
+
+
+def _init_change_feed(cur) -> None:
+    cur.execute(
+        """
+    CREATE TABLE IF NOT EXISTS change_feed (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at  TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+        entity      TEXT NOT NULL,
+        entity_id   INTEGER NOT NULL,
+        kind        TEXT NOT NULL
+    );
+    """
+    )
+    for trigger_sql in CHANGE_FEED_TRIGGERS:
+        cur.execute(trigger_sql)
+
+
+def prune_change_feed(conn) -> int:
+    """Briše stavke feed-a starije od CHANGE_FEED_KEEP_DAYS (archive_db.py)."""
+    deleted = conn.execute(
+        "DELETE FROM change_feed WHERE created_at < datetime('now', 'localtime', ?)",
+        (f"-{CHANGE_FEED_KEEP_DAYS} days",),
+    ).rowcount
+    conn.commit()
+    return deleted
+
+
+# Dnevnik kapije: svaki ulaz/izlaz je novi red u gate_events (samo INSERT).
+# Trigeri iz događaja popunjavaju entry_time/exit_time/departure_datetime,
+# a on_site drži samo ono što je trenutno u krugu, pa pitanja "ko je unutra"
+# zavise od broja prisutnih, a ne od istorije. Ručna ispravka vremena u
+# security pregledu je poseban red (in_fix/out_fix) sa novom vrednošću
+# (NULL = vreme obrisano) i operaterom; vremena su "YYYY-MM-DD HH:MM:SS".
+_GATE_EVENTS_TABLE_SQL = """
+    CREATE TABLE {name} (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity      TEXT NOT NULL CHECK (entity IN ('visit', 'truck')),
+        entity_id   INTEGER NOT NULL,
+        direction   TEXT NOT NULL CHECK (direction IN ('in', 'out', 'in_fix', 'out_fix')),
+        event_time  TEXT CHECK (event_time IS NOT NULL OR direction IN ('in_fix', 'out_fix')),
+        operator    TEXT,
+        recorded_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    )
+"""
+# vreme dolaska kamiona (datum + HH:MM) u formatu dnevnika
+_TRUCK_ARRIVAL = (
+    "COALESCE(datetime({row}.arrival_date || ' ' || {row}.arrival_time), "
+    "{row}.arrival_date || ' ' || {row}.arrival_time)"
+)
+
+GATE_EVENT_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS gate_events_no_update BEFORE UPDATE ON gate_events
+       BEGIN SELECT RAISE(ABORT, 'gate_events se ne menja'); END""",
+    """CREATE TRIGGER IF NOT EXISTS gate_events_no_delete BEFORE DELETE ON gate_events
+       BEGIN SELECT RAISE(ABORT, 'gate_events se ne briše'); END""",
+    # događaj -> kolone u visits/trucks (postojeći pregledi, export, feed)
+    """CREATE TRIGGER IF NOT EXISTS gate_events_visit_in AFTER INSERT ON gate_events
+       WHEN new.entity = 'visit' AND new.direction = 'in'
+       BEGIN
+           UPDATE visits SET entry_time = new.event_time
+           WHERE id = new.entity_id AND entry_time IS NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS gate_events_visit_out AFTER INSERT ON gate_events
+       WHEN new.entity = 'visit' AND new.direction = 'out'
+       BEGIN
+           UPDATE visits SET exit_time = new.event_time
+           WHERE id = new.entity_id AND exit_time IS NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS gate_events_truck_out AFTER INSERT ON gate_events
+       WHEN new.entity = 'truck' AND new.direction = 'out'
+       BEGIN
+           UPDATE trucks SET departure_datetime = new.event_time
+           WHERE id = new.entity_id AND departure_datetime IS NULL;
+       END""",
+    # ulazi koji nastaju samim unosom (gost bez najave, kamion na kapiji)
+    """CREATE TRIGGER IF NOT EXISTS gate_events_visits_ai AFTER INSERT ON visits
+       WHEN new.entry_time IS NOT NULL
+       BEGIN
+           INSERT INTO gate_events (entity, entity_id, direction, event_time, operator)
+           VALUES ('visit', new.id, 'in', new.entry_time, new.created_by);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS gate_events_trucks_ai AFTER INSERT ON trucks
+       BEGIN
+           INSERT INTO gate_events (entity, entity_id, direction, event_time, operator)
+           VALUES ('truck', new.id, 'in', """ + _TRUCK_ARRIVAL.format(row="new") + """, new.created_by);
+       END""",
+]
+
+# broj osoba u kamionu: vozač + suvozač ako je upisan
+_TRUCK_PERSONS = "CASE WHEN COALESCE({row}.codriver_name, '') != '' THEN 2 ELSE 1 END"
+
+# on_site prati stanje redova, pa je tačan i posle ručne izmene vremena
+# u security pregledima, a ne samo posle klika na kapiji
+_ON_SITE_VISIT = """
+    INSERT OR REPLACE INTO on_site (entity, entity_id, entered_at, location, persons)
+    SELECT 'visit', new.id, new.entry_time, new.object_name, COALESCE(new.persons_count, 1)
+    WHERE new.entry_time IS NOT NULL AND new.exit_time IS NULL;
+"""
+_ON_SITE_TRUCK = """
+    INSERT OR REPLACE INTO on_site (entity, entity_id, entered_at, location, persons)
+    SELECT 'truck', new.id, """ + _TRUCK_ARRIVAL.format(row="new") + """, new.destination,
+           """ + _TRUCK_PERSONS.format(row="new") + """
+    WHERE new.departure_datetime IS NULL;
+"""
+ON_SITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS on_site_visits_ai AFTER INSERT ON visits
+        BEGIN {_ON_SITE_VISIT} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS on_site_visits_au
+        AFTER UPDATE OF entry_time, exit_time, object_name, persons_count ON visits
+        BEGIN
+            DELETE FROM on_site WHERE entity = 'visit' AND entity_id = old.id;
+            {_ON_SITE_VISIT}
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS on_site_visits_ad AFTER DELETE ON visits
+       BEGIN DELETE FROM on_site WHERE entity = 'visit' AND entity_id = old.id; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS on_site_trucks_ai AFTER INSERT ON trucks
+        BEGIN {_ON_SITE_TRUCK} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS on_site_trucks_au
+        AFTER UPDATE OF departure_datetime, destination, arrival_date, arrival_time, codriver_name
+        ON trucks
+        BEGIN
+            DELETE FROM on_site WHERE entity = 'truck' AND entity_id = old.id;
+            {_ON_SITE_TRUCK}
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS on_site_trucks_ad AFTER DELETE ON trucks
+       BEGIN DELETE FROM on_site WHERE entity = 'truck' AND entity_id = old.id; END""",
+]
+
+
+def _table_exists(cur, name: str) -> bool:
+    return cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _init_gate_events(cur) -> None:
+    if not _table_exists(cur, "gate_events"):
+        cur.execute(_GATE_EVENTS_TABLE_SQL.format(name="gate_events"))
+        # postojeća istorija ulazi u dnevnik jednom, pre nego što trigeri postoje
+        cur.execute(
+            """
+            INSERT INTO gate_events (entity, entity_id, direction, event_time, operator)
+            SELECT entity, entity_id, direction, event_time, operator FROM (
+                SELECT 'visit' AS entity, id AS entity_id, 'in' AS direction,
+                       entry_time AS event_time, created_by AS operator
+                FROM visits WHERE entry_time IS NOT NULL
+                UNION ALL
+                SELECT 'visit', id, 'out', exit_time, NULL FROM visits WHERE exit_time IS NOT NULL
+                UNION ALL
+                SELECT 'truck', id, 'in', """ + _TRUCK_ARRIVAL.format(row="trucks") + """, created_by
+                FROM trucks
+                UNION ALL
+                SELECT 'truck', id, 'out', departure_datetime, NULL
+                FROM trucks WHERE departure_datetime IS NOT NULL
+            )
+            ORDER BY event_time
+            """
+        )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gate_events_entity ON gate_events (entity, entity_id)"
+    )
+
+    if not _table_exists(cur, "on_site"):
+        cur.execute(
+            """
+        CREATE TABLE on_site (
+            entity      TEXT NOT NULL,
+            entity_id   INTEGER NOT NULL,
+            entered_at  TEXT,
+            location    TEXT,
+            persons     INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (entity, entity_id)
+        ) WITHOUT ROWID;
+        """
+        )
+        cur.execute(
+            """
+            INSERT INTO on_site (entity, entity_id, entered_at, location, persons)
+            SELECT 'visit', id, entry_time, object_name, COALESCE(persons_count, 1)
+            FROM visits WHERE entry_time IS NOT NULL AND exit_time IS NULL
+            """
+        )
+        cur.execute(
+            """
+            INSERT INTO on_site (entity, entity_id, entered_at, location, persons)
+            SELECT 'truck', id, """ + _TRUCK_ARRIVAL.format(row="trucks") + """, destination, """
+            + _TRUCK_PERSONS.format(row="trucks")
+            + """
+            FROM trucks WHERE departure_datetime IS NULL
+            """
+        )
+
+    for trigger_sql in GATE_EVENT_TRIGGERS + ON_SITE_TRIGGERS:
+        cur.execute(trigger_sql)
+
+
+def _migrate_gate_event_fixes(cur) -> None:
+    """gate_events dobija in_fix/out_fix i recorded_at; ulaz kamiona ide sa sekundama.
+
+    Tabela se prepisuje (id-jevi ostaju), jer se CHECK ne menja ALTER-om.
+    Trigeri na visits/trucks koji pišu u gate_events ili on_site se brišu pre
+    prepisivanja i ponovo kreiraju, da bi dobili novi format vremena.
+    """
+    row = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'gate_events'").fetchone()
+    if row is not None and "in_fix" not in row[0]:
+        for name in ("gate_events_visits_ai", "gate_events_trucks_ai", "on_site_trucks_ai", "on_site_trucks_au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(_GATE_EVENTS_TABLE_SQL.format(name="gate_events_new"))
+        cur.execute(
+            """
+            INSERT INTO gate_events_new (id, entity, entity_id, direction, event_time, operator, recorded_at)
+            SELECT id, entity, entity_id, direction,
+                   CASE WHEN entity = 'truck' AND direction = 'in'
+                        THEN COALESCE(datetime(event_time), event_time) ELSE event_time END,
+                   operator, event_time
+            FROM gate_events ORDER BY id
+            """
+        )
+        cur.execute("DROP TABLE gate_events")
+        cur.execute("ALTER TABLE gate_events_new RENAME TO gate_events")
+        cur.execute(
+            "UPDATE on_site SET entered_at = COALESCE(datetime(entered_at), entered_at) WHERE entity = 'truck'"
+        )
+    _init_gate_events(cur)
+
+
+# Statistika za šefa obezbeđenja: dnevni i mesečni zbirovi (rollup) koje trigeri
+# ažuriraju kada se poseta ili kamion zatvori (izlaz/odlazak), a ispravka
+# ili brisanje zatvorenog zapisa oduzima njegov doprinos. Arhiviranje
+# (app_meta 'archiving') ne menja statistiku. Stranica i JSON čitaju samo
+# rollup tabele, pa višegodišnji opseg ne dira sirove redove.
+STATS_SOURCES = {
+    "visits": {
+        "closed": "{r}.entry_time IS NOT NULL AND {r}.exit_time IS NOT NULL",
+        "persons": "COALESCE({r}.persons_count, 1)",
+        "dwell": "CAST(ROUND((julianday({r}.exit_time) - julianday({r}.entry_time)) * 86400) AS INTEGER)",
+        "dimensions": [("visit_day", "''"), ("visit_host", "{r}.host_employee"), ("visit_object", "{r}.object_name")],
+        "columns": "entry_time, exit_time, persons_count, host_employee, object_name, arrival_date",
+    },
+    "trucks": {
+        "closed": "{r}.departure_datetime IS NOT NULL",
+        "persons": _TRUCK_PERSONS,
+        "dwell": (
+            "CAST(ROUND((julianday({r}.departure_datetime) "
+            "- julianday({r}.arrival_date || ' ' || {r}.arrival_time)) * 86400) AS INTEGER)"
+        ),
+        "dimensions": [("truck_day", "''"), ("truck_destination", "{r}.destination")],
+        "columns": "departure_datetime, destination, arrival_date, arrival_time, codriver_name",
+    },
+}
+
+
+# rollup tabela -> (kolona perioda, dužina prefiksa datuma)
+STATS_TABLES = {
+    "stats_daily": ("day", 10),
+    "stats_monthly": ("month", 7),
+}
+
+
+def _stats_select(table: str, r: str, sign: int = 1, period_len: int = 10, source: str = "(SELECT 1)") -> str:
+    """SELECT doprinosa reda za rollup (r = new/old u trigeru ili ime tabele)."""
+    spec = STATS_SOURCES[table]
+    dwell = spec["dwell"].format(r=r)
+    metrics = " UNION ALL ".join(f"SELECT '{metric}' AS metric" for metric, _ in spec["dimensions"])
+    dimension = " ".join(
+        f"WHEN '{metric}' THEN {expr.format(r=r)}" for metric, expr in spec["dimensions"]
+    )
+    return f"""
+        SELECT substr({r}.arrival_date, 1, {period_len}) AS period, d.metric AS metric,
+               COALESCE(CASE d.metric {dimension} END, '') AS dimension,
+               {sign} AS count,
+               {sign} * {spec["persons"].format(row=r, r=r)} AS persons,
+               {sign} * COALESCE({dwell}, 0) AS dwell_seconds,
+               {sign} * ({dwell} IS NOT NULL) AS dwell_count
+        FROM {source} CROSS JOIN ({metrics}) AS d
+        WHERE {spec["closed"].format(r=r)}
+    """
+
+
+_STATS_UPSERT = """
+    INSERT INTO {rollup} ({period}, metric, dimension, count, persons, dwell_seconds, dwell_count)
+    {select}
+      AND NOT EXISTS (SELECT 1 FROM app_meta WHERE key = 'archiving')
+    ON CONFLICT (metric, {period}, dimension) DO UPDATE SET
+        count = count + excluded.count,
+        persons = persons + excluded.persons,
+        dwell_seconds = dwell_seconds + excluded.dwell_seconds,
+        dwell_count = dwell_count + excluded.dwell_count;
+"""
+
+
+def _stats_triggers(table: str) -> list:
+    def upsert(r, sign):
+        return "".join(
+            _STATS_UPSERT.format(
+                rollup=rollup, period=period, select=_stats_select(table, r, sign, period_len)
+            )
+            for rollup, (period, period_len) in STATS_TABLES.items()
+        )
+
+    add_new, remove_old = upsert("new", 1), upsert("old", -1)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS stats_{table}_ai AFTER INSERT ON {table} BEGIN {add_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS stats_{table}_au "
+        f"AFTER UPDATE OF {STATS_SOURCES[table]['columns']} ON {table} BEGIN {remove_old} {add_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS stats_{table}_ad AFTER DELETE ON {table} BEGIN {remove_old} END",
+    ]
+
+
+def rebuild_stats(conn) -> None:
+    """Puni rollup tabele iznova iz žive baze i svih arhiva."""
+    conn.commit()
+    schemas = archive_schemas(conn, include_archive=True)
+    for rollup, (period, period_len) in STATS_TABLES.items():
+        conn.execute(f"DELETE FROM {rollup}")
+        for table in STATS_SOURCES:
+            source = table_source(conn, table, schemas)
+            conn.execute(
+                f"""
+                INSERT INTO {rollup} ({period}, metric, dimension, count, persons, dwell_seconds, dwell_count)
+                SELECT period, metric, dimension,
+                       SUM(count), SUM(persons), SUM(dwell_seconds), SUM(dwell_count)
+                FROM ({_stats_select(table, table, period_len=period_len, source=source)})
+                GROUP BY period, metric, dimension
+                """
+            )
+    conn.commit()
+
+
+def _init_stats(conn) -> None:
+    created = not _table_exists(conn, "stats_monthly")
+    for rollup, (period, _) in STATS_TABLES.items():
+        conn.execute(
+            f"""
+        CREATE TABLE IF NOT EXISTS {rollup} (
+            {period}       TEXT NOT NULL,
+            metric         TEXT NOT NULL,
+            dimension      TEXT NOT NULL,
+            count          INTEGER NOT NULL DEFAULT 0,
+            persons        INTEGER NOT NULL DEFAULT 0,
+            dwell_seconds  INTEGER NOT NULL DEFAULT 0,
+            dwell_count    INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, {period}, dimension)
+        ) WITHOUT ROWID;
+        """
+        )
+    for table in STATS_SOURCES:
+        for trigger_sql in _stats_triggers(table):
+            conn.execute(trigger_sql)
+    if created:
+        rebuild_stats(conn)
+
+
+def fts_match_query(terms) -> str:
+    """[(kolona ili None, tekst), ...] -> FTS5 MATCH izraz (prefiksna pretraga).
+
+    Vraća prazan string ako nijedan termin nema reči.
+    """
+    parts = []
+    for column, text in terms:
+        tokens = re.findall(r"\w+", fts_normalize(text or ""))
+        if not tokens:
+            continue
+        expr = " AND ".join(f'"{t}"*' for t in tokens)
+        parts.append(f"{column} : ({expr})" if column else f"({expr})")
+    return " AND ".join(parts)
+
+
+_LOOKUPS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id      INTEGER PRIMARY KEY AUTOINCREMENT,
+        type    TEXT NOT NULL,
+        value   TEXT NOT NULL,
+        active  INTEGER NOT NULL DEFAULT 1
+    )
+"""
+
+LOOKUP_INDEXES = [
+    # jedinstvena vrednost po tipu (BINARY: "Ana" i "ana" su različite)
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_lookups_type_value ON lookups (type, value)",
+    # padajući meniji čitaju samo aktivne vrednosti – pokrivajući parcijalni indeks
+    "CREATE INDEX IF NOT EXISTS idx_lookups_active ON lookups (type, value) WHERE active = 1",
+]
+
+
+def _init_lookups(cur) -> None:
+    """Kreira tabelu lookups ili migrira staru (bez active/UNIQUE).
+
+    Pri migraciji duplikati se spajaju u red sa najmanjim id-jem.
+    Trigeri nad starom tabelom nestaju sa njom i _migrate_lookups ih ponovo kreira.
+    """
+    if _table_exists(cur, "lookups") and "active" not in _table_columns(cur, "main", "lookups"):
+        cur.execute(_LOOKUPS_TABLE_SQL.format(name="lookups_new"))
+        cur.execute(
+            """
+            INSERT INTO lookups_new (id, type, value)
+            SELECT MIN(id), type, TRIM(value) FROM lookups
+            WHERE TRIM(value) <> ''
+            GROUP BY type, TRIM(value)
+            """
+        )
+        cur.execute("DROP TABLE lookups")
+        cur.execute("ALTER TABLE lookups_new RENAME TO lookups")
+        if _table_exists(cur, "app_meta"):
+            cur.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'lookups_generation'")
+    cur.execute(_LOOKUPS_TABLE_SQL.format(name="lookups"))
+    for index_sql in LOOKUP_INDEXES:
+        cur.execute(index_sql)
+
+
+# inicijalni korisnici – lozinka "1" (heš je unapred izračunat, seed ne
+# poziva generate_password_hash)
+DEFAULT_PASSWORD_HASH = (
+    "scrypt:32768:8:1$a2fJongDoCwwdJct$f7ecd981ee369a93630cb322c99507a70c555b2eed81510b5140b"
+    "34436da9a7b4e2fd13c5057dd7fed9fbc7375ba0d04a7b67a5b81eec703ce2de5b8d2bfd01a"
+)
+DEFAULT_USERS = [
+    ("nikola.lakovic@logistar.rs", "Nikola Laković", "admin"),
+    ("vlado.popovic@logistar.rs", "Vlado Popović", "employee"),
+    ("portirnica@logistar.rs", "Portirnica", "portirnica"),
+    ("dragisa.removic@logistar.rs", "Šef obezbeđenja", "security_chief"),
+]
+
+# inicijalne vrednosti za padajuće menije
+INITIAL_LOOKUPS = {
+    "employee": ["Maja Bogunović", "Olivera Radivojević", "Vlado Popović"],
+    "object": ["Upravna zgrada", "Skladište", "Gigatron", "Objekat 9"],
+}
+
+
+def _add_missing_columns(cur, table: str, columns: dict) -> None:
+    existing = set(_table_columns(cur, "main", table))
+    for name, decl in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _migrate_base_tables(cur) -> None:
     # POSETE
     cur.execute(
         """
@@ -95,13 +1231,14 @@ def init_db() -> None:
         note             TEXT,
         persons_count    INTEGER,
         entry_time       TEXT,
-        exit_time        TEXT
+        exit_time        TEXT,
+        created_by       TEXT,
+        status           TEXT
     );
     """
     )
 
     # KAMIONI
-
     cur.execute(
         """
     CREATE TABLE IF NOT EXISTS trucks (
@@ -110,34 +1247,20 @@ def init_db() -> None:
         driver_document         TEXT,
         codriver_name           TEXT,
         codriver_document       TEXT,
-        driver_phone            TEXT,         
+        driver_phone            TEXT,
         plate                   TEXT NOT NULL,
         destination             TEXT NOT NULL,
         arrival_date            TEXT NOT NULL,
         arrival_time            TEXT NOT NULL,
-        departure_datetime      TEXT
+        departure_datetime      TEXT,
+        created_by              TEXT
     );
     """
     )
 
-
-    try:
-        cur.execute("ALTER TABLE trucks ADD COLUMN driver_phone TEXT")
-    except sqlite3.OperationalError:
-
-        pass
-
-
-    # LOOKUP vrednosti (zaposleni, objekti, odredišta)
-    cur.execute(
-        """
-    CREATE TABLE IF NOT EXISTS lookups (
-        id      INTEGER PRIMARY KEY AUTOINCREMENT,
-        type    TEXT NOT NULL,
-        value   TEXT NOT NULL
-    );
-    """
-    )
+    # starije baze bez ovih kolona
+    _add_missing_columns(cur, "visits", {"created_by": "TEXT", "status": "TEXT"})
+    _add_missing_columns(cur, "trucks", {"driver_phone": "TEXT", "created_by": "TEXT"})
 
     # USERS – login + role
     cur.execute(
@@ -152,74 +1275,490 @@ def init_db() -> None:
     );
     """
     )
+    cur.executemany(
+        """
+        INSERT OR IGNORE INTO users (email, full_name, password_hash, role)
+        VALUES (?, ?, ?, ?)
+        """,
+        [(email, name, DEFAULT_PASSWORD_HASH, role) for email, name, role in DEFAULT_USERS],
+    )
+
+    # Brojači verzija (generacije) za keširane podatke, vidljivi svim procesima
+    cur.execute(
+        """
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key     TEXT PRIMARY KEY,
+        value   INTEGER NOT NULL DEFAULT 0
+    );
+    """
+    )
+    cur.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('lookups_generation', 0)")
+
+
+def _migrate_indexes(cur) -> None:
+    for index_sql in DB_INDEXES:
+        cur.execute(index_sql)
 
-    # inicijalni korisnici
-    default_users = [
-        ("nikola.lakovic@logistar.rs", "Nikola Laković", "admin"),
-        ("vlado.popovic@logistar.rs", "Vlado Popović", "employee"),
-        ("portirnica@logistar.rs", "Portirnica", "portirnica"),
-        ("dragisa.removic@logistar.rs", "Šef obezbeđenja", "security_chief"),
-    ]
 
-    for email, full_name, role in default_users:
+def _migrate_lookups(cur) -> None:
+    # LOOKUP vrednosti (zaposleni, objekti, odredišta)
+    _init_lookups(cur)
+    for event in ("INSERT", "UPDATE", "DELETE"):
         cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS lookups_generation_{event.lower()}
+            AFTER {event} ON lookups
+            BEGIN
+                UPDATE app_meta SET value = value + 1 WHERE key = 'lookups_generation';
+            END
             """
-            INSERT OR IGNORE INTO users (email, full_name, password_hash, role)
-            VALUES (?, ?, ?, ?)
-            """,
-            (email, full_name, generate_password_hash("1"), role),
+        )
+    # seed samo za tip koji još nema nijednu vrednost
+    for lookup_type, values in INITIAL_LOOKUPS.items():
+        if cur.execute("SELECT 1 FROM lookups WHERE type = ? LIMIT 1", (lookup_type,)).fetchone():
+            continue
+        cur.executemany(
+            "INSERT OR IGNORE INTO lookups (type, value) VALUES (?, ?)",
+            [(lookup_type, v) for v in values],
         )
 
 
-    # inicijalne vrednosti za padajuće menije
-    initial_employees = [
-        "Maja Bogunović",
-        "Olivera Radivojević",
-        "Vlado Popović",
-    ]
-    initial_objects = [
-        "Upravna zgrada",
-        "Skladište",
-        "Gigatron",
-        "Objekat 9",
-    ]
+def _migrate_lookups_collation(cur) -> None:
+    """lookups iz migracije 6 je imala COLLATE SR u šemi – tabela se prepisuje bez nje."""
+    row = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lookups'").fetchone()
+    if row is not None and "COLLATE SR" in row[0]:
+        cur.execute(_LOOKUPS_TABLE_SQL.format(name="lookups_new"))
+        cur.execute(
+            "INSERT INTO lookups_new (id, type, value, active) SELECT id, type, value, active FROM lookups"
+        )
+        cur.execute("DROP TABLE lookups")
+        cur.execute("ALTER TABLE lookups_new RENAME TO lookups")
+        cur.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'lookups_generation'")
+    # indeksi i trigeri su nestali sa starom tabelom
+    _migrate_lookups(cur)
 
 
-    has_emps = cur.execute(
-        "SELECT COUNT(*) AS cnt FROM lookups WHERE type = 'employee'"
-    ).fetchone()["cnt"]
-    if has_emps == 0:
-        cur.executemany(
-            "INSERT INTO lookups (type, value) VALUES ('employee', ?)",
-            [(e,) for e in initial_employees],
-        )
+def _init_import_files(cur) -> None:
+    # heš poslednjeg uvezenog fajla po izvoru (load_lookups_from_excel.py);
+    # app_meta ostaje samo za celobrojne brojače
+    cur.execute(
+        """
+    CREATE TABLE IF NOT EXISTS import_files (
+        source      TEXT PRIMARY KEY,
+        sha256      TEXT NOT NULL,
+        imported_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime'))
+    );
+    """
+    )
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO import_files (source, sha256)
+        SELECT 'lookups_excel', substr(value, 8) FROM app_meta
+        WHERE key = 'lookups_excel_sha256' AND value LIKE 'sha256:%'
+        """
+    )
+    cur.execute("DELETE FROM app_meta WHERE key = 'lookups_excel_sha256'")
+
+
+# Verzionisane migracije šeme. Verzija baze je u PRAGMA user_version, pa je
+# start procesa na ažurnoj bazi samo jedno čitanje tog broja. Nova izmena
+# šeme = nova stavka na kraju liste (postojeće se ne menjaju). Migracije su
+# idempotentne (IF NOT EXISTS, provera kolona), jer stare baze kreću od 0
+# iako već imaju deo šeme.
+SCHEMA_MIGRATIONS = [
+    (1, "visits, trucks, users, app_meta", _migrate_base_tables),
+    (2, "indeksi za vruće upite", _migrate_indexes),
+    (3, "FTS pretraga", _init_fts),
+    (4, "change_feed za live portirnicu", _init_change_feed),
+    (5, "gate_events i on_site", _init_gate_events),
+    (6, "lookups: UNIQUE, kolacija SR, active", _migrate_lookups),
+    (7, "statistika (rollup tabele)", _init_stats),
+    (8, "lookups: bez kolacije SR u šemi", _migrate_lookups_collation),
+    (9, "gate_events: ručne ispravke, vreme sa sekundama", _migrate_gate_event_fixes),
+    (10, "import_files (heš uvezenih fajlova)", _init_import_files),
+]
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate_db(conn) -> list:
+    """Pokreće migracije novije od verzije baze; vraća listu primenjenih.
+
+    Svaka migracija ide u svojoj BEGIN IMMEDIATE transakciji zajedno sa
+    podizanjem user_version, a verzija se proverava tek pod write lock-om,
+    pa više procesa koji startuju istovremeno ne primenjuje istu migraciju
+    dvaput.
+    """
+    applied = []
+    for version, description, migration in SCHEMA_MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        app.logger.info("Migracija baze %d: %s", version, description)
+        applied.append(version)
+    return applied
 
-    has_objs = cur.execute(
-        "SELECT COUNT(*) AS cnt FROM lookups WHERE type = 'object'"
-    ).fetchone()["cnt"]
-    if has_objs == 0:
-        cur.executemany(
-            "INSERT INTO lookups (type, value) VALUES ('object', ?)",
-            [(o,) for o in initial_objects],
+
+def init_db() -> None:
+    conn = _connect()
+    try:
+        version = schema_version(conn)
+        if version == 0:
+            # na novoj bazi omogućava PRAGMA incremental_vacuum posle arhiviranja
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute(f"PRAGMA journal_mode = {_db_profile()['journal_mode']}")
+        mismatches = check_db_profile(conn)
+        if mismatches:
+            app.logger.warning("SQLite profil '%s' nije primenjen: %s", DB_PROFILE, mismatches)
+
+        if version > SCHEMA_VERSION:
+            app.logger.warning(
+                "Baza je na verziji šeme %d, aplikacija zna do %d", version, SCHEMA_VERSION
+            )
+        elif version < SCHEMA_VERSION:
+            migrate_db(conn)
+            precompile_templates()
+    finally:
+        conn.close()
+
+
+# Arhiva: zatvorene posete i kamioni stariji od ARCHIVE_AFTER_DAYS sele se u
+# godišnje fajlove (archive/gate_app_<godina>.db). Živa baza ostaje mala, a
+# security pregledi i exporti ATTACH-uju godišnju arhivu samo kada filter
+# po datumu zalazi u tu godinu ili je uključeno "Uključi arhivu"; bez toga
+# čitaju samo živu bazu.
+ARCHIVE_DIR = os.environ.get("GATE_APP_ARCHIVE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "archive"
+)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("GATE_APP_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = 5000
+
+# tabela -> (uslov "zatvoren zapis", indeksi u arhivi)
+ARCHIVE_TABLES = {
+    "visits": (
+        "NOT (entry_time IS NOT NULL AND exit_time IS NULL)",
+        ["idx_visits_arrival ON visits (arrival_date, expected_time)"],
+    ),
+    "trucks": (
+        "departure_datetime IS NOT NULL",
+        ["idx_trucks_arrival ON trucks (arrival_date, arrival_time)"],
+    ),
+}
+
+_ARCHIVE_FILE = re.compile(r"^gate_app_(\d{4})\.db$")
+
+
+def archive_path(year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"gate_app_{year}.db")
+
+
+def archive_years() -> list:
+    """Godine za koje postoji arhivski fajl."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        int(m.group(1)) for m in map(_ARCHIVE_FILE.match, os.listdir(ARCHIVE_DIR)) if m
+    )
+
+
+def _table_columns(conn, schema: str, table: str) -> list:
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _attach_archive(conn, year: int, readonly: bool = True) -> str:
+    """ATTACH arhive na konekciju (jednom po konekciji).
+
+    Čitanje (security pregledi, export) otvara arhivu sa mode=ro i nikad ne
+    menja njenu šemu; kreiranje i usklađivanje šeme radi samo archive_closed.
+    """
+    schema = f"archive_{year}"
+    attached = {r[1] for r in conn.execute("PRAGMA database_list")}
+    if schema in attached:
+        return schema
+
+    path = archive_path(year)
+    if readonly:
+        path = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+    conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+    return schema
+
+
+def _upgrade_archive(conn, schema: str) -> None:
+    """Tabele, indeksi i FTS u arhivi; kolone dodate u živu bazu posle arhiviranja."""
+    for table in ARCHIVE_TABLES:
+        live = conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+        archived = set(_table_columns(conn, schema, table))
+        if not archived:
+            columns = ", ".join(
+                f"{c['name']} {c['type']}" + (" PRIMARY KEY" if c["pk"] else "") for c in live
+            )
+            conn.execute(f"CREATE TABLE {schema}.{table} ({columns})")
+        else:
+            for c in live:
+                if c["name"] not in archived:
+                    conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {c['name']} {c['type']}")
+        for index_sql in ARCHIVE_TABLES[table][1]:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{index_sql}")
+
+        fts_table, fts_columns = FTS_TABLES[table]
+        if not conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE name = ?", (fts_table,)
+        ).fetchone():
+            conn.execute(
+                f"""
+                CREATE VIRTUAL TABLE {schema}.{fts_table} USING fts5(
+                    {", ".join(fts_columns)},
+                    content='',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """
+            )
+
+
+def archive_schemas(conn, date_from: str = "", date_to: str = "", include_archive: bool = False) -> list:
+    """Šeme (main + ATTACH-ovane arhive) koje pokrivaju zadati opseg datuma.
+
+    Bez opsega i bez include_archive upit ide samo na živu bazu. Arhive
+    koje prethodni zahtev ostavio na konekciji iz pool-a, a ovaj ne
+    koristi, se odvezuju; ako opseg traži više godina nego što SQLite
+    dozvoljava ATTACH-ovanih baza, diže se ValueError.
+    """
+    years = []
+    if date_from or date_to or include_archive:
+        years = [
+            year for year in archive_years()
+            if not (date_from and str(year) < date_from[:4])
+            and not (date_to and str(year) > date_to[:4])
+        ]
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(years) > limit:
+        raise ValueError(
+            f"Opseg obuhvata {len(years)} arhivskih godina, a najviše se može pretražiti "
+            f"{limit} odjednom. Suzite opseg datuma."
         )
-    conn.commit()
-    conn.close()
+
+    wanted = {f"archive_{year}" for year in years}
+    for r in conn.execute("PRAGMA database_list").fetchall():
+        if r[1].startswith("archive_") and r[1] not in wanted:
+            conn.execute(f"DETACH DATABASE {r[1]}")
+    return ["main"] + [_attach_archive(conn, year) for year in years]
+
+
+def table_source(conn, table: str, schemas) -> str:
+    """FROM izraz za tabelu: sama tabela ili UNION ALL žive baze i arhiva.
+
+    Kolona archived_in (godina arhive ili NULL) označava redove koji se
+    više ne menjaju kroz security preglede.
+    """
+    if list(schemas) == ["main"]:
+        return table
+    columns = _table_columns(conn, "main", table)
+    branches = [f"SELECT {', '.join(columns)}, NULL AS archived_in FROM main.{table}"]
+    for schema in schemas:
+        if schema == "main":
+            continue
+        # kolona dodata posle poslednjeg archive_closed je u arhivi NULL
+        archived = set(_table_columns(conn, schema, table))
+        select = ", ".join(c if c in archived else f"NULL AS {c}" for c in columns)
+        branches.append(f"SELECT {select}, {schema[len('archive_'):]} FROM {schema}.{table}")
+    return f"({' UNION ALL '.join(branches)}) AS {table}"
+
+
+def fts_condition(table: str, match: str, schemas=("main",)):
+    """WHERE uslov "id je u FTS rezultatu" preko žive baze i arhiva -> (sql, params)."""
+    fts_table = FTS_TABLES[table][0]
+    selects = " UNION ALL ".join(
+        f"SELECT rowid FROM {schema}.{fts_table} WHERE {fts_table} MATCH ?" for schema in schemas
+    )
+    return f"id IN ({selects})", [match] * len(schemas)
+
+
+def archive_closed(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Seli zatvorene zapise starije od older_than_days u godišnje arhive.
+
+    Svaki blok se prvo upiše (INSERT OR IGNORE) i commit-uje u arhivu, pa
+    tek onda briše iz žive baze, tako da prekid usred rada nikad ne gubi
+    podatke – ponovno pokretanje samo završi brisanje. Vraća
+    {(tabela, godina): broj premeštenih}.
+    """
+    cutoff = (date.today() - timedelta(days=older_than_days)).isoformat()
+    conn = _connect()
+    moved = {}
+    try:
+        # šema svih arhiva prati živu bazu (nove kolone posle migracija)
+        for year in archive_years():
+            schema = _attach_archive(conn, year, readonly=False)
+            _upgrade_archive(conn, schema)
+            conn.commit()
+            conn.execute(f"DETACH DATABASE {schema}")
+
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+        for table, (closed_sql, _) in ARCHIVE_TABLES.items():
+            fts_table, fts_columns = FTS_TABLES[table]
+            columns = ", ".join(_table_columns(conn, "main", table))
+            years = [
+                r[0] for r in conn.execute(
+                    f"SELECT DISTINCT substr(arrival_date, 1, 4) FROM {table} "
+                    f"WHERE arrival_date < ? AND {closed_sql}",
+                    (cutoff,),
+                )
+            ]
+            for year in years:
+                os.makedirs(ARCHIVE_DIR, exist_ok=True)
+                schema = _attach_archive(conn, int(year), readonly=False)
+                _upgrade_archive(conn, schema)
+                conn.commit()
+                year_end = min(cutoff, f"{int(year) + 1}-01-01")
+                while True:
+                    conn.execute("DELETE FROM temp.archive_batch")
+                    conn.execute(
+                        f"INSERT INTO temp.archive_batch SELECT id FROM main.{table} "
+                        f"WHERE arrival_date >= ? AND arrival_date < ? AND {closed_sql} "
+                        f"ORDER BY id LIMIT ?",
+                        (f"{year}-01-01", year_end, batch_size),
+                    )
+                    count = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+                    conn.commit()
+                    if not count:
+                        break
+
+                    in_batch = "id IN (SELECT id FROM temp.archive_batch)"
+                    conn.execute(
+                        f"""
+                        INSERT INTO {schema}.{fts_table} (rowid, {", ".join(fts_columns)})
+                        SELECT id, {", ".join(_fts_sql_value(c) for c in fts_columns)}
+                        FROM main.{table}
+                        WHERE {in_batch} AND id NOT IN (SELECT id FROM {schema}.{table})
+                        """
+                    )
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO {schema}.{table} ({columns}) "
+                        f"SELECT {columns} FROM main.{table} WHERE {in_batch}"
+                    )
+                    conn.commit()
+
+                    # brisanje ne sme da napuni feed portirnice starim zapisima
+                    # ni statistiku (trigeri preskaču dok postoji 'archiving')
+                    feed_id = current_feed_id(conn)
+                    conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('archiving', 1)")
+                    conn.execute(f"DELETE FROM main.{table} WHERE {in_batch}")
+                    conn.execute("DELETE FROM app_meta WHERE key = 'archiving'")
+                    conn.execute("DELETE FROM change_feed WHERE id > ?", (feed_id,))
+                    conn.commit()
+                    moved[(table, int(year))] = moved.get((table, int(year)), 0) + count
+                # SQLite dozvoljava ograničen broj ATTACH-ovanih baza po konekciji
+                conn.execute(f"DETACH DATABASE {schema}")
+    finally:
+        conn.close()
+    if moved:
+        # žive liste su se smanjile (keš brojeva, ETag portirnice)
+        bump_data_version(*sorted({DATATABLES_ENTITIES[table] for table, _ in moved}))
+    return moved
+
+
+def incremental_vacuum(pages: int = 0) -> dict:
+    """Vraća slobodne stranice žive baze OS-u (PRAGMA incremental_vacuum).
+
+    Prvi put (auto_vacuum još nije INCREMENTAL) radi se pun VACUUM.
+    pages=0 oslobađa sve slobodne stranice. Vraća broj slobodnih stranica
+    pre i posle.
+    """
+    conn = _connect()
+    try:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+    return {"free_pages_before": before, "free_pages_after": after}
 
 
 # Auth helperi i dekoratori
 
+class UserCache:
+    """Kratkotrajni keš korisnika po email-u.
+
+    Identitet (email, rola, ime) je već u potpisanom session cookie-ju, pa
+    zahtevi ne čitaju tabelu users. Red iz baze se osvežava najkasnije
+    posle ttl sekundi, tako da deaktivacija, promena role ili lozinke u
+    drugom procesu važi najkasnije posle ttl; u istom procesu odmah
+    (invalidate iz admin_users i change_password).
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._users = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def put(self, user) -> dict:
+        user = dict(user)
+        with self._lock:
+            self._users[user["email"]] = (user, time.monotonic())
+        return user
+
+    def get(self, email: str):
+        with self._lock:
+            cached = self._users.get(email)
+            if cached and time.monotonic() - cached[1] < self.ttl:
+                self.stats["hits"] += 1
+                return cached[0]
+            self.stats["misses"] += 1
+
+        row = get_db().execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        if row is None:
+            self.invalidate(email)
+            return None
+        return self.put(row)
+
+    def invalidate(self, email: str = None) -> None:
+        with self._lock:
+            if email is None:
+                self._users.clear()
+            else:
+                self._users.pop(email, None)
+
+
+user_cache = UserCache(float(os.environ.get("GATE_APP_USER_CACHE_TTL", "30")))
+
+
+def _password_stamp(password_hash: str) -> str:
+    # promena lozinke poništava sve ostale sesije tog korisnika
+    return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:16]
+
+
+def _store_identity(user) -> None:
+    session["user_email"] = user["email"]
+    session["role"] = user["role"]
+    session["full_name"] = user["full_name"] or user["email"]
+    session["pw_stamp"] = _password_stamp(user["password_hash"])
+
+
 def get_current_user():
     email = session.get("user_email")
     if not email:
         return None
-
-    conn = get_db()
-    cur = conn.cursor()
-    user = cur.execute(
-        "SELECT * FROM users WHERE email = ?", (email,)
-    ).fetchone()
-    conn.close()
-    return user
+    return user_cache.get(email)
 
 
 def require_role(*allowed_roles):
@@ -227,13 +1766,26 @@ def require_role(*allowed_roles):
     def decorator(view_func):
         @wraps(view_func)
         def wrapped_view(*args, **kwargs):
-            if "user_email" not in session:
-                next_url = request.path
-                return redirect(url_for("login", next=next_url))
-
-            role = session.get("role")
-            if allowed_roles and role not in allowed_roles:
-                return redirect(url_for("no_access"))
+            with instrumentation.timed("auth_seconds"):
+                if "user_email" not in session:
+                    next_url = request.path
+                    return redirect(url_for("login", next=next_url))
+
+                user = get_current_user()
+                if (
+                    user is None
+                    or not user["is_active"]
+                    or session.get("pw_stamp") != _password_stamp(user["password_hash"])
+                ):
+                    session.clear()
+                    return redirect(url_for("login", next=request.path))
+
+                if session.get("role") != user["role"]:
+                    session["role"] = user["role"]
+
+                role = session.get("role")
+                if allowed_roles and role not in allowed_roles:
+                    return redirect(url_for("no_access"))
 
             return view_func(*args, **kwargs)
 
@@ -245,7 +1797,6 @@ def debug_users():
     conn = get_db()
     cur = conn.cursor()
     rows = cur.execute("SELECT id, email, full_name, role, is_active FROM users").fetchall()
-    conn.close()
 
     out_lines = []
     for r in rows:
@@ -273,12 +1824,9 @@ def login():
             "SELECT * FROM users WHERE email = ? AND is_active = 1",
             (email,),
         ).fetchone()
-        conn.close()
 
         if user and check_password_hash(user["password_hash"], password):
-            session["user_email"] = user["email"]
-            session["role"] = user["role"]
-            session["full_name"] = user["full_name"] or user["email"]
+            _store_identity(user_cache.put(user))
 
             next_url = request.args.get("next") or url_for("index")
             return redirect(next_url)
@@ -316,7 +1864,6 @@ def change_password():
 
         # Provera ponavljanja
         if new_pw != repeat_pw:
-            conn.close()
             return render_template("profile.html",
                                    error="Nove lozinke se ne poklapaju!")
 
@@ -327,7 +1874,6 @@ def change_password():
 
 
         if not user or not check_password_hash(user["password_hash"], old_pw):
-            conn.close()
             return render_template("profile.html",
                                    error="Trenutna lozinka nije ispravna!")
 
@@ -335,12 +1881,12 @@ def change_password():
         cur.execute("UPDATE users SET password_hash=? WHERE email=?",
                     (new_pw_hash, email))
         conn.commit()
-        conn.close()
+        user_cache.invalidate(email)
+        session["pw_stamp"] = _password_stamp(new_pw_hash)
 
         return render_template("profile.html",
                                message="Lozinka uspešno promenjena!")
 
-    conn.close()
     return render_template("profile.html")
 
 
@@ -403,11 +1949,16 @@ def admin_users():
                 pass
 
         conn.commit()
+        user_cache.invalidate()
+
+        # admin koji je promenio sopstvenu lozinku ostaje prijavljen
+        me = get_current_user()
+        if me is not None:
+            session["pw_stamp"] = _password_stamp(me["password_hash"])
 
     users = cur.execute(
         "SELECT * FROM users ORDER BY email"
     ).fetchall()
-    conn.close()
 
     return render_template(
         "admin_users.html",
@@ -431,13 +1982,30 @@ def index():
 
 # 1) Forma za najavu posete (zaposleni)
 
+def expand_weekdays(start_date: date, end_date: date, weekdays) -> list:
+    """Datumi (YYYY-MM-DD) između start i end koji padaju na date dane u nedelji.
+
+    weekdays: 0 = ponedeljak ... 6 = nedelja. Za svaki dan se skače po
+    nedelju dana od prvog pojavljivanja, umesto prolaska dan po dan.
+    """
+    week = timedelta(days=7)
+    dates = []
+    for weekday in set(weekdays):
+        current = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+        while current <= end_date:
+            dates.append(current)
+            current += week
+    dates.sort()
+    return [d.isoformat() for d in dates]
+
+
 @app.route("/posete/najava", methods=["GET", "POST"])
 @require_role("admin", "employee", "security_chief")
 def posete_najava():
-    conn = get_db()
-    cur = conn.cursor()
-
     if request.method == "POST":
+        conn = get_db()
+        cur = conn.cursor()
+
         # Zajednički podaci
         arrival_date_str = request.form["arrival_date"]
         expected_time = request.form["expected_time"]
@@ -479,14 +2047,7 @@ def posete_najava():
                 flash("Period ponavljanja ne može biti duži od godinu dana.", "danger")
                 return redirect(url_for("posete_najava"))
 
-            # PETLJA: Idemo dan po dan
-            current_date = start_date
-            while current_date <= end_date:
-                # current_date.weekday() vraća 0 za Ponedeljak, 6 za Nedelju
-                if current_date.weekday() in allowed_days:
-                    visits_to_create.append(current_date.strftime("%Y-%m-%d"))
-
-                current_date += timedelta(days=1)
+            visits_to_create = expand_weekdays(start_date, end_date, allowed_days)
 
             if not visits_to_create:
                 flash("Nije izabran nijedan validan datum u zadatom periodu.", "warning")
@@ -496,18 +2057,17 @@ def posete_najava():
             # Samo jedan datum (obična najava)
             visits_to_create.append(arrival_date_str)
 
-        # UPIS U BAZU (Sve pripremljene datume upisujemo)
+        # UPIS U BAZU – svi datumi jednim executemany u jednoj transakciji
         try:
-            count = 0
-            for date_val in visits_to_create:
-                cur.execute(
-                    """
-                    INSERT INTO visits (
-                        created_by, arrival_date, expected_time, host_employee, phone, object_name,
-                        guest_name, document_number, vehicle_plate, note, persons_count
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
+            cur.executemany(
+                """
+                INSERT INTO visits (
+                    created_by, arrival_date, expected_time, host_employee, phone, object_name,
+                    guest_name, document_number, vehicle_plate, note, persons_count
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
                     (
                         created_by,
                         date_val,
@@ -520,9 +2080,11 @@ def posete_najava():
                         vehicle_plate,
                         note,
                         persons_count,
-                    ),
-                )
-                count += 1
+                    )
+                    for date_val in visits_to_create
+                ],
+            )
+            count = len(visits_to_create)
 
             conn.commit()
 
@@ -534,19 +2096,12 @@ def posete_najava():
         except Exception as e:
             conn.rollback()
             flash(f"Došlo je do greške prilikom upisa: {str(e)}", "danger")
-        finally:
-            conn.close()
 
         return redirect(url_for("posete_najava"))
 
     # GET deo ostaje isti
-    employees = cur.execute(
-        "SELECT value FROM lookups WHERE type='employee' ORDER BY value"
-    ).fetchall()
-    objects = cur.execute(
-        "SELECT value FROM lookups WHERE type='object' ORDER BY value"
-    ).fetchall()
-    conn.close()
+    employees = lookup_cache.get("employee")
+    objects = lookup_cache.get("object")
 
     return render_template(
         "posete_najava.html",
@@ -555,16 +2110,51 @@ def posete_najava():
         date_today=date.today().strftime("%d.%m.%Y."),
     )
 
+@app.route("/posete/najava/uvoz", methods=["GET", "POST"])
+@require_role("admin", "employee", "security_chief")
+def posete_uvoz():
+    # uvoz (csv/openpyxl) se učitava tek kada zatreba, ne pri startu workera
+    from visit_import import import_visits, iter_rows, VisitImportError
+
+    result = None
+    error = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            error = "Izaberite fajl za uvoz."
+        else:
+            try:
+                result = import_visits(
+                    get_db(),
+                    iter_rows(upload.filename, upload.stream),
+                    session.get("user_email"),
+                    {v["value"] for v in lookup_cache.get("employee")},
+                    {v["value"] for v in lookup_cache.get("object")},
+                )
+            except VisitImportError as exc:
+                error = str(exc)
+            except Exception as exc:
+                app.logger.exception("Uvoz poseta nije uspeo")
+                error = f"Fajl nije moguće pročitati: {exc}"
+
+    return render_template(
+        "posete_uvoz.html",
+        result=result,
+        error=error,
+        date_today=date.today().strftime("%d.%m.%Y."),
+    )
+
+
 # 1b) Poseta bez najave – portirnica ručno unosi gosta
 
 
 @app.route("/posete/nenajavljena", methods=["GET", "POST"])
 @require_role("admin", "portirnica", "security_chief")
 def posete_nenajavljena():
-    conn = get_db()
-    cur = conn.cursor()
-
     if request.method == "POST":
+        conn = get_db()
+        cur = conn.cursor()
+
         arrival_date = request.form["arrival_date"]
         host_employee = request.form["host_employee"]
         phone = request.form["phone"]
@@ -603,78 +2193,516 @@ def posete_nenajavljena():
             ),
         )
         conn.commit()
-        conn.close()
+        occupancy.record("visit", cur.lastrowid, 1)
+
+        flash(f"Uspešno evidentiran ulaz za gosta: {guest_name}", "success")
+
+        return redirect(url_for("posete_nenajavljena"))
+
+    employees = lookup_cache.get("employee")
+    objects = lookup_cache.get("object")
+
+    return render_template(
+        "posete_nenajavljena.html",
+        employees=employees,
+        objects=objects,
+        date_today=date.today().strftime("%d.%m.%Y."),
+    )
+
+
+# 2) Portirnica – pregled najavljenih danas
+
+PORTIRNICA_VISITS_SQL = """
+    SELECT * FROM visits
+    WHERE arrival_date = ?
+      AND NOT (entry_time IS NOT NULL AND exit_time IS NOT NULL)
+      AND (status IS NULL OR status != 'cancelled')
+"""
+
+# kamioni na placu se čitaju iz on_site (samo prisutni, bez skeniranja istorije)
+PORTIRNICA_TRUCKS_SQL = """
+    SELECT trucks.* FROM on_site
+    JOIN trucks ON trucks.id = on_site.entity_id
+    WHERE on_site.entity = 'truck'
+"""
+
+# SSE stream drži jedan worker zauzetim, zato se posle LIVE_STREAM_SECONDS
+# zatvara i browser se sam ponovo povezuje (EventSource + Last-Event-ID)
+LIVE_POLL_SECONDS = float(os.environ.get("GATE_APP_LIVE_POLL_SECONDS", "0.5"))
+LIVE_STREAM_SECONDS = float(os.environ.get("GATE_APP_LIVE_STREAM_SECONDS", "60"))
+# Pod wfastcgi svaki otvoren stream zauzima ceo proces (maxInstances u
+# web.config), pa je broj stream-ova ograničen za sve procese zajedno:
+# stream drži jedan slot fajl u STREAM_SLOT_DIR, preko limita je 503 i
+# ekran se javlja ponovo posle Retry-After. Slot stariji od trajanja
+# stream-a je ostao posle pada procesa i preuzima se.
+MAX_STREAMS = int(os.environ.get("GATE_APP_MAX_STREAMS", "4"))
+STREAM_RETRY_AFTER = 15
+STREAM_SLOT_DIR = os.environ.get("GATE_APP_STREAM_SLOT_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "stream_slots"
+)
+
+
+def _acquire_stream_slot():
+    """Putanja zauzetog slot fajla ili None kada su svi slotovi zauzeti."""
+    os.makedirs(STREAM_SLOT_DIR, exist_ok=True)
+    stale_before = time.time() - LIVE_STREAM_SECONDS - 30
+    for slot in range(MAX_STREAMS):
+        path = os.path.join(STREAM_SLOT_DIR, f"slot{slot}")
+        try:
+            if os.stat(path).st_mtime < stale_before:
+                os.remove(path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return path
+    return None
+
+
+def _release_stream_slot(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _is_live_request() -> bool:
+    # ekrani portirnice šalju ulaz/izlaz preko fetch-a i čekaju SSE događaj
+    return request.headers.get("X-Requested-With") == "fetch"
+
+
+def current_feed_id(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed").fetchone()[0]
+
+
+# Brojači prisutnih za evakuaciju. Drže se u memoriji procesa: pune se iz
+# on_site pri prvom korišćenju, menjaju ih rute kapije, a pozadinski thread
+# ih na svakih OCCUPANCY_RECONCILE_SECONDS poravnava sa bazom (izmene iz
+# drugih worker procesa, security ispravke, brisanja).
+OCCUPANCY_RECONCILE_SECONDS = float(os.environ.get("GATE_APP_OCCUPANCY_RECONCILE_SECONDS", "10"))
+
+_OCCUPANCY_ENTITY_SQL = {
+    "visit": "SELECT object_name, COALESCE(persons_count, 1) FROM visits WHERE id = ?",
+    "truck": f"SELECT destination, {_TRUCK_PERSONS.format(row='trucks')} FROM trucks WHERE id = ?",
+}
+
+
+class OccupancyCounters:
+    """Broj prisutnih po objektu: {(entity, location): [broj, osoba]}."""
+
+    def __init__(self, reconcile_interval: float = OCCUPANCY_RECONCILE_SECONDS):
+        self.reconcile_interval = reconcile_interval
+        self._counts = None
+        self._reconciled_at = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self.stats = {"updates": 0, "reconciles": 0, "drift": 0}
+
+    def _ensure_started(self) -> None:
+        # posle fork-a (novi worker) brojači se ponovo pune iz baze
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.reconcile()
+            self._pid = os.getpid()
+            if self.reconcile_interval > 0:
+                threading.Thread(target=self._run, name="occupancy-reconcile", daemon=True).start()
+
+    def _run(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.reconcile_interval)
+            try:
+                self.reconcile()
+            except sqlite3.Error:
+                app.logger.exception("Poravnanje brojača prisutnih nije uspelo")
+
+    def reconcile(self) -> int:
+        """Učitava stanje iz on_site; vraća koliko se brojača razlikovalo."""
+        conn = _connect()
+        try:
+            counts = {
+                (r[0], r[1] or ""): [r[2], r[3]]
+                for r in conn.execute(
+                    "SELECT entity, location, COUNT(*), SUM(persons) FROM on_site GROUP BY entity, location"
+                )
+            }
+        finally:
+            conn.close()
+        with self._lock:
+            drift = 0
+            if self._counts is not None:
+                for key in set(counts) | set(self._counts):
+                    if counts.get(key, [0, 0]) != self._counts.get(key, [0, 0]):
+                        drift += 1
+            self._counts = counts
+            self._reconciled_at = datetime.now()
+            self.stats["reconciles"] += 1
+            self.stats["drift"] += drift
+            return drift
+
+    def record(self, entity: str, entity_id: int, delta: int) -> None:
+        """Ulaz (+1) ili izlaz (-1) reda koji je upravo upisan."""
+        self._ensure_started()
+        row = get_db().execute(_OCCUPANCY_ENTITY_SQL[entity], (entity_id,)).fetchone()
+        if row is None:
+            return
+        with self._lock:
+            counter = self._counts.setdefault((entity, row[0] or ""), [0, 0])
+            counter[0] = max(0, counter[0] + delta)
+            counter[1] = max(0, counter[1] + delta * row[1])
+            self.stats["updates"] += 1
+
+    def snapshot(self) -> dict:
+        self._ensure_started()
+        with self._lock:
+            locations = {}
+            total = {"persons": 0, "visits": 0, "trucks": 0}
+            for (entity, location), (count, persons) in self._counts.items():
+                if not count:
+                    continue
+                loc = locations.setdefault(location, {"persons": 0, "visits": 0, "trucks": 0})
+                for bucket in (loc, total):
+                    bucket["persons"] += persons
+                    bucket[entity + "s"] += count
+            return {
+                "total": total,
+                "locations": dict(sorted(locations.items())),
+                "reconciled_at": self._reconciled_at.isoformat(sep=" ", timespec="seconds"),
+            }
+
+
+occupancy = OccupancyCounters()
+
+
+# događaj se upisuje samo ako red postoji i još nema taj ulaz/izlaz
+# (dupli klik ne pravi novi red u dnevniku)
+_GATE_EVENT_SQL = {
+    ("visit", "in"): "SELECT id FROM visits WHERE id = ? AND entry_time IS NULL",
+    ("visit", "out"): "SELECT id FROM visits WHERE id = ? AND exit_time IS NULL",
+    ("truck", "out"): "SELECT id FROM trucks WHERE id = ? AND departure_datetime IS NULL",
+}
+
+
+def record_gate_event(entity: str, entity_id: int, direction: str) -> int:
+    """Upisuje ulaz/izlaz u gate_events; vraća broj upisanih redova.
+
+    Direktan commit preko konekcije zahteva, ili gate_writer kada je
+    uključen (GATE_APP_GATE_WRITER=1).
+    """
+    now = datetime.now().isoformat(sep=" ", timespec="seconds")
+    sql = (
+        "INSERT INTO gate_events (entity, entity_id, direction, event_time, operator) "
+        f"SELECT ?, id, ?, ?, ? FROM ({_GATE_EVENT_SQL[(entity, direction)]})"
+    )
+    params = (entity, direction, now, session.get("user_email"), entity_id)
+    if GATE_WRITER_ENABLED:
+        written = gate_writer.execute(sql, params)
+    else:
+        conn = get_db()
+        written = conn.execute(sql, params).rowcount
+        conn.commit()
+    if written:
+        occupancy.record(entity, entity_id, 1 if direction == "in" else -1)
+    return written
+
+
+# vrednost koju ispravka upisuje u dnevnik: (tabela, izraz nad izmenjenim redom)
+_GATE_CORRECTION_SQL = {
+    ("visit", "in"): ("visits", "entry_time"),
+    ("visit", "out"): ("visits", "exit_time"),
+    ("truck", "in"): ("trucks", _TRUCK_ARRIVAL.format(row="trucks")),
+    ("truck", "out"): ("trucks", "departure_datetime"),
+}
+
+
+def record_gate_correction(conn, entity: str, entity_id: int, direction: str) -> None:
+    """Upisuje ručnu ispravku ulaza/izlaza (in_fix/out_fix) sa novom vrednošću iz reda.
+
+    Poziva se posle UPDATE-a zapisa, u istoj transakciji; commit radi pozivalac.
+    """
+    table, value = _GATE_CORRECTION_SQL[(entity, direction)]
+    conn.execute(
+        "INSERT INTO gate_events (entity, entity_id, direction, event_time, operator) "
+        f"SELECT ?, id, ?, {value}, ? FROM {table} WHERE id = ?",
+        (entity, f"{direction}_fix", session.get("user_email"), entity_id),
+    )
+
+
+@app.route("/portirnica/prisutni")
+@require_role("admin", "portirnica", "security_chief")
+def portirnica_prisutni():
+    """Broj prisutnih (osobe, posete, kamioni) ukupno i po objektu – bez upita u bazu."""
+    data = occupancy.snapshot()
+    if request.args.get("format") == "text":
+        lines = [f"UKUPNO\tosoba={data['total']['persons']}\tposeta={data['total']['visits']}"
+                 f"\tkamiona={data['total']['trucks']}"]
+        for location, counts in data["locations"].items():
+            lines.append(f"{location}\tosoba={counts['persons']}\tposeta={counts['visits']}"
+                         f"\tkamiona={counts['trucks']}")
+        lines.append(f"poravnato sa bazom: {data['reconciled_at']}")
+        return Response("\n".join(lines) + "\n", mimetype="text/plain")
+    return jsonify(data)
+
+
+def _live_event(conn, entity: str, entity_id: int, kind: str) -> dict:
+    """Poruka za ekran: red koji treba dodati/zameniti ili ukloniti."""
+    if entity == "visit":
+        row = conn.execute(
+            PORTIRNICA_VISITS_SQL + " AND id = ?", (date.today().isoformat(), entity_id)
+        ).fetchone()
+        macro = "visit_row"
+    else:
+        row = conn.execute(PORTIRNICA_TRUCKS_SQL + " AND trucks.id = ?", (entity_id,)).fetchone()
+        macro = "truck_row"
+
+    event = {"entity": entity, "id": entity_id, "kind": kind, "action": "remove"}
+    if row is not None:
+        render_row = get_template_attribute("_portirnica_rows.html", macro)
+        event["action"] = "upsert"
+        event["html"] = str(render_row(row))
+    return event
+
+
+@app.route("/portirnica/stream")
+@require_role("admin", "portirnica", "security_chief")
+def portirnica_stream():
+    conn = get_db()
+    entity = request.args.get("entity")
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = current_feed_id(conn)
+
+    slot = _acquire_stream_slot()
+    if slot is None:
+        return Response(
+            "Previše otvorenih live ekrana, pokušajte ponovo.\n", status=503,
+            mimetype="text/plain", headers={"Retry-After": str(STREAM_RETRY_AFTER)},
+        )
+
+    def generate(last_id):
+        yield "retry: 1000\n\n"
+        deadline = time.monotonic() + LIVE_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            changes = conn.execute(
+                "SELECT id, entity, entity_id, kind FROM change_feed WHERE id > ? ORDER BY id",
+                (last_id,),
+            ).fetchall()
+            for change in changes:
+                last_id = change["id"]
+                if entity and change["entity"] != entity:
+                    continue
+                event = _live_event(conn, change["entity"], change["entity_id"], change["kind"])
+                yield f"id: {last_id}\nevent: change\ndata: {json.dumps(event)}\n\n"
+            if not changes:
+                yield ": ping\n\n"
+            time.sleep(LIVE_POLL_SECONDS)
+        # poslednji id da bi ponovno povezivanje nastavilo odatle
+        yield f"id: {last_id}\n\n"
+
+    resp = Response(
+        stream_with_context(generate(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # close() se zove i kada se generator nikad ne pokrene
+    resp.call_on_close(lambda: _release_stream_slot(slot))
+    return resp
+
+
+# Verzija podataka za liste portirnice, zajednička svim worker procesima.
+# Po entitetu postoji mali fajl u DATA_VERSION_DIR u koji svaka uspešna
+# write ruta dopisuje jedan bajt; (mtime, veličina) fajla je verzija. Čitanje
+# verzije je jedan os.stat, pa neizmenjena lista odgovara 304 bez SQLite-a
+# i Jinja-e, a renderovano telo tabele se čuva po verziji (FragmentCache).
+DATA_VERSION_DIR = os.environ.get("GATE_APP_DATA_VERSION_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "data_version"
+)
+DATA_VERSION_ENTITIES = ("visit", "truck")
+# posle ovoliko bajtova fajl se prazni (mtime se i dalje menja)
+DATA_VERSION_MAX_BYTES = 4096
+
+# write rute -> entiteti čije liste menjaju; nepoznata POST ruta menja sve
+DATA_VERSION_ENDPOINTS = {
+    "posete_najava": ("visit",),
+    "posete_uvoz": ("visit",),
+    "posete_nenajavljena": ("visit",),
+    "evidentiraj_ulaz": ("visit",),
+    "evidentiraj_izlaz": ("visit",),
+    "security_posete_edit": ("visit",),
+    "moje_najave_otkazi": ("visit",),
+    "moje_najave_promeni_datum": ("visit",),
+    "kamioni_unos": ("truck",),
+    "kamion_evidentiraj_izlaz": ("truck",),
+    "security_kamioni_edit": ("truck",),
+    "login": (),
+    "change_password": (),
+    "admin_users": (),
+    "admin_lookups": (),
+}
+
+
+def _data_version_path(entity: str) -> str:
+    return os.path.join(DATA_VERSION_DIR, entity)
+
+
+def data_version(entity: str) -> str:
+    try:
+        st = os.stat(_data_version_path(entity))
+    except FileNotFoundError:
+        return "0"
+    return f"{st.st_mtime_ns:x}.{st.st_size}"
+
+
+def bump_data_version(*entities) -> None:
+    """Poziva se posle commit-a izmene (after_request, CLI uvoz)."""
+    os.makedirs(DATA_VERSION_DIR, exist_ok=True)
+    for entity in entities or DATA_VERSION_ENTITIES:
+        path = _data_version_path(entity)
+        try:
+            full = os.path.getsize(path) >= DATA_VERSION_MAX_BYTES
+        except OSError:
+            full = False
+        with open(path, "wb" if full else "ab") as f:
+            f.write(b".")
+
+
+@app.after_request
+def _bump_data_version_after_write(response):
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        entities = DATA_VERSION_ENDPOINTS.get(request.endpoint, DATA_VERSION_ENTITIES)
+        if entities:
+            bump_data_version(*entities)
+    return response
+
+
+def _templates_build_id() -> str:
+    # ETag se menja i kada se posle deploy-a promeni šablon ili app.py
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [__file__] + [
+        os.path.join(template_dir, name)
+        for name in ("base.html", "posete_portirnica.html", "kamioni_portirnica.html",
+                     "_portirnica_rows.html", "_portirnica_live.html")
+    ]
+    stamp = "|".join(str(os.stat(p).st_mtime_ns) for p in paths if os.path.exists(p))
+    return hashlib.sha1(stamp.encode("utf-8")).hexdigest()[:12]
 
-        flash(f"Uspešno evidentiran ulaz za gosta: {guest_name}", "success")
 
-        return redirect(url_for("posete_nenajavljena"))
+TEMPLATES_BUILD_ID = _templates_build_id()
 
-    employees = cur.execute(
-        "SELECT value FROM lookups WHERE type='employee' ORDER BY value"
-    ).fetchall()
-    objects = cur.execute(
-        "SELECT value FROM lookups WHERE type='object' ORDER BY value"
-    ).fetchall()
-    conn.close()
 
-    return render_template(
-        "posete_nenajavljena.html",
-        employees=employees,
-        objects=objects,
-        date_today=date.today().strftime("%d.%m.%Y."),
-    )
+class FragmentCache:
+    """Renderovano telo tabele portirnice (i feed id) po entitetu i verziji.
 
+    Dele ga svi korisnici u procesu: posle izmene prvi ekran renderuje
+    redove, ostali (druga rola, drugi dan u zaglavlju...) dobijaju gotov HTML.
+    """
 
-# 2) Portirnica – pregled najavljenih danas
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
 
-@app.route("/posete/portirnica")
-@require_role("admin", "portirnica", "security_chief")
-def posete_portirnica():
-    today_str = date.today().isoformat()
+    def get(self, entity: str, key, render):
+        with self._lock:
+            entry = self._entries.get(entity)
+            if entry is not None and entry[0] == key:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+        value = render()
+        with self._lock:
+            self._entries[entity] = (key, value)
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+def _render_portirnica_rows(entity: str, today_str: str):
     conn = get_db()
-    cur = conn.cursor()
+    # id feed-a se čita pre liste, da ekran ne propusti izmenu između dva upita
+    feed_id = current_feed_id(conn)
+    if entity == "visit":
+        rows = conn.execute(
+            PORTIRNICA_VISITS_SQL + " ORDER BY expected_time", (today_str,)
+        ).fetchall()
+    else:
+        rows = conn.execute(PORTIRNICA_TRUCKS_SQL + " ORDER BY on_site.entered_at").fetchall()
+    render_rows = get_template_attribute("_portirnica_rows.html", f"{entity}_rows")
+    return feed_id, render_rows(rows)
 
 
-    rows = cur.execute(
-        """
-        SELECT * FROM visits
-        WHERE arrival_date = ?
-          AND NOT (entry_time IS NOT NULL AND exit_time IS NOT NULL)
-          AND (status IS NULL OR status != 'cancelled')
-        ORDER BY expected_time
-        """,
-        (today_str,),
-    ).fetchall()
-    conn.close()
+def _portirnica_page(entity: str, template: str) -> Response:
+    """Lista portirnice sa ETag/Last-Modified; 304 ako se ništa nije promenilo."""
+    today_str = date.today().isoformat()
+    version = data_version(entity)
+    etag = hashlib.sha1(
+        "|".join((
+            TEMPLATES_BUILD_ID, entity, version, today_str,
+            session.get("user_email", ""), session.get("role", ""), session.get("full_name", ""),
+        )).encode("utf-8")
+    ).hexdigest()
+
+    # odluka ide samo po ETag-u: Last-Modified ne pokriva promenu dana ni korisnika
+    # slabo poređenje: kompresija (compression.py) šalje ETag kao W/"..."
+    if request.if_none_match.contains_weak(etag):
+        fragment_cache.stats["not_modified"] += 1
+        response = Response(status=304)
+    else:
+        feed_id, rows_html = fragment_cache.get(
+            entity, (version, today_str), lambda: _render_portirnica_rows(entity, today_str)
+        )
+        response = Response(render_template(
+            template,
+            rows_html=rows_html,
+            feed_id=feed_id,
+            date_today=date.today().strftime("%d.%m.%Y."),
+        ))
+
+    response.set_etag(etag)
+    try:
+        response.last_modified = os.stat(_data_version_path(entity)).st_mtime
+    except FileNotFoundError:
+        pass
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
 
-    return render_template(
-        "posete_portirnica.html",
-        rows=rows,
-        date_today=date.today().strftime("%d.%m.%Y."),
-    )
+
+@app.route("/posete/portirnica")
+@require_role("admin", "portirnica", "security_chief")
+def posete_portirnica():
+    return _portirnica_page("visit", "posete_portirnica.html")
 
 
 @app.route("/posete/evidentiraj-ulaz/<int:visit_id>", methods=["POST"])
 @require_role("admin", "portirnica", "security_chief")
 def evidentiraj_ulaz(visit_id: int):
-    now = datetime.now().isoformat(sep=" ", timespec="seconds")
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("UPDATE visits SET entry_time = ? WHERE id = ?", (now, visit_id))
-    conn.commit()
-    conn.close()
+    record_gate_event("visit", visit_id, "in")
+    if _is_live_request():
+        return "", 204
     return redirect(url_for("posete_portirnica"))
 
 
 @app.route("/posete/evidentiraj-izlaz/<int:visit_id>", methods=["POST"])
 @require_role("admin", "portirnica", "security_chief")
 def evidentiraj_izlaz(visit_id: int):
-    now = datetime.now().isoformat(sep=" ", timespec="seconds")
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("UPDATE visits SET exit_time = ? WHERE id = ?", (now, visit_id))
-    conn.commit()
-    conn.close()
+    record_gate_event("visit", visit_id, "out")
+    if _is_live_request():
+        return "", 204
     return redirect(url_for("posete_portirnica"))
 
 # 3) Forma za kamione
@@ -682,13 +2710,10 @@ def evidentiraj_izlaz(visit_id: int):
 @app.route("/kamioni/unos", methods=["GET", "POST"])
 @require_role("admin", "portirnica", "security_chief")
 def kamioni_unos():
-    conn = get_db()
-    cur = conn.cursor()
-    destinations = cur.execute(
-        "SELECT value FROM lookups WHERE type='destination' ORDER BY value"
-    ).fetchall()
-
     if request.method == "POST":
+        conn = get_db()
+        cur = conn.cursor()
+
         driver_name = request.form["driver_name"]
         driver_document = request.form["driver_document"]
         codriver_name = request.form["codriver_name"]
@@ -728,12 +2753,12 @@ def kamioni_unos():
         )
 
         conn.commit()
-        conn.close()
+        occupancy.record("truck", cur.lastrowid, 1)
         flash(f"Uspešno evidentiran ulaz kamiona: {plate}", "success")
 
         return redirect(url_for("kamioni_unos"))
 
-    conn.close()
+    destinations = lookup_cache.get("destination")
 
     return render_template(
         "kamioni_unos.html",
@@ -747,170 +2772,633 @@ def kamioni_unos():
 @app.route("/kamioni/portirnica")
 @require_role("admin", "portirnica", "security_chief")
 def kamioni_portirnica():
+    return _portirnica_page("truck", "kamioni_portirnica.html")
+
+
+@app.route("/kamioni/evidentiraj-izlaz/<int:truck_id>", methods=["POST"])
+@require_role("admin", "portirnica", "security_chief")
+def kamion_evidentiraj_izlaz(truck_id: int):
+    record_gate_event("truck", truck_id, "out")
+    if _is_live_request():
+        return "", 204
+    return redirect(url_for("kamioni_portirnica"))
+
+
+# 5) Šef obezbeđenja – detaljne evidencije
+
+
+def _visit_filters(args, schemas=("main",)):
+    """Filteri iz query string-a -> (filters, WHERE, params) za tabelu visits.
+
+    schemas su baze (main + arhive) nad kojima se upit izvršava.
+    """
+    filters = {
+        "date_from": args.get("date_from") or "",
+        "date_to": args.get("date_to") or "",
+        "host": (args.get("host") or "").strip(),
+        "object_name": (args.get("object_name") or "").strip(),
+        "guest_name": (args.get("guest_name") or "").strip(),
+        "archive": "1" if args.get("archive") == "1" else "",
+    }
+    where = "1=1"
+    params = []
+
+    if filters["date_from"]:
+        where += " AND arrival_date >= ?"
+        params.append(filters["date_from"])
+    if filters["date_to"]:
+        where += " AND arrival_date <= ?"
+        params.append(filters["date_to"])
+
+    match = fts_match_query([
+        ("host_employee", filters["host"]),
+        ("object_name", filters["object_name"]),
+        ("guest_name", filters["guest_name"]),
+    ])
+    if match:
+        fts_sql, fts_params = fts_condition("visits", match, schemas)
+        where += " AND " + fts_sql
+        params.extend(fts_params)
+
+    return filters, where, params
+
+
+def _truck_filters(args, schemas=("main",)):
+    """Filteri iz query string-a -> (filters, WHERE, params) za tabelu trucks.
+
+    schemas su baze (main + arhive) nad kojima se upit izvršava.
+    """
+    filters = {
+        "date_from": args.get("date_from") or "",
+        "date_to": args.get("date_to") or "",
+        "plate": (args.get("plate") or "").strip(),
+        "destination": (args.get("destination") or "").strip(),
+        "archive": "1" if args.get("archive") == "1" else "",
+    }
+    where = "1=1"
+    params = []
+
+    if filters["date_from"]:
+        where += " AND arrival_date >= ?"
+        params.append(filters["date_from"])
+    if filters["date_to"]:
+        where += " AND arrival_date <= ?"
+        params.append(filters["date_to"])
+
+    match = fts_match_query([
+        ("plate", filters["plate"]),
+        ("destination", filters["destination"]),
+    ])
+    if match:
+        fts_sql, fts_params = fts_condition("trucks", match, schemas)
+        where += " AND " + fts_sql
+        params.extend(fts_params)
+
+    return filters, where, params
+
+
+# DataTables server-side obrada (draw/start/length/search/order).
+# Stranice se čitaju keyset paginacijom: klijent uz zahtev za sledeću
+# stranicu vraća "cursor" (ključ poslednjeg reda prethodne stranice), pa
+# SQLite čita samo jednu stranicu po indeksu umesto da preskače OFFSET redova.
+# Skok na proizvoljnu stranicu bez cursora radi sa OFFSET.
+
+DATATABLES_MAX_LENGTH = 500
+# filtrirani broj redova se broji najviše do ovoliko (COUNT nad LIMIT N+1);
+# preko toga odgovor nosi recordsCapped i info prikazuje "N+"
+DATATABLES_COUNT_LIMIT = int(os.environ.get("GATE_APP_DATATABLES_COUNT_LIMIT", "10000"))
+# tabela -> entitet čija data_version važi za žive redove
+DATATABLES_ENTITIES = {"visits": "visit", "trucks": "truck"}
+
+
+class CountCache:
+    """COUNT(*) rezultati DataTables upita, važe dok se ne promeni verzija podataka.
+
+    Za živu bazu verzija je data_version entiteta, za arhivu stat fajla
+    (arhiva se menja samo kroz archive_closed), pa prebrojane godine ostaju
+    u kešu i kada portirnica upisuje nove posete.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, version: str, count):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+        value = count()
+        with self._lock:
+            if len(self._entries) >= self._max_entries:
+                self._entries.clear()
+            self._entries[key] = (version, value)
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def _schema_data_version(table: str, schema: str) -> str:
+    if schema == "main":
+        return data_version(DATATABLES_ENTITIES[table])
+    try:
+        st = os.stat(archive_path(int(schema[len("archive_"):])))
+    except FileNotFoundError:
+        return "0"
+    return f"{st.st_mtime_ns:x}.{st.st_size}"
+
+# kolona -> SQL izraz za sortiranje (NULL vrednosti ne smeju u keyset poređenje)
+VISIT_ORDER_COLUMNS = {
+    "arrival_date": "arrival_date",
+    "expected_time": "COALESCE(expected_time, '')",
+    "host_employee": "host_employee",
+    "guest_name": "guest_name",
+    "object_name": "object_name",
+    "entry_time": "COALESCE(entry_time, '')",
+    "exit_time": "COALESCE(exit_time, '')",
+}
+VISIT_DEFAULT_ORDER = [
+    ("arrival_date", "DESC"),
+    ("COALESCE(expected_time, '')", "ASC"),
+    ("id", "ASC"),
+]
+
+TRUCK_ORDER_COLUMNS = {
+    "id": "id",
+    "driver_name": "driver_name",
+    "plate": "plate",
+    "destination": "destination",
+    "arrival_date": "arrival_date",
+    "arrival_time": "arrival_time",
+    "departure_datetime": "COALESCE(departure_datetime, '')",
+}
+TRUCK_DEFAULT_ORDER = [
+    ("arrival_date", "DESC"),
+    ("arrival_time", "DESC"),
+    ("id", "DESC"),
+]
+
+
+def _datatables_int(args, name: str, default: int) -> int:
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _datatables_order(args, order_columns: dict, default_order: list) -> list:
+    column_index = args.get("order[0][column]")
+    if column_index is None:
+        return default_order
+
+    column = args.get(f"columns[{column_index}][data]")
+    expr = order_columns.get(column)
+    if not expr:
+        return default_order
+
+    direction = "DESC" if args.get("order[0][dir]") == "desc" else "ASC"
+    if expr == default_order[0][0]:
+        # sortiranje po podrazumevanoj koloni zadržava i sekundarne ključeve
+        flip = direction != default_order[0][1]
+        return [
+            (e, ("ASC" if d == "DESC" else "DESC") if flip else d)
+            for e, d in default_order
+        ]
+    return [(expr, direction), ("id", direction)]
+
+
+def _keyset_condition(order: list, key: list):
+    """WHERE uslov za "redove posle ključa" pri zadatom (višekolonskom) redosledu."""
+    first_expr, first_dir = order[0]
+    # redundantni opseg po prvoj koloni da bi SQLite mogao da koristi indeks
+    sql = f"{first_expr} {'<=' if first_dir == 'DESC' else '>='} ? AND ("
+    params = [key[0]]
+
+    alternatives = []
+    for i, (expr, direction) in enumerate(order):
+        parts = [f"{e} = ?" for e, _ in order[:i]]
+        parts.append(f"{expr} {'<' if direction == 'DESC' else '>'} ?")
+        alternatives.append("(" + " AND ".join(parts) + ")")
+        params.extend(key[: i + 1])
+
+    sql += " OR ".join(alternatives) + ")"
+    return sql, params
+
+
+def datatables_page(table, where, params, args, order_columns, default_order, schemas=("main",)):
+    """Jedna stranica za DataTables server-side protokol nad zadatom tabelom."""
     conn = get_db()
     cur = conn.cursor()
+    source = table_source(conn, table, schemas)
+
+    draw = _datatables_int(args, "draw", 0)
+    start = max(_datatables_int(args, "start", 0), 0)
+    length = _datatables_int(args, "length", 10)
+    if length <= 0 or length > DATATABLES_MAX_LENGTH:
+        length = DATATABLES_MAX_LENGTH
+
+    params = list(params)
+    # globalna pretraga ide kroz FTS indeks tabele (sve tekstualne kolone)
+    match = fts_match_query([(None, args.get("search[value]"))])
+    if match:
+        fts_sql, fts_params = fts_condition(table, match, schemas)
+        where += " AND " + fts_sql
+        params.extend(fts_params)
+
+    order = _datatables_order(args, order_columns, default_order)
+    signature = hashlib.sha1(
+        json.dumps([table, where, params, order, list(schemas)], default=str).encode("utf-8")
+    ).hexdigest()[:16]
+
+    # ukupan broj: po šemi, iz keša dok se podaci (ili arhivski fajl) ne promene
+    versions = {schema: _schema_data_version(table, schema) for schema in schemas}
+    records_total = sum(
+        count_cache.get(
+            (table, schema), versions[schema],
+            lambda schema=schema: cur.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0],
+        )
+        for schema in schemas
+    )
+    records_capped = False
+    if where == "1=1":
+        records_filtered = records_total
+    else:
+        records_filtered = count_cache.get(
+            (table, where, json.dumps(params, default=str), tuple(schemas)),
+            "|".join(versions[schema] for schema in schemas),
+            lambda: cur.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {source} WHERE {where} LIMIT ?)",
+                params + [DATATABLES_COUNT_LIMIT + 1],
+            ).fetchone()[0],
+        )
+        if records_filtered > DATATABLES_COUNT_LIMIT:
+            records_filtered = DATATABLES_COUNT_LIMIT
+            records_capped = True
+
+    key_columns = ", ".join(f"{expr} AS _k{i}" for i, (expr, _) in enumerate(order))
+    order_sql = ", ".join(f"{expr} {direction}" for expr, direction in order)
+
+    page_where = where
+    page_params = list(params)
+    offset = start
+
+    cursor = args.get("cursor")
+    if cursor and start > 0:
+        try:
+            token = json.loads(cursor)
+        except ValueError:
+            token = None
+        key = token.get("k") if isinstance(token, dict) and token.get("o") == signature else None
+        # izmenjen cursor (k nije lista vrednosti) -> obično OFFSET straničenje
+        if (
+            isinstance(key, list) and len(key) == len(order)
+            and all(v is None or isinstance(v, (str, int, float)) for v in key)
+        ):
+            key_sql, key_params = _keyset_condition(order, key)
+            page_where += " AND " + key_sql
+            page_params.extend(key_params)
+            offset = 0
+
     rows = cur.execute(
-        """
-        SELECT * FROM trucks
-        WHERE departure_datetime IS NULL
-        ORDER BY arrival_date, arrival_time
-        """
+        f"""
+        SELECT *, {key_columns} FROM {source}
+        WHERE {page_where}
+        ORDER BY {order_sql}
+        LIMIT ? OFFSET ?
+        """,
+        page_params + [length, offset],
     ).fetchall()
-    conn.close()
 
-    return render_template(
-        "kamioni_portirnica.html",
-        rows=rows,
-        date_today=date.today().strftime("%d.%m.%Y."),
+    next_cursor = None
+    if len(rows) == length:
+        last = rows[-1]
+        next_cursor = json.dumps(
+            {"o": signature, "k": [last[f"_k{i}"] for i in range(len(order))]}
+        )
+
+    return {
+        "draw": draw,
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "recordsCapped": records_capped,
+        "rows": rows,
+        "next_start": start + length,
+        "next_cursor": next_cursor,
+    }
+
+
+def _security_schemas(args) -> list:
+    try:
+        return archive_schemas(
+            get_db(), args.get("date_from") or "", args.get("date_to") or "",
+            include_archive=args.get("archive") == "1",
+        )
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def _is_archived(row) -> bool:
+    # arhivirani redovi su samo za čitanje
+    return "archived_in" in row.keys() and row["archived_in"] is not None
+
+
+def _datatables_response(page, row_to_dict):
+    rows = page.pop("rows")
+    page["data"] = [row_to_dict(r) for r in rows]
+    return jsonify(page)
+
+
+# Excel export – redovi se čitaju u blokovima i šalju dok se fajl generiše
+
+EXPORT_CHUNK_SIZE = 2000
+
+VISIT_EXPORT_COLUMNS = [
+    ("ID", "id"),
+    ("Datum najave", "arrival_date"),
+    ("Očekivano vreme", "expected_time"),
+    ("Kod koga dolazi", "host_employee"),
+    ("Objekat", "object_name"),
+    ("Gost", "guest_name"),
+    ("Telefon", "phone"),
+    ("Broj dokumenta", "document_number"),
+    ("Registracija", "vehicle_plate"),
+    ("Broj osoba", "persons_count"),
+    ("Vreme ulaska", "entry_time"),
+    ("Vreme izlaska", "exit_time"),
+    ("Napomena", "note"),
+]
+
+TRUCK_EXPORT_COLUMNS = [
+    ("ID", "id"),
+    ("Vozač", "driver_name"),
+    ("Dokument vozača", "driver_document"),
+    ("Telefon vozača", "driver_phone"),
+    ("Suvozač", "codriver_name"),
+    ("Dokument suvozača", "codriver_document"),
+    ("Registracija", "plate"),
+    ("Odredište", "destination"),
+    ("Datum dolaska", "arrival_date"),
+    ("Vreme dolaska", "arrival_time"),
+    ("Datum/vreme odlaska", "departure_datetime"),
+]
+
+
+def _xlsx_response(cur, sheet_title: str, headers, filename: str) -> Response:
+    """Streaming XLSX odgovor iz već izvršenog cursora."""
+    from xlsx_stream import iter_xlsx, XLSX_MIMETYPE
+
+    def row_chunks():
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+
+    return Response(
+        stream_with_context(iter_xlsx(sheet_title, headers, row_chunks())),
+        mimetype=XLSX_MIMETYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
-@app.route("/kamioni/evidentiraj-izlaz/<int:truck_id>", methods=["POST"])
-@require_role("admin", "portirnica", "security_chief")
-def kamion_evidentiraj_izlaz(truck_id: int):
-    now = datetime.now().isoformat(sep=" ", timespec="seconds")
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE trucks SET departure_datetime = ? WHERE id = ?",
-        (now, truck_id),
+# Statistika – čita samo rollup tabele, nikad sirove posete/kamione
+
+STATS_TOP = 50
+# duži opsezi se prikazuju po mesecima
+STATS_DAILY_MAX_DAYS = 92
+
+
+def _avg_minutes(dwell_seconds, dwell_count):
+    if not dwell_count:
+        return None
+    return round(dwell_seconds / dwell_count / 60, 1)
+
+
+_STATS_COLUMNS = "metric, dimension, count, persons, dwell_seconds, dwell_count"
+
+
+def _stats_source(date_from: str, date_to: str):
+    """Rollup redovi za opseg: celi meseci iz stats_monthly, ivice iz stats_daily -> (sql, params)."""
+    start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    first_full = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    last_full = end if (end + timedelta(days=1)).day == 1 else end.replace(day=1) - timedelta(days=1)
+    if first_full > last_full:
+        return (
+            f"(SELECT day AS period, {_STATS_COLUMNS} FROM stats_daily WHERE day BETWEEN ? AND ?)",
+            [date_from, date_to],
+        )
+    return (
+        f"""(
+            SELECT month AS period, {_STATS_COLUMNS} FROM stats_monthly WHERE month BETWEEN ? AND ?
+            UNION ALL
+            SELECT day, {_STATS_COLUMNS} FROM stats_daily WHERE day >= ? AND day < ?
+            UNION ALL
+            SELECT day, {_STATS_COLUMNS} FROM stats_daily WHERE day > ? AND day <= ?
+        )""",
+        [
+            first_full.isoformat()[:7], last_full.isoformat()[:7],
+            date_from, first_full.isoformat(),
+            last_full.isoformat(), date_to,
+        ],
     )
-    conn.commit()
-    conn.close()
-    return redirect(url_for("kamioni_portirnica"))
 
 
-# 5) Šef obezbeđenja – detaljne evidencije
+def load_stats(conn, date_from: str, date_to: str) -> dict:
+    """Zbirovi za period [date_from, date_to] iz rollup tabela."""
+    span = (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days
+    grain = "day" if span <= STATS_DAILY_MAX_DAYS else "month"
+    source, source_params = _stats_source(date_from, date_to)
+    sums = (
+        "SUM(count) AS count, SUM(persons) AS persons, "
+        "SUM(dwell_seconds) AS dwell_seconds, SUM(dwell_count) AS dwell_count"
+    )
 
+    totals = {
+        r["metric"]: r for r in conn.execute(
+            f"""
+            SELECT metric, {sums} FROM {source}
+            WHERE metric IN ('visit_day', 'truck_day')
+            GROUP BY metric
+            """,
+            source_params,
+        )
+    }
+
+    def total(metric):
+        r = totals.get(metric)
+        if r is None:
+            return {"count": 0, "persons": 0, "avg_dwell_minutes": None}
+        return {
+            "count": r["count"],
+            "persons": r["persons"],
+            "avg_dwell_minutes": _avg_minutes(r["dwell_seconds"], r["dwell_count"]),
+        }
+
+    if grain == "day":
+        series_sql = f"""
+            SELECT day AS period, metric, {sums} FROM stats_daily
+            WHERE metric IN ('visit_day', 'truck_day') AND day BETWEEN ? AND ?
+            GROUP BY period, metric ORDER BY period
+        """
+        series_params = [date_from, date_to]
+    else:
+        series_sql = f"""
+            SELECT substr(period, 1, 7) AS period, metric, {sums} FROM {source}
+            WHERE metric IN ('visit_day', 'truck_day')
+            GROUP BY 1, metric ORDER BY 1
+        """
+        series_params = source_params
+
+    series = {}
+    for r in conn.execute(series_sql, series_params):
+        point = series.setdefault(r["period"], {
+            "period": r["period"], "visits": 0, "persons": 0, "trucks": 0, "avg_dwell_minutes": None,
+        })
+        if r["metric"] == "visit_day":
+            point["visits"] = r["count"]
+            point["persons"] = r["persons"]
+            point["avg_dwell_minutes"] = _avg_minutes(r["dwell_seconds"], r["dwell_count"])
+        else:
+            point["trucks"] = r["count"]
+
+    def top(metric):
+        return [
+            {
+                "name": r["dimension"],
+                "count": r["count"],
+                "persons": r["persons"],
+                "avg_dwell_minutes": _avg_minutes(r["dwell_seconds"], r["dwell_count"]),
+            }
+            for r in conn.execute(
+                f"""
+                SELECT dimension, {sums} FROM {source}
+                WHERE metric = ?
+                GROUP BY dimension
+                HAVING SUM(count) > 0
+                ORDER BY count DESC, dimension
+                LIMIT ?
+                """,
+                source_params + [metric, STATS_TOP],
+            )
+        ]
 
-@app.route("/security/posete", methods=["GET"])
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "grain": grain,
+        "visits": total("visit_day"),
+        "trucks": total("truck_day"),
+        "series": list(series.values()),
+        "hosts": top("visit_host"),
+        "objects": top("visit_object"),
+        "destinations": top("truck_destination"),
+    }
+
+
+def _stats_range(args):
+    today = date.today()
+    date_from = args.get("date_from") or today.replace(month=1, day=1).isoformat()
+    date_to = args.get("date_to") or today.isoformat()
+    try:
+        date.fromisoformat(date_from)
+        date.fromisoformat(date_to)
+    except ValueError:
+        return today.replace(month=1, day=1).isoformat(), today.isoformat()
+    return min(date_from, date_to), max(date_from, date_to)
+
+
+@app.route("/security/statistika")
 @require_role("admin", "security_chief")
-def security_posete():
-    conn = get_db()
-    cur = conn.cursor()
-    date_from = request.args.get("date_from") or None
-    date_to = request.args.get("date_to") or None
-    host = (request.args.get("host") or "").strip()
-    obj = (request.args.get("object_name") or "").strip()
-    guest = (request.args.get("guest_name") or "").strip()
+def security_statistika():
+    date_from, date_to = _stats_range(request.args)
+    return render_template(
+        "security_statistika.html",
+        page_title="Statistika",
+        stats=load_stats(get_db(), date_from, date_to),
+        date_today=date.today().strftime("%d.%m.%Y."),
+    )
 
-    query = "SELECT * FROM visits WHERE 1=1"
-    params = []
 
-    if date_from:
-        query += " AND arrival_date >= ?"
-        params.append(date_from)
-    if date_to:
-        query += " AND arrival_date <= ?"
-        params.append(date_to)
-    if host:
-        query += " AND host_employee LIKE ?"
-        params.append(f"%{host}%")
-    if obj:
-        query += " AND object_name LIKE ?"
-        params.append(f"%{obj}%")
-    if guest:
-        query += " AND guest_name LIKE ?"
-        params.append(f"%{guest}%")
-
-    query += " ORDER BY arrival_date DESC, expected_time"
+@app.route("/security/statistika/data")
+@require_role("admin", "security_chief")
+def security_statistika_data():
+    date_from, date_to = _stats_range(request.args)
+    return jsonify(load_stats(get_db(), date_from, date_to))
 
-    rows = cur.execute(query, params).fetchall()
-    conn.close()
+
+@app.route("/security/posete", methods=["GET"])
+@require_role("admin", "security_chief")
+def security_posete():
+    filters, _, _ = _visit_filters(request.args)
 
     return render_template(
         "security_posete.html",
         page_title="Baza poseta",
-        rows=rows,
-        filters={
-            "date_from": date_from or "",
-            "date_to": date_to or "",
-            "host": host,
-            "object_name": obj,
-            "guest_name": guest,
-        },
+        filters=filters,
         date_today=date.today().strftime("%d.%m.%Y."),
     )
 
 
+@app.route("/security/posete/data", methods=["GET"])
+@require_role("admin", "security_chief")
+def security_posete_data():
+    schemas = _security_schemas(request.args)
+    _, where, params = _visit_filters(request.args, schemas)
+    page = datatables_page(
+        "visits", where, params, request.args,
+        VISIT_ORDER_COLUMNS, VISIT_DEFAULT_ORDER, schemas,
+    )
+    is_admin = session.get("role") == "admin"
+
+    def row_to_dict(r):
+        editable = is_admin and not _is_archived(r)
+        return {
+            "id": r["id"],
+            "arrival_date": date_sr_filter(r["arrival_date"]),
+            "expected_time": r["expected_time"] or "",
+            "host_employee": r["host_employee"],
+            "guest_name": r["guest_name"],
+            "object_name": r["object_name"],
+            "phone": r["phone"] or "",
+            "document_number": r["document_number"] or "",
+            "vehicle_plate": r["vehicle_plate"] or "",
+            "persons_count": r["persons_count"] if r["persons_count"] is not None else "",
+            "entry_time": date_sr_filter(r["entry_time"]),
+            "exit_time": date_sr_filter(r["exit_time"]),
+            "note": r["note"] or "",
+            "edit_url": url_for("security_posete_edit", visit_id=r["id"]) if editable else None,
+            "delete_url": url_for("security_posete_delete", visit_id=r["id"]) if editable else None,
+        }
+
+    return _datatables_response(page, row_to_dict)
+
+
 @app.route("/security/kamioni/export")
 @require_role("admin", "security_chief")
 def security_kamioni_export():
     conn = get_db()
     cur = conn.cursor()
 
-    date_from = request.args.get("date_from") or None
-    date_to = request.args.get("date_to") or None
-    plate = (request.args.get("plate") or "").strip()
-    destination = (request.args.get("destination") or "").strip()
-
-    query = "SELECT * FROM trucks WHERE 1=1"
-    params = []
-
-    if date_from:
-        query += " AND arrival_date >= ?"
-        params.append(date_from)
-    if date_to:
-        query += " AND arrival_date <= ?"
-        params.append(date_to)
-    if plate:
-        query += " AND plate LIKE ?"
-        params.append(f"%{plate}%")
-    if destination:
-        query += " AND destination LIKE ?"
-        params.append(f"%{destination}%")
-
-    query += " ORDER BY arrival_date DESC, arrival_time DESC"
-
-    rows = cur.execute(query, params).fetchall()
-    conn.close()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Kamioni"
-
-    headers = [
-        "ID",
-        "Vozač",
-        "Dokument vozača",
-        "Telefon vozača",
-        "Suvozač",
-        "Dokument suvozača",
-        "Registracija",
-        "Odredište",
-        "Datum dolaska",
-        "Vreme dolaska",
-        "Datum/vreme odlaska",
-    ]
-    ws.append(headers)
-
-    for r in rows:
-        ws.append([
-            r["id"],
-            r["driver_name"],
-            r["driver_document"],
-            r["driver_phone"],
-            r["codriver_name"],
-            r["codriver_document"],
-            r["plate"],
-            r["destination"],
-            r["arrival_date"],
-            r["arrival_time"],
-            r["departure_datetime"],
-        ])
-
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    schemas = _security_schemas(request.args)
+    _, where, params = _truck_filters(request.args, schemas)
+    columns = ", ".join(column for _, column in TRUCK_EXPORT_COLUMNS)
+    source = table_source(conn, "trucks", schemas)
+    cur.execute(
+        f"SELECT {columns} FROM {source} WHERE {where} ORDER BY arrival_date DESC, arrival_time DESC",
+        params,
+    )
 
     filename = f"baza_kamiona_{date.today().isoformat()}.xlsx"
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    return _xlsx_response(cur, "Kamioni", [h for h, _ in TRUCK_EXPORT_COLUMNS], filename)
 
 
 @app.route("/security/kamioni/<int:truck_id>/edit", methods=["GET", "POST"])
@@ -926,7 +3414,6 @@ def security_kamioni_edit(truck_id: int):
     ).fetchone()
 
     if row is None:
-        conn.close()
         return "Kamion nije pronađen.", 404
 
     if request.method == "POST":
@@ -970,15 +3457,16 @@ def security_kamioni_edit(truck_id: int):
                 truck_id,
             ),
         )
+        # izmena vremena dolaska/odlaska ide i u dnevnik kapije
+        if (arrival_date, arrival_time) != (row["arrival_date"], row["arrival_time"]):
+            record_gate_correction(conn, "truck", truck_id, "in")
+        if departure_datetime != row["departure_datetime"]:
+            record_gate_correction(conn, "truck", truck_id, "out")
         conn.commit()
-        conn.close()
         return redirect(url_for("security_kamioni"))
 
     # GET – puni dropdown za odredišta
-    destinations = cur.execute(
-        "SELECT value FROM lookups WHERE type='destination' ORDER BY value",
-    ).fetchall()
-    conn.close()
+    destinations = lookup_cache.get("destination")
 
     return render_template(
         "security_kamioni_edit.html",
@@ -994,7 +3482,6 @@ def security_kamioni_delete(truck_id: int):
     cur = conn.cursor()
     cur.execute("DELETE FROM trucks WHERE id = ?", (truck_id,))
     conn.commit()
-    conn.close()
     return redirect(request.referrer or url_for("security_kamioni"))
 
 
@@ -1004,87 +3491,17 @@ def security_posete_export():
     conn = get_db()
     cur = conn.cursor()
 
-
-    date_from = request.args.get("date_from") or None
-    date_to = request.args.get("date_to") or None
-    host = (request.args.get("host") or "").strip()
-    obj = (request.args.get("object_name") or "").strip()
-    guest = (request.args.get("guest_name") or "").strip()
-
-    query = "SELECT * FROM visits WHERE 1=1"
-    params = []
-
-    if date_from:
-        query += " AND arrival_date >= ?"
-        params.append(date_from)
-    if date_to:
-        query += " AND arrival_date <= ?"
-        params.append(date_to)
-    if host:
-        query += " AND host_employee LIKE ?"
-        params.append(f"%{host}%")
-    if obj:
-        query += " AND object_name LIKE ?"
-        params.append(f"%{obj}%")
-    if guest:
-        query += " AND guest_name LIKE ?"
-        params.append(f"%{guest}%")
-
-    query += " ORDER BY arrival_date DESC, expected_time"
-
-    rows = cur.execute(query, params).fetchall()
-    conn.close()
-
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Posete"
-
-    headers = [
-        "ID",
-        "Datum najave",
-        "Očekivano vreme",
-        "Kod koga dolazi",
-        "Objekat",
-        "Gost",
-        "Telefon",
-        "Broj dokumenta",
-        "Registracija",
-        "Broj osoba",
-        "Vreme ulaska",
-        "Vreme izlaska",
-        "Napomena",
-    ]
-    ws.append(headers)
-
-    for r in rows:
-        ws.append([
-            r["id"],
-            r["arrival_date"],
-            r["expected_time"],
-            r["host_employee"],
-            r["object_name"],
-            r["guest_name"],
-            r["phone"],
-            r["document_number"],
-            r["vehicle_plate"],
-            r["persons_count"],
-            r["entry_time"],
-            r["exit_time"],
-            r["note"],
-        ])
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    schemas = _security_schemas(request.args)
+    _, where, params = _visit_filters(request.args, schemas)
+    columns = ", ".join(column for _, column in VISIT_EXPORT_COLUMNS)
+    source = table_source(conn, "visits", schemas)
+    cur.execute(
+        f"SELECT {columns} FROM {source} WHERE {where} ORDER BY arrival_date DESC, expected_time",
+        params,
+    )
 
     filename = f"baza_poseta_{date.today().isoformat()}.xlsx"
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name=filename,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    return _xlsx_response(cur, "Posete", [h for h, _ in VISIT_EXPORT_COLUMNS], filename)
 
 
 @app.route("/security/posete/<int:visit_id>/edit", methods=["GET", "POST"])
@@ -1100,7 +3517,6 @@ def security_posete_edit(visit_id: int):
     ).fetchone()
 
     if row is None:
-        conn.close()
         return "Poseta nije pronađena.", 404
 
     if request.method == "POST":
@@ -1150,18 +3566,17 @@ def security_posete_edit(visit_id: int):
                 visit_id,
             ),
         )
+        # izmena vremena ulaza/izlaza ide i u dnevnik kapije
+        if entry_time != row["entry_time"]:
+            record_gate_correction(conn, "visit", visit_id, "in")
+        if exit_time != row["exit_time"]:
+            record_gate_correction(conn, "visit", visit_id, "out")
         conn.commit()
-        conn.close()
         return redirect(url_for("security_posete"))
 
     # GET – puni dropdownove
-    employees = cur.execute(
-        "SELECT value FROM lookups WHERE type='employee' ORDER BY value"
-    ).fetchall()
-    objects = cur.execute(
-        "SELECT value FROM lookups WHERE type='object' ORDER BY value"
-    ).fetchall()
-    conn.close()
+    employees = lookup_cache.get("employee")
+    objects = lookup_cache.get("object")
 
     return render_template(
         "security_posete_edit.html",
@@ -1178,55 +3593,53 @@ def security_posete_delete(visit_id: int):
     cur = conn.cursor()
     cur.execute("DELETE FROM visits WHERE id = ?", (visit_id,))
     conn.commit()
-    conn.close()
     return redirect(request.referrer or url_for("security_posete"))
 
 @app.route("/security/kamioni", methods=["GET"])
 @require_role("admin", "security_chief")
 def security_kamioni():
-    conn = get_db()
-    cur = conn.cursor()
-
-    date_from = request.args.get("date_from") or None
-    date_to = request.args.get("date_to") or None
-    plate = (request.args.get("plate") or "").strip()
-    destination = (request.args.get("destination") or "").strip()
-
-    query = "SELECT * FROM trucks WHERE 1=1"
-    params = []
-
-    if date_from:
-        query += " AND arrival_date >= ?"
-        params.append(date_from)
-    if date_to:
-        query += " AND arrival_date <= ?"
-        params.append(date_to)
-    if plate:
-        query += " AND plate LIKE ?"
-        params.append(f"%{plate}%")
-    if destination:
-        query += " AND destination LIKE ?"
-        params.append(f"%{destination}%")
-
-    query += " ORDER BY arrival_date DESC, arrival_time DESC"
-
-    rows = cur.execute(query, params).fetchall()
-    conn.close()
+    filters, _, _ = _truck_filters(request.args)
 
     return render_template(
         "security_kamioni.html",
         page_title="Baza kamiona",
-        rows=rows,
-        filters={
-            "date_from": date_from or "",
-            "date_to": date_to or "",
-            "plate": plate,
-            "destination": destination,
-        },
+        filters=filters,
         date_today=date.today().strftime("%d.%m.%Y."),
     )
 
 
+@app.route("/security/kamioni/data", methods=["GET"])
+@require_role("admin", "security_chief")
+def security_kamioni_data():
+    schemas = _security_schemas(request.args)
+    _, where, params = _truck_filters(request.args, schemas)
+    page = datatables_page(
+        "trucks", where, params, request.args,
+        TRUCK_ORDER_COLUMNS, TRUCK_DEFAULT_ORDER, schemas,
+    )
+    is_admin = session.get("role") == "admin"
+
+    def row_to_dict(r):
+        editable = is_admin and not _is_archived(r)
+        return {
+            "id": r["id"],
+            "driver_name": r["driver_name"],
+            "driver_document": r["driver_document"] or "",
+            "driver_phone": r["driver_phone"] or "",
+            "codriver_name": r["codriver_name"] or "",
+            "codriver_document": r["codriver_document"] or "",
+            "plate": r["plate"],
+            "destination": r["destination"],
+            "arrival_date": date_sr_filter(r["arrival_date"]),
+            "arrival_time": r["arrival_time"],
+            "departure_datetime": date_sr_filter(r["departure_datetime"]),
+            "edit_url": url_for("security_kamioni_edit", truck_id=r["id"]) if editable else None,
+            "delete_url": url_for("security_kamioni_delete", truck_id=r["id"]) if editable else None,
+        }
+
+    return _datatables_response(page, row_to_dict)
+
+
 @app.route("/moje-najave")
 @require_role("admin", "employee", "portirnica", "security_chief")
 def moje_najave():
@@ -1256,7 +3669,6 @@ def moje_najave():
     """
 
     rows = cur.execute(query, params).fetchall()
-    conn.close()
 
     return render_template(
         "moje_najave.html",
@@ -1281,20 +3693,17 @@ def moje_najave_otkazi(visit_id):
     visit = cur.execute("SELECT created_by FROM visits WHERE id = ?", (visit_id,)).fetchone()
 
     if not visit:
-        conn.close()
         flash("Poseta ne postoji.", "danger")
         return redirect(url_for("moje_najave"))
 
     # Samo kreator ili admin moze da otkaze
     if visit["created_by"] != user_email and role != "admin":
-        conn.close()
         flash("Nemate pravo da otkažete ovu posetu.", "danger")
         return redirect(url_for("moje_najave"))
 
     # Postavljanje statusa na cancelled
     cur.execute("UPDATE visits SET status = 'cancelled' WHERE id = ?", (visit_id,))
     conn.commit()
-    conn.close()
 
     flash("Poseta uspešno otkazana.", "success")
     return redirect(url_for("moje_najave"))
@@ -1317,18 +3726,15 @@ def moje_najave_promeni_datum(visit_id):
     visit = cur.execute("SELECT created_by FROM visits WHERE id = ?", (visit_id,)).fetchone()
 
     if not visit:
-        conn.close()
         flash("Poseta ne postoji.", "danger")
         return redirect(url_for("moje_najave"))
 
     if visit["created_by"] != user_email and role != "admin":
-        conn.close()
         flash("Nemate pravo izmene.", "danger")
         return redirect(url_for("moje_najave"))
 
     cur.execute("UPDATE visits SET arrival_date = ? WHERE id = ?", (new_date, visit_id))
     conn.commit()
-    conn.close()
 
     flash(f"Datum posete uspešno promenjen na {new_date}.", "success")
     return redirect(url_for("moje_najave"))
@@ -1374,17 +3780,28 @@ def admin_lookups():
         form_cfg = next(iter(FORM_LOOKUP_CONFIG.values()))
 
     if request.method == "POST" and field_code:
+        conn = get_db()
+        toggle_id = request.form.get("toggle_id", type=int)
         new_value = (request.form.get("new_value") or "").strip()
-        if new_value:
-            conn = get_db()
-            cur = conn.cursor()
-            cur.execute(
-                "INSERT INTO lookups (type, value) VALUES (?, ?)",
+        if toggle_id:
+            # vrednosti se ne brišu, samo povlače iz padajućih menija
+            conn.execute(
+                "UPDATE lookups SET active = 1 - active WHERE id = ? AND type = ?",
+                (toggle_id, field_code),
+            )
+            conn.commit()
+            lookup_cache.invalidate()
+        elif new_value:
+            # postojeća (i povučena) vrednost se samo ponovo aktivira
+            conn.execute(
+                """
+                INSERT INTO lookups (type, value) VALUES (?, ?)
+                ON CONFLICT (type, value) DO UPDATE SET active = 1
+                """,
                 (field_code, new_value),
             )
             conn.commit()
-            conn.close()
-
+            lookup_cache.invalidate()
 
         return redirect(url_for("admin_lookups", form=form_code, field=field_code))
 
@@ -1393,10 +3810,10 @@ def admin_lookups():
         conn = get_db()
         cur = conn.cursor()
         rows = cur.execute(
-            "SELECT id, value FROM lookups WHERE type = ? ORDER BY value",
+            "SELECT id, value, active FROM lookups WHERE type = ? ORDER BY value",
             (field_code,),
         ).fetchall()
-        conn.close()
+        rows.sort(key=lambda row: sr_sort_key(row["value"]))
 
     return render_template(
         "admin_lookups.html",
@@ -1408,5 +3825,36 @@ def admin_lookups():
         date_today=date.today().strftime("%d.%m.%Y."),
     )
 
+@app.route("/admin/cache-stats")
+@require_role("admin")
+def admin_cache_stats():
+    return jsonify({
+        "lookups": dict(lookup_cache.stats),
+        "users": dict(user_cache.stats),
+        "occupancy": dict(occupancy.stats),
+        "portirnica_fragments": dict(fragment_cache.stats),
+        "datatables_counts": dict(count_cache.stats),
+    })
+
+
+
+@app.route("/admin/compression-stats")
+@require_role("admin")
+def admin_compression_stats():
+    return jsonify(compression.snapshot())
+
+
+@app.route("/admin/metrics")
+@require_role("admin")
+def admin_metrics():
+    pool = [
+        (f"gate_app_db_pool_{name}_total", "counter", f"ConnectionPool.stats['{name}']", value)
+        for name, value in db_pool.stats.items()
+    ]
+    return Response(
+        request_metrics.prometheus(pool),
+        mimetype="text/plain; version=0.0.4",
+    )
+
 if __name__ == "__main__":
     _run_basic_tests()
@@ -0,0 +1,51 @@
+"""Arhiviranje starih poseta i kamiona u godišnje baze + incremental VACUUM.
+
+Usput briše stare stavke change_feed-a (live portirnica).
+
+Pokretanje (npr. iz Task Scheduler-a jednom nedeljno):
+    python archive_db.py [--days 365] [--vacuum-pages 0] [--no-vacuum]
+"""
+import argparse
+
+from app import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_DIR,
+    archive_closed,
+    get_db,
+    incremental_vacuum,
+    init_db,
+    prune_change_feed,
+)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="arhiviraju se zatvoreni zapisi stariji od ovoliko dana")
+    parser.add_argument("--vacuum-pages", type=int, default=0,
+                        help="koliko slobodnih stranica vratiti OS-u (0 = sve)")
+    parser.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args(argv)
+
+    init_db()
+    moved = archive_closed(args.days)
+    if not moved:
+        print("Nema zapisa za arhiviranje.")
+    for (table, year), count in sorted(moved.items()):
+        print(f"{table} {year}: {count} premešteno u {ARCHIVE_DIR}")
+
+    conn = get_db()
+    try:
+        print(f"change_feed: obrisano {prune_change_feed(conn)} starih stavki")
+    finally:
+        conn.close()
+
+    if not args.no_vacuum:
+        result = incremental_vacuum(args.vacuum_pages)
+        print(
+            f"Slobodne stranice: {result['free_pages_before']} -> {result['free_pages_after']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,827 @@
+"""Benchmark skripte za gate_app.
+
+Pokretanje: python benchmarks.py [ime_benchmarka ...]
+Svi benchmarki rade nad privremenom bazom (GATE_APP_DB).
+
+Opterećenje nad sintetičkom bazom, sa JSON baseline-om za poređenje:
+    python benchmarks.py load --visits 1000000 --save-baseline load_1m.json
+    GATE_APP_DB=load_1m.db python benchmarks.py load --visits 1000000 --baseline load_1m.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+_BENCH_DIR = tempfile.mkdtemp(prefix="gate_app_bench_")
+os.environ.setdefault("GATE_APP_DB", os.path.join(_BENCH_DIR, "gate_app.db"))
+os.environ.setdefault("GATE_APP_JINJA_CACHE", os.path.join(_BENCH_DIR, "jinja"))
+
+import app as gate_app  # noqa: E402
+import synthetic_data  # noqa: E402
+from synthetic_data import OBJECTS, person as _person  # noqa: E402
+
+ADMIN_EMAIL = "nikola.lakovic@logistar.rs"
+
+BENCH_ROUTES = [
+    "/",
+    "/posete/najava",
+    "/posete/portirnica",
+    "/kamioni/portirnica",
+    "/security/posete",
+    "/security/kamioni",
+    "/moje-najave",
+]
+
+
+def _login(client, email: str = ADMIN_EMAIL, password: str = "1") -> None:
+    client.post("/login", data={"email": email, "password": password})
+
+
+def bench_connections(requests_per_route: int = 200) -> None:
+    """Broj fizičkih SQLite konekcija po zahtevu (pool vs. connect-per-call)."""
+    gate_app.init_db()
+    pool = gate_app.db_pool
+    with gate_app.app.test_client() as client:
+        _login(client)
+        print(f"{'ruta':<24}{'get_db/zahtev':>15}{'connect/zahtev':>16}{'ms/zahtev':>12}")
+        for path in BENCH_ROUTES:
+            acquired = pool.stats["acquired"]
+            opened = pool.stats["opened"]
+            start = time.perf_counter()
+            for _ in range(requests_per_route):
+                client.get(path)
+            elapsed = time.perf_counter() - start
+            n = requests_per_route
+            print(
+                f"{path:<24}"
+                f"{(pool.stats['acquired'] - acquired) / n:>15.2f}"
+                f"{(pool.stats['opened'] - opened) / n:>16.3f}"
+                f"{elapsed * 1000 / n:>12.2f}"
+            )
+    print("Pre pool-a svaki get_db() je bio novi sqlite3.connect().")
+
+
+def seed_visits(n: int, start: date = date(2021, 1, 1)) -> None:
+    """Dodaje n poseta raspoređenih po danima od start datuma."""
+    gate_app.init_db()
+    rnd = random.Random(42)
+    hosts = [_person(rnd) for _ in range(200)]
+    conn = gate_app.get_db()
+    batch = []
+    for i in range(n):
+        day = (start + timedelta(days=i // 50)).isoformat()
+        batch.append((
+            day, f"{8 + i % 9:02d}:00", rnd.choice(hosts), "0601234567",
+            rnd.choice(OBJECTS), _person(rnd), f"DOK{i:08d}", f"BG-{i % 1000:03d}-AA",
+            "napomena", rnd.randint(1, 4), f"{day} 08:05:00", f"{day} 15:30:00", ADMIN_EMAIL,
+        ))
+        if len(batch) == 10000:
+            _insert_visit_batch(conn, batch)
+    _insert_visit_batch(conn, batch)
+    conn.commit()
+    conn.close()
+
+
+def _insert_visit_batch(conn, batch: list) -> None:
+    conn.executemany(
+        """
+        INSERT INTO visits (
+            arrival_date, expected_time, host_employee, phone, object_name, guest_name,
+            document_number, vehicle_plate, note, persons_count, entry_time, exit_time, created_by
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        batch,
+    )
+    batch.clear()
+
+
+def _maxrss_mb() -> float:
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _export_worker(mode: str, db_path: str, result_queue) -> None:
+    os.environ["GATE_APP_DB"] = db_path
+    import app as worker_app
+
+    before = _maxrss_mb()
+    start = time.perf_counter()
+    size = 0
+    if mode == "workbook":
+        # stari način: svi redovi u memoriji + ceo Workbook pa tek onda slanje
+        from openpyxl import Workbook
+
+        conn = worker_app._connect()
+        rows = conn.execute("SELECT * FROM visits ORDER BY arrival_date DESC, expected_time").fetchall()
+        wb = Workbook()
+        ws = wb.active
+        ws.append([h for h, _ in worker_app.VISIT_EXPORT_COLUMNS])
+        for r in rows:
+            ws.append([r[c] for _, c in worker_app.VISIT_EXPORT_COLUMNS])
+        output = io.BytesIO()
+        wb.save(output)
+        size = len(output.getvalue())
+    else:
+        with worker_app.app.test_client() as client:
+            _login(client)
+            resp = client.get("/security/posete/export")
+            for chunk in resp.response:
+                size += len(chunk)
+            resp.close()
+    result_queue.put((mode, time.perf_counter() - start, _maxrss_mb() - before, size))
+
+
+def bench_export(rows: int = 200000) -> None:
+    """Vršna memorija (RSS) exporta: stari Workbook u memoriji vs. streaming."""
+    seed_visits(rows)
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{rows} poseta")
+    print(f"{'način':<12}{'s':>8}{'Δ RSS MB':>12}{'MB fajl':>10}")
+    for mode in ("workbook", "streaming"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_export_worker, args=(mode, gate_app.DB_PATH, queue))
+        proc.start()
+        _, elapsed, rss, size = queue.get()
+        proc.join()
+        print(f"{mode:<12}{elapsed:>8.2f}{rss:>12.1f}{size / 1e6:>10.1f}")
+
+
+def bench_search(rows: int = 1000000, repeat: int = 5) -> None:
+    """Tekstualni filteri: LIKE '%term%' (full scan) vs. FTS5 indeks."""
+    seed_visits(rows)
+    conn = gate_app.get_db()
+    searches = [
+        ("guest_name", "Đorđe Lakovic"),
+        ("guest_name", "šar"),
+        ("host_employee", "Popović"),
+        ("object_name", "hladnjaca"),
+    ]
+    print(f"{rows} poseta")
+    print(f"{'filter':<30}{'LIKE ms':>10}{'FTS ms':>10}{'FTS/LIKE':>11}")
+    for column, term in searches:
+        like_sql = f"SELECT id FROM visits WHERE {column} LIKE ? ORDER BY arrival_date DESC LIMIT 25"
+        fts_sql = (
+            "SELECT id FROM visits WHERE id IN "
+            "(SELECT rowid FROM visits_fts WHERE visits_fts MATCH ?) "
+            "ORDER BY arrival_date DESC LIMIT 25"
+        )
+        match = gate_app.fts_match_query([(column, term)])
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            like_rows = conn.execute(like_sql, (f"%{term}%",)).fetchall()
+        like_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fts_rows = conn.execute(fts_sql, (match,)).fetchall()
+        fts_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        print(f"{column + '=' + term:<30}{like_ms:>10.1f}{fts_ms:>10.1f}{len(fts_rows):>7}/{len(like_rows)}")
+    conn.close()
+    print("LIKE ne ignoriše dijakritike, pa za 'Lakovic' ili 'hladnjaca' ne nalazi ništa.")
+
+
+_VISIT_INSERT_SQL = """
+    INSERT INTO visits (
+        created_by, arrival_date, expected_time, host_employee, phone, object_name,
+        guest_name, document_number, vehicle_plate, note, persons_count
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def bench_recurring(years=(1, 2, 5), weekdays=(0, 1, 2, 3, 4)) -> None:
+    """Ponavljajuća najava: dan-po-dan + INSERT po datumu vs. expand_weekdays + executemany."""
+    gate_app.init_db()
+    conn = gate_app.get_db()
+    fields = (ADMIN_EMAIL, None, "07:00", "Maja Bogunović", "", "Skladište",
+              "Ekipa izvođača", "", "", "", 6)
+    print(f"{'godina':>7}{'datuma':>8}{'stari ms':>10}{'novi ms':>10}")
+    for n_years in years:
+        start = date(2026, 1, 1)
+        end = start + timedelta(days=365 * n_years)
+
+        t0 = time.perf_counter()
+        dates = []
+        current = start
+        while current <= end:
+            if current.weekday() in weekdays:
+                dates.append(current.strftime("%Y-%m-%d"))
+            current += timedelta(days=1)
+        for d in dates:
+            conn.execute(_VISIT_INSERT_SQL, fields[:1] + (d,) + fields[2:])
+        conn.commit()
+        old_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        dates = gate_app.expand_weekdays(start, end, weekdays)
+        conn.executemany(_VISIT_INSERT_SQL, [fields[:1] + (d,) + fields[2:] for d in dates])
+        conn.commit()
+        new_ms = (time.perf_counter() - t0) * 1000
+
+        print(f"{n_years:>7}{len(dates):>8}{old_ms:>10.1f}{new_ms:>10.1f}")
+    conn.close()
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def bench_gate_writes(guards: int = 16, clicks: int = 50) -> None:
+    """Ulaz/izlaz pod istovremenim klikovima: commit po zahtevu vs. GateWriter (group commit)."""
+    gate_app.init_db()
+    today = date.today().isoformat()
+    conn = gate_app.get_db()
+    fields = (today, "08:00", "Maja Bogunović", "Skladište", "Gost")
+    ids = [
+        conn.execute(
+            "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name) "
+            "VALUES (?, ?, ?, ?, ?)",
+            fields,
+        ).lastrowid
+        for _ in range(guards * clicks)
+    ]
+    conn.commit()
+    conn.close()
+    sql = "UPDATE visits SET entry_time = datetime('now') WHERE id = ?"
+
+    def direct(synchronous):
+        # stari put: svaka ruta sama radi UPDATE + commit na svojoj konekciji
+        local = threading.local()
+
+        def write(visit_id):
+            if not hasattr(local, "conn"):
+                local.conn = gate_app._connect()
+                local.conn.execute(f"PRAGMA synchronous = {synchronous}")
+            local.conn.execute(sql, (visit_id,))
+            local.conn.commit()
+        return write
+
+    def queued(batch_ms):
+        def factory(synchronous):
+            gate_app.GATE_WRITER_SYNCHRONOUS = synchronous
+            writer = gate_app.GateWriter(batch_ms=batch_ms)
+            return lambda visit_id: writer.execute(sql, (visit_id,))
+        return factory
+
+    print(f"{guards} portira x {clicks} klikova")
+    print(f"{'način':<12}{'sync':<8}{'upisa/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for synchronous in ("NORMAL", "FULL"):
+        for name, factory in (("direct", direct), ("queue", queued(0)), ("queue+5ms", queued(5))):
+            write = factory(synchronous)
+            latencies = []
+            barrier = threading.Barrier(guards)
+
+            def guard(chunk):
+                barrier.wait()
+                for visit_id in chunk:
+                    t0 = time.perf_counter()
+                    write(visit_id)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+
+            threads = [
+                threading.Thread(target=guard, args=(ids[g * clicks:(g + 1) * clicks],))
+                for g in range(guards)
+            ]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<12}{synchronous:<8}{len(latencies) / elapsed:>10.0f}"
+                f"{_percentile(latencies, 50):>9.2f}{_percentile(latencies, 99):>9.2f}"
+            )
+
+
+def _gate_write_worker(mode: str, synchronous: str, db_path: str, ids: list, start, result_queue) -> None:
+    # jedan wfastcgi proces: jedan zahtev u isto vreme, sopstvena konekcija/writer
+    os.environ["GATE_APP_DB"] = db_path
+    os.environ["GATE_APP_WRITER_SYNCHRONOUS"] = synchronous
+    import app as worker_app
+
+    sql = "UPDATE visits SET exit_time = datetime('now') WHERE id = ?"
+    if mode == "direct":
+        conn = worker_app._connect()
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+
+        def write(visit_id):
+            conn.execute(sql, (visit_id,))
+            conn.commit()
+    else:
+        writer = worker_app.GateWriter()
+        writer.execute("SELECT 1")  # thread i konekcija su topli, kao posle prvog zahteva
+
+        def write(visit_id):
+            writer.execute(sql, (visit_id,))
+
+    start.wait()
+    latencies = []
+    for visit_id in ids:
+        t0 = time.perf_counter()
+        write(visit_id)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    result_queue.put(latencies)
+
+
+def bench_gate_processes(processes: int = 8, clicks: int = 50) -> None:
+    """Ulaz/izlaz iz više procesa (kao wfastcgi): commit po zahtevu vs. GateWriter po procesu."""
+    gate_app.init_db()
+    conn = gate_app.get_db()
+    fields = (date.today().isoformat(), "08:00", "Maja Bogunović", "Skladište", "Gost")
+    ids = [
+        conn.execute(
+            "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name) "
+            "VALUES (?, ?, ?, ?, ?)",
+            fields,
+        ).lastrowid
+        for _ in range(processes * clicks)
+    ]
+    conn.commit()
+    conn.close()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{processes} procesa x {clicks} klikova (jedan zahtev po procesu u isto vreme)")
+    print(f"{'način':<12}{'sync':<8}{'upisa/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for synchronous in ("NORMAL", "FULL"):
+        for mode in ("direct", "queue"):
+            start = ctx.Event()
+            result_queue = ctx.Queue()
+            procs = [
+                ctx.Process(
+                    target=_gate_write_worker,
+                    args=(mode, synchronous, gate_app.DB_PATH,
+                          ids[p * clicks:(p + 1) * clicks], start, result_queue),
+                )
+                for p in range(processes)
+            ]
+            for proc in procs:
+                proc.start()
+            time.sleep(2)  # import app + init u svim procesima
+            t0 = time.perf_counter()
+            start.set()
+            latencies = []
+            for _ in procs:
+                latencies += result_queue.get()
+            elapsed = time.perf_counter() - t0
+            for proc in procs:
+                proc.join()
+            print(
+                f"{mode:<12}{synchronous:<8}{len(latencies) / elapsed:>10.0f}"
+                f"{_percentile(latencies, 50):>9.2f}{_percentile(latencies, 99):>9.2f}"
+            )
+
+
+def bench_stats(rows: int = 500000, repeat: int = 5) -> None:
+    """Statistika za višegodišnji opseg: GROUP BY nad visits vs. stats_daily rollup."""
+    seed_visits(rows)
+    conn = gate_app.get_db()
+    date_from, date_to = "2021-01-15", "2024-06-20"
+    raw_sql = """
+        SELECT host_employee, COUNT(*), SUM(COALESCE(persons_count, 1)),
+               AVG((julianday(exit_time) - julianday(entry_time)) * 1440)
+        FROM visits
+        WHERE entry_time IS NOT NULL AND exit_time IS NOT NULL AND arrival_date BETWEEN ? AND ?
+        GROUP BY host_employee ORDER BY COUNT(*) DESC LIMIT 50
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(raw_sql, (date_from, date_to)).fetchall()
+    raw_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        gate_app.load_stats(conn, date_from, date_to)
+    rollup_ms = (time.perf_counter() - start) * 1000 / repeat
+    conn.close()
+    print(f"{rows} poseta")
+    print(f"sirovi GROUP BY (samo domaćini): {raw_ms:.1f} ms")
+    print(f"load_stats iz rollup-a (sve):     {rollup_ms:.1f} ms")
+
+
+def bench_import(rows: int = 50000) -> None:
+    """Masovni uvoz najava: CSV i XLSX (streaming parse + blokovi po 1000)."""
+    import visit_import
+    import xlsx_stream
+
+    gate_app.init_db()
+    conn = gate_app.get_db()
+    employees = visit_import.lookup_values(conn, "employee")
+    objects = visit_import.lookup_values(conn, "object")
+    host, obj = sorted(employees)[0], sorted(objects)[0]
+    rnd = random.Random(7)
+    headers = ["Datum najave", "Očekivano vreme", "Kod koga dolazi", "Objekat", "Gost", "Broj osoba"]
+    data = [
+        (f"2027-{1 + i % 12:02d}-{1 + i % 28:02d}", "09:00", host, obj, _person(rnd), 1 + i % 3)
+        for i in range(rows)
+    ]
+    csv_path = os.path.join(_BENCH_DIR, "uvoz.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write(";".join(headers) + "\n")
+        for row in data:
+            f.write(";".join(str(v) for v in row) + "\n")
+    xlsx_path = os.path.join(_BENCH_DIR, "uvoz.xlsx")
+    with open(xlsx_path, "wb") as f:
+        for chunk in xlsx_stream.iter_xlsx("Posete", headers, [data]):
+            f.write(chunk)
+    del data
+
+    def run(path):
+        with open(path, "rb") as f:
+            result = visit_import.import_visits(
+                conn, visit_import.iter_rows(path, f), ADMIN_EMAIL, employees, objects
+            )
+        assert result["inserted"] == rows, result
+
+    print(f"{rows} redova")
+    print(f"{'fajl':<8}{'s':>8}{'redova/s':>10}{'vrh MB':>9}")
+    for path in (csv_path, xlsx_path):
+        start = time.perf_counter()
+        run(path)
+        elapsed = time.perf_counter() - start
+        # vršna Python memorija u drugom prolazu (tracemalloc usporava pa se ne meri vreme)
+        tracemalloc.start()
+        run(path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{os.path.splitext(path)[1]:<8}{elapsed:>8.2f}{rows / elapsed:>10.0f}{peak / 1e6:>9.1f}")
+    conn.close()
+
+
+_FIRST_REQUEST_SCRIPT = """
+import time
+start = time.perf_counter()
+import run
+imported = time.perf_counter()
+client = run.app.test_client()
+client.post("/login", data={"email": %r, "password": "1"})
+logged_in = time.perf_counter()
+for path in %r:
+    client.get(path)
+done = time.perf_counter()
+print(imported - start, done - logged_in)
+"""
+
+
+def bench_startup(runs: int = 5) -> None:
+    """Hladan start workera: import run.py (+ init_db) i prvi zahtevi po šablonu."""
+    gate_app.init_db()
+    script = _FIRST_REQUEST_SCRIPT % (ADMIN_EMAIL, BENCH_ROUTES)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def cold_start(env):
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=cwd, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        return float(out[0]) * 1000, float(out[1]) * 1000
+
+    print(f"{'šabloni':<22}{'import ms':>10}{'prve strane ms':>16}")
+    gate_app.precompile_templates()
+    for label, shared_cache in (("bez bytecode keša", False), ("bytecode keš", True)):
+        results = []
+        for _ in range(runs):
+            # bez keša: svaki proces dobija prazan direktorijum
+            cache_dir = gate_app.JINJA_CACHE_DIR if shared_cache else tempfile.mkdtemp(dir=_BENCH_DIR)
+            results.append(cold_start({**os.environ, "GATE_APP_JINJA_CACHE": cache_dir}))
+        imports = sorted(r[0] for r in results)
+        pages = sorted(r[1] for r in results)
+        print(f"{label:<22}{imports[runs // 2]:>10.0f}{pages[runs // 2]:>16.1f}")
+    print(f"({len(BENCH_ROUTES)} ruta, medijana od {runs} procesa)")
+
+
+def bench_compression(rows: int = 5000, repeat: int = 5, link_mbit: float = 10.0) -> None:
+    """Veličina i vreme velikih strana po kodiranju (CompressionMiddleware)."""
+    import compression
+
+    seed_visits(rows)
+    encodings = ["identity", "deflate", "gzip"] + (["br"] if compression.brotli else [])
+    routes = [
+        "/security/posete/data?draw=1&start=0&length=500",
+        "/moje-najave",  # sve seed posete su najave admina
+    ]
+    with gate_app.app.test_client() as client:
+        _login(client)
+        print(f"{'ruta':<28}{'kodiranje':<10}{'KB':>9}{'server ms':>11}{f'ms @{link_mbit:g} Mbit/s':>18}")
+        for path in routes:
+            for encoding in encodings:
+                headers = {"Accept-Encoding": encoding}
+                client.get(path, headers=headers)
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    size = len(client.get(path, headers=headers).get_data())
+                server_ms = (time.perf_counter() - start) * 1000 / repeat
+                transfer_ms = size * 8 / (link_mbit * 1e6) * 1000
+                print(
+                    f"{path.split('?')[0]:<28}{encoding:<10}{size / 1024:>9.1f}"
+                    f"{server_ms:>11.1f}{server_ms + transfer_ms:>18.1f}"
+                )
+    print(f"{rows} poseta; ušteda po endpoint-u: /admin/compression-stats")
+
+
+# Opterećenje: istovremeni portiri, obezbeđenje i zaposleni nad sintetičkom
+# bazom (synthetic_data.py). Svaki radnik ima svoj test client i svoj
+# Random(seed), pa isti parametri daju isti niz zahteva po radniku.
+LOAD_ROLES = {"gate": "portirnica", "security": "security_chief", "employee": "employee"}
+LOAD_EXPECTED_STATUS = {"GET": 200, "POST": 302}
+
+
+def _gate_actions(state):
+    def visit_in(client, rnd):
+        with state["lock"]:
+            visit_id = state["pending"].pop() if state["pending"] else None
+        if visit_id is None:
+            return "GET /posete/portirnica", client.get("/posete/portirnica"), 200
+        resp = client.post(f"/posete/evidentiraj-ulaz/{visit_id}", headers={"X-Requested-With": "fetch"})
+        with state["lock"]:
+            state["inside"].append(visit_id)
+        return "POST /posete/evidentiraj-ulaz", resp, 204
+
+    def visit_out(client, rnd):
+        with state["lock"]:
+            visit_id = state["inside"].pop(0) if state["inside"] else None
+        if visit_id is None:
+            return "GET /posete/portirnica", client.get("/posete/portirnica"), 200
+        resp = client.post(f"/posete/evidentiraj-izlaz/{visit_id}", headers={"X-Requested-With": "fetch"})
+        return "POST /posete/evidentiraj-izlaz", resp, 204
+
+    def truck_in(client, rnd):
+        resp = client.post("/kamioni/unos", data={
+            "driver_name": _person(rnd), "driver_document": "", "codriver_name": "",
+            "codriver_document": "", "plate": synthetic_data.plate(rnd),
+            "destination": rnd.choice(synthetic_data.DESTINATIONS),
+        })
+        return "POST /kamioni/unos", resp, 302
+
+    return [
+        (5, lambda client, rnd: ("GET /posete/portirnica", client.get("/posete/portirnica"), 200)),
+        (3, lambda client, rnd: ("GET /kamioni/portirnica", client.get("/kamioni/portirnica"), 200)),
+        (1, lambda client, rnd: ("GET /portirnica/prisutni", client.get("/portirnica/prisutni"), 200)),
+        (3, visit_in),
+        (2, visit_out),
+        (1, truck_in),
+    ]
+
+
+def _security_actions(state):
+    first_day, last_day = state["first_day"], date.today()
+    span = (last_day - first_day).days
+
+    def month(rnd):
+        start = first_day + timedelta(days=rnd.randrange(max(span - 30, 1)))
+        return {"date_from": start.isoformat(), "date_to": (start + timedelta(days=30)).isoformat()}
+
+    def data(label, path, params):
+        return lambda client, rnd: (
+            label, client.get(path, query_string={"draw": 1, "length": 25, **params(rnd)}), 200
+        )
+
+    return [
+        (4, data("GET /security/posete/data", "/security/posete/data",
+                 lambda rnd: {"start": rnd.randrange(0, 250, 25)})),
+        (2, data("GET /security/posete/data (mesec+domaćin)", "/security/posete/data",
+                 lambda rnd: {**month(rnd), "host": rnd.choice(state["hosts"]).split()[-1]})),
+        (2, data("GET /security/posete/data (pretraga)", "/security/posete/data",
+                 lambda rnd: {"search[value]": rnd.choice(synthetic_data.LAST_NAMES)})),
+        (2, data("GET /security/kamioni/data", "/security/kamioni/data",
+                 lambda rnd: {**month(rnd), "destination": rnd.choice(synthetic_data.DESTINATIONS)})),
+        (1, data("GET /security/statistika/data", "/security/statistika/data",
+                 lambda rnd: {"date_from": first_day.isoformat(), "date_to": last_day.isoformat()})),
+    ]
+
+
+def _employee_actions(state):
+    def announce(client, rnd):
+        day = date.today() + timedelta(days=rnd.randint(1, 14))
+        resp = client.post("/posete/najava", data={
+            "visit_mode": "single", "arrival_date": day.isoformat(), "expected_time": "10:00",
+            "host_employee": rnd.choice(state["hosts"]), "phone": "",
+            "object_name": rnd.choice(OBJECTS), "guest_name": _person(rnd),
+            "document_number": "", "vehicle_plate": "", "note": "", "persons_count": "1",
+        })
+        return "POST /posete/najava", resp, 302
+
+    return [
+        (2, lambda client, rnd: ("GET /", client.get("/"), 200)),
+        (3, lambda client, rnd: ("GET /posete/najava", client.get("/posete/najava"), 200)),
+        (1, announce),
+        (2, lambda client, rnd: ("GET /moje-najave", client.get("/moje-najave"), 200)),
+    ]
+
+
+LOAD_WORKLOADS = {"gate": _gate_actions, "security": _security_actions, "employee": _employee_actions}
+
+
+def _prepare_load_db(visits: int, years: int, seed: int) -> dict:
+    """Generiše bazu ili koristi već generisanu sa istim parametrima."""
+    gate_app.init_db()
+    conn = gate_app.get_db()
+    try:
+        params = synthetic_data.generated_params(conn)
+        if params is None:
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM visits)").fetchone()[0]:
+                raise SystemExit("load: baza već ima posete koje nisu iz synthetic_data.py")
+            result = synthetic_data.generate(conn, visits, years=years, seed=seed)
+            print(f"generisano {result['visits']} poseta, {result['trucks']} kamiona "
+                  f"za {result['seconds']:.1f} s")
+            params = result["params"]
+        elif (params["visits"], params["years"], params["seed"]) != (visits, years, seed):
+            raise SystemExit(f"load: baza je generisana sa drugim parametrima: {params}")
+        users = {
+            role: [r[0] for r in conn.execute(
+                "SELECT email FROM users WHERE role = ? AND is_active = 1 ORDER BY id", (role,)
+            )]
+            for role in LOAD_ROLES.values()
+        }
+        hosts = [r[0] for r in conn.execute(
+            "SELECT value FROM lookups WHERE type = 'employee' AND active = 1 ORDER BY id"
+        )]
+        first_day = date.fromisoformat(conn.execute("SELECT MIN(arrival_date) FROM visits").fetchone()[0])
+    finally:
+        conn.close()
+    return {"params": params, "users": users, "hosts": hosts, "first_day": first_day}
+
+
+def _announce_for_gate(count: int, seed: int) -> list:
+    """Današnje najave na koje portiri tokom testa evidentiraju ulaz/izlaz."""
+    rnd = random.Random(seed)
+    conn = gate_app.get_db()
+    ids = []
+    for _ in range(count):
+        ids.append(conn.execute(
+            "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (date.today().isoformat(), "10:00", _person(rnd), rnd.choice(OBJECTS), _person(rnd)),
+        ).lastrowid)
+    conn.commit()
+    conn.close()
+    gate_app.bump_data_version("visit")
+    return ids
+
+
+def compare_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """Rute čiji je p95 (ili ukupni protok) gori od baseline-a za više od tolerance."""
+    regressions = []
+    for label, old in baseline["routes"].items():
+        new = result["routes"].get(label)
+        # ispod 1 ms razlika je šum merenja
+        if new and new["p95_ms"] > old["p95_ms"] * (1 + tolerance) and new["p95_ms"] - old["p95_ms"] > 1:
+            regressions.append(f"{label}: p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} ms")
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(
+            f"protok {baseline['throughput_rps']:.0f} -> {result['throughput_rps']:.0f} zahteva/s"
+        )
+    return regressions
+
+
+def bench_load(visits: int = 100000, years: int = 5, seed: int = 1, requests: int = 200,
+               gate: int = 2, security: int = 2, employee: int = 4,
+               baseline: str = None, save_baseline: str = None, tolerance: float = 0.25) -> None:
+    """Istovremeni portiri/obezbeđenje/zaposleni nad sintetičkom bazom: protok i p50/p95/p99 po ruti."""
+    state = _prepare_load_db(visits, years, seed)
+    workers = {"gate": gate, "security": security, "employee": employee}
+    state.update(
+        lock=threading.Lock(),
+        pending=_announce_for_gate(gate * requests, seed),
+        inside=[],
+    )
+
+    samples = []  # (oznaka, ms, ok)
+    samples_lock = threading.Lock()
+    barrier = threading.Barrier(sum(workers.values()) + 1)
+
+    def worker(workload, index, email):
+        actions = LOAD_WORKLOADS[workload](state)
+        weights = [w for w, _ in actions]
+        rnd = random.Random(seed * 1000 + index)
+        local = []
+        with gate_app.app.test_client() as client:
+            _login(client, email)
+            barrier.wait()
+            for _ in range(requests):
+                action = rnd.choices(actions, weights)[0][1]
+                t0 = time.perf_counter()
+                label, resp, expected = action(client, rnd)
+                resp.get_data()
+                local.append((label, (time.perf_counter() - t0) * 1000, resp.status_code == expected))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = []
+    for workload, count in workers.items():
+        emails = state["users"][LOAD_ROLES[workload]]
+        for i in range(count):
+            index = len(threads)
+            threads.append(threading.Thread(
+                target=worker, args=(workload, index, emails[i % len(emails)])
+            ))
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    routes = {}
+    for label, ms, ok in samples:
+        routes.setdefault(label, []).append((ms, ok))
+    result = {
+        "params": {**state["params"], "requests": requests, "workers": workers},
+        "throughput_rps": len(samples) / elapsed,
+        "routes": {},
+    }
+    print(f"{state['params']['visits']} poseta, radnici {workers}, {requests} zahteva po radniku")
+    print(f"{'ruta':<44}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'greške':>8}")
+    for label in sorted(routes):
+        latencies = [ms for ms, _ in routes[label]]
+        item = {
+            "n": len(latencies),
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "errors": sum(1 for _, ok in routes[label] if not ok),
+        }
+        result["routes"][label] = item
+        print(f"{label:<44}{item['n']:>6}{item['p50_ms']:>9.1f}{item['p95_ms']:>9.1f}"
+              f"{item['p99_ms']:>9.1f}{item['errors']:>8}")
+    print(f"ukupno {len(samples)} zahteva za {elapsed:.1f} s = {result['throughput_rps']:.0f} zahteva/s")
+
+    if save_baseline:
+        with open(save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"baseline sačuvan: {save_baseline}")
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare_baseline(result, old, tolerance)
+        for line in regressions:
+            print(f"REGRESIJA {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"nema regresija u odnosu na {baseline} (tolerancija {tolerance:.0%})")
+
+
+BENCHMARKS = {
+    "connections": bench_connections,
+    "export": bench_export,
+    "search": bench_search,
+    "recurring": bench_recurring,
+    "gate_writes": bench_gate_writes,
+    "gate_processes": bench_gate_processes,
+    "stats": bench_stats,
+    "import": bench_import,
+    "startup": bench_startup,
+    "compression": bench_compression,
+    "load": bench_load,
+}
+# load pravi sopstvenu (veliku) bazu, pa se pokreće posebno: python benchmarks.py load
+DEFAULT_BENCHMARKS = [name for name in BENCHMARKS if name != "load"]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", metavar="ime",
+                        help=f"benchmarki ({', '.join(BENCHMARKS)}); podrazumevano svi osim load")
+    load = parser.add_argument_group("load")
+    load.add_argument("--visits", type=int, default=100000, help="10k – 5M poseta")
+    load.add_argument("--years", type=int, default=5)
+    load.add_argument("--seed", type=int, default=1)
+    load.add_argument("--requests", type=int, default=200, help="zahteva po radniku")
+    load.add_argument("--gate", type=int, default=2, help="broj portira")
+    load.add_argument("--security", type=int, default=2, help="broj korisnika obezbeđenja")
+    load.add_argument("--employee", type=int, default=4, help="broj zaposlenih")
+    load.add_argument("--baseline", help="JSON za poređenje; izlaz 1 ako ima regresija")
+    load.add_argument("--save-baseline", help="sačuvaj rezultat kao JSON baseline")
+    load.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"nepoznat benchmark: {', '.join(unknown)}")
+
+    for name in args.names or DEFAULT_BENCHMARKS:
+        print(f"== {name} ==")
+        if name == "load":
+            bench_load(
+                args.visits, args.years, args.seed, args.requests, args.gate, args.security,
+                args.employee, args.baseline, args.save_baseline, args.tolerance,
+            )
+        else:
+            BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
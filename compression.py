@@ -0,0 +1,228 @@
+"""WSGI kompresija odgovora (gzip/deflate, br ako je paket brotli instaliran).
+
+HTML tabele (moje najave, security pregledi) i JSON za DataTables su
+uglavnom ponovljeni markup i sabijaju se 5-10 puta. Middleware bira
+kodiranje po Accept-Encoding zaglavlju i:
+
+- odgovore poznate dužine (render_template, jsonify) sabija ceo i
+  postavlja novi Content-Length; manji od min_size idu nesabijeni,
+- odgovore bez Content-Length (SSE, streaming export) sabija blok po blok
+  sa SYNC_FLUSH, tako da svaki blok odmah stiže do browsera,
+- ne dira odgovore koji već imaju Content-Encoding (.gz statički fajlovi)
+  ni tipove koji nisu tekst – XLSX je već zip arhiva.
+
+Po endpoint-u se broje odgovori i bajtovi pre/posle kompresije.
+"""
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # opciono: pip install brotli
+    brotli = None
+
+# tipovi koji se sabijaju (prefiks Content-Type-a); XLSX/ZIP/slike nisu tu
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+MIN_SIZE = 1024  # bajtova; manji odgovori ne vrede CPU i zaglavlje
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # br kvalitet 10-11 je prespor za dinamičke strane
+
+
+def negotiate(accept_encoding: str):
+    """Najbolje podržano kodiranje iz Accept-Encoding, ili None."""
+    supported = (("br",) if brotli is not None else ()) + ("gzip", "deflate")
+    offered = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for name in supported:
+        q = offered.get(name, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class _Compressor:
+    """Isti interfejs za zlib i brotli: compress(blok) / flush() / finish()."""
+
+    def __init__(self, encoding: str):
+        self._br = encoding == "br"
+        if self._br:
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31 = gzip zaglavlje, 15 = zlib ("deflate" u HTTP-u)
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data) if self._br else self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush() if self._br else self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.finish() if self._br else self._obj.flush(zlib.Z_FINISH)
+
+
+def _endpoint(environ) -> str:
+    # Flask drži Request u environ-u dok traje zahtev (start_response se
+    # zove pre nego što se kontekst ugasi); url_rule je poznat posle rutiranja
+    rule = getattr(environ.get("werkzeug.request"), "url_rule", None)
+    return rule.endpoint if rule is not None else "-"
+
+
+def _weak_etag(value: str) -> str:
+    # sabijeno telo nije bajt-po-bajt isto, pa ETag postaje slab (W/)
+    return value if value.startswith("W/") else "W/" + value
+
+
+def _add_vary(headers: list) -> list:
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == "vary":
+            if "accept-encoding" in value.lower():
+                return headers
+            headers = list(headers)
+            headers[i] = (name, f"{value}, Accept-Encoding")
+            return headers
+    return list(headers) + [("Vary", "Accept-Encoding")]
+
+
+class _CompressedStream:
+    """Telo bez poznate dužine: svaki blok se sabija i odmah šalje (SYNC_FLUSH)."""
+
+    def __init__(self, app_iter, encoding: str, on_close):
+        self._app_iter = app_iter
+        self._compressor = _Compressor(encoding)
+        self._on_close = on_close
+        self.bytes_in = self.bytes_out = 0
+
+    def __iter__(self):
+        for chunk in self._app_iter:
+            if not chunk:
+                continue
+            data = self._compressor.compress(chunk) + self._compressor.flush()
+            self.bytes_in += len(chunk)
+            self.bytes_out += len(data)
+            yield data
+        data = self._compressor.finish()
+        self.bytes_out += len(data)
+        yield data
+
+    def close(self) -> None:
+        # server zove close() i kada klijent prekine vezu (SSE)
+        try:
+            if hasattr(self._app_iter, "close"):
+                self._app_iter.close()
+        finally:
+            self._on_close(self.bytes_in, self.bytes_out)
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app, min_size: int = MIN_SIZE):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self._lock = threading.Lock()
+        self.stats = {}  # endpoint -> {"responses", "bytes_in", "bytes_out"}
+
+    def _record(self, endpoint: str, bytes_in: int, bytes_out: int) -> None:
+        with self._lock:
+            item = self.stats.setdefault(endpoint, {"responses": 0, "bytes_in": 0, "bytes_out": 0})
+            item["responses"] += 1
+            item["bytes_in"] += bytes_in
+            item["bytes_out"] += bytes_out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                endpoint: {**item, "bytes_saved": item["bytes_in"] - item["bytes_out"]}
+                for endpoint, item in sorted(self.stats.items())
+            }
+
+    def _mode(self, status: str, headers: list, encoding):
+        """None (ne sabija), "buffer" (poznata dužina) ili "stream"."""
+        code = int(status[:3])
+        if encoding is None or code < 200 or code in (204, 206, 304):
+            return None
+        values = {name.lower(): value for name, value in headers}
+        if "content-encoding" in values or "no-transform" in values.get("cache-control", ""):
+            return None
+        if not values.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return None
+        length = values.get("content-length")
+        if length is None:
+            return "stream"
+        return "buffer" if int(length) >= self.min_size else None
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            encoding = None
+        state = {}
+
+        def _start_response(status, headers, exc_info=None):
+            mode = self._mode(status, headers, encoding)
+            content_type = next((v for k, v in headers if k.lower() == "content-type"), "")
+            if content_type.startswith(COMPRESSIBLE_TYPES):
+                headers = _add_vary(headers)
+            if encoding is not None and status.startswith("304"):
+                headers = [(k, _weak_etag(v) if k.lower() == "etag" else v) for k, v in headers]
+            if mode is None:
+                state["mode"] = None
+                return start_response(status, headers, exc_info)
+
+            headers = [
+                (k, _weak_etag(v) if k.lower() == "etag" else v)
+                for k, v in headers if k.lower() != "content-length"
+            ]
+            headers.append(("Content-Encoding", encoding))
+            state.update(
+                mode=mode, status=status, headers=headers, exc_info=exc_info,
+                endpoint=_endpoint(environ),
+            )
+            if mode == "stream":
+                return start_response(status, headers, exc_info)
+            # dužina se zna tek posle sabijanja; write() se u Flask-u ne koristi
+            state["written"] = []
+            return state["written"].append
+
+        app_iter = self.wsgi_app(environ, _start_response)
+        mode = state.get("mode")
+        if mode is None:
+            return app_iter
+        if mode == "buffer":
+            return self._buffered(start_response, app_iter, state, encoding)
+        return _CompressedStream(
+            app_iter, encoding,
+            lambda bytes_in, bytes_out: self._record(state["endpoint"], bytes_in, bytes_out),
+        )
+
+    def _buffered(self, start_response, app_iter, state, encoding):
+        try:
+            body = b"".join(state["written"]) + b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+        compressor = _Compressor(encoding)
+        data = compressor.compress(body) + compressor.finish()
+        self._record(state["endpoint"], len(body), len(data))
+        start_response(
+            state["status"],
+            state["headers"] + [("Content-Length", str(len(data)))],
+            state["exc_info"],
+        )
+        return [data]
@@ -0,0 +1,250 @@
+"""Merenje zahteva: latencija po endpoint-u, SQL naredbe, konekcije, render.
+
+Tokom zahteva se u thread-local RequestStats skuplja:
+- broj SQL naredbi (sqlite3 set_trace_callback, vidi i BEGIN/COMMIT),
+- vreme u execute()/executemany() (InstrumentedConnection/Cursor),
+- broj i vreme uzimanja konekcija, vreme provere prava i renderovanja.
+Na kraju zahteva sve ide u histograme/brojače po endpoint-u, koji se
+čitaju u Prometheus tekst formatu (/admin/metrics).
+
+Upiti sporiji od GATE_APP_SLOW_QUERY_MS se loguju sa oblikom parametara
+(tipovi, ne vrednosti – u parametrima su imena i brojevi dokumenata).
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+SLOW_QUERY_MS = float(os.environ.get("GATE_APP_SLOW_QUERY_MS", "100"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SQL_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# polja RequestStats koja se sabiraju u brojače po endpoint-u
+COUNTERS = {
+    "sql_seconds": "Vreme u SQL execute/executemany",
+    "connect_seconds": "Vreme uzimanja SQLite konekcije (pool/connect)",
+    "connections": "Broj uzetih SQLite konekcija",
+    "render_seconds": "Vreme renderovanja Jinja šablona",
+    "auth_seconds": "Vreme provere prijave i role (require_role)",
+    "slow_queries": "Broj upita sporijih od praga",
+}
+
+log = logging.getLogger("gate_app.sql")
+_local = threading.local()
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.render_started = []
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+
+def current():
+    return getattr(_local, "stats", None)
+
+
+def begin_request() -> None:
+    _local.stats = RequestStats()
+
+
+def end_request():
+    stats = current()
+    _local.stats = None
+    return stats
+
+
+def add(name: str, value=1) -> None:
+    stats = current()
+    if stats is not None:
+        setattr(stats, name, getattr(stats, name) + value)
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start)
+
+
+def trace_statement(sql: str) -> None:
+    """set_trace_callback: poziva se za svaku naredbu koju SQLite izvrši."""
+    stats = current()
+    if stats is not None:
+        stats.sql_count += 1
+
+
+def template_started(*args, **kwargs) -> None:
+    stats = current()
+    if stats is not None:
+        stats.render_started.append(time.perf_counter())
+
+
+def template_finished(*args, **kwargs) -> None:
+    stats = current()
+    if stats is not None and stats.render_started:
+        stats.render_seconds += time.perf_counter() - stats.render_started.pop()
+
+
+def params_shape(parameters) -> str:
+    """(str, int x 3, NoneType) umesto vrednosti; {ime: tip} za imenovane."""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    runs = []
+    for value in parameters:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return "(" + ", ".join(name if n == 1 else f"{name} x {n}" for name, n in runs) + ")"
+
+
+def _many_shape(seq_of_parameters) -> str:
+    if isinstance(seq_of_parameters, (list, tuple)):
+        if not seq_of_parameters:
+            return "0 x ()"
+        return f"{len(seq_of_parameters)} x {params_shape(seq_of_parameters[0])}"
+    return "iterator"
+
+
+def _record_query(sql: str, shape, elapsed: float, rows: int = 1) -> None:
+    stats = current()
+    if stats is not None:
+        stats.sql_seconds += elapsed
+    # executemany: prag važi po redu, blok od 10000 INSERT-a nije spor upit
+    if elapsed * 1000 / max(rows, 1) >= SLOW_QUERY_MS:
+        if stats is not None:
+            stats.slow_queries += 1
+        log.warning(
+            "Spor upit %.1f ms: %s params=%s",
+            elapsed * 1000, re.sub(r"\s+", " ", sql).strip()[:500], shape(),
+        )
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, lambda: params_shape(parameters), time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            rows = len(seq_of_parameters) if isinstance(seq_of_parameters, (list, tuple)) else 1
+            _record_query(
+                sql, lambda: _many_shape(seq_of_parameters), time.perf_counter() - start, rows
+            )
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """conn.execute() u C implementaciji ne ide kroz cursor(), pa se preusmerava."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # poslednji je +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list:
+        out = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f"{name}_sum{{{labels}}} {_number(self.sum)}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+def _number(value) -> str:
+    return f"{value:.6f}" if isinstance(value, float) else str(value)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """Agregati po endpoint-u za ceo proces (svaki FastCGI worker ima svoje)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint: str, stats: RequestStats) -> None:
+        latency = time.perf_counter() - stats.started
+        with self._lock:
+            item = self._endpoints.get(endpoint)
+            if item is None:
+                item = self._endpoints[endpoint] = {
+                    "latency": Histogram(LATENCY_BUCKETS),
+                    "sql": Histogram(SQL_COUNT_BUCKETS),
+                    **{name: 0 for name in COUNTERS},
+                }
+            item["latency"].observe(latency)
+            item["sql"].observe(stats.sql_count)
+            for name in COUNTERS:
+                item[name] += getattr(stats, name)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    def prometheus(self, extra=()) -> str:
+        """Tekst za Prometheus; extra = [(ime, tip, opis, vrednost)] bez labela."""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                "# HELP gate_app_request_duration_seconds Trajanje zahteva po endpoint-u",
+                "# TYPE gate_app_request_duration_seconds histogram",
+            ]
+            for endpoint, item in endpoints:
+                lines += item["latency"].lines(
+                    "gate_app_request_duration_seconds", f'endpoint="{_label(endpoint)}"'
+                )
+            lines += [
+                "# HELP gate_app_request_sql_statements SQL naredbi po zahtevu",
+                "# TYPE gate_app_request_sql_statements histogram",
+            ]
+            for endpoint, item in endpoints:
+                lines += item["sql"].lines(
+                    "gate_app_request_sql_statements", f'endpoint="{_label(endpoint)}"'
+                )
+            for name, help_text in COUNTERS.items():
+                metric = f"gate_app_request_{name}_total"
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for endpoint, item in endpoints:
+                    lines.append(f'{metric}{{endpoint="{_label(endpoint)}"}} {_number(item[name])}')
+        for name, metric_type, help_text, value in extra:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
@@ -1,64 +1,217 @@
+"""Uvoz lookup vrednosti (zaposleni, objekti, odredišta) iz Excel-a.
+
+Podrazumevano radi sinhronizaciju: sheet se čita u read-only modu, poredi
+sa postojećim vrednostima i upisuju se samo razlike u jednoj kratkoj
+transakciji. Vrednosti kojih nema u sheet-u se povlače (active = 0, kao
+"Povuci" u admin ekranu), a povučene koje se vrate u sheet se ponovo
+aktiviraju. Ako se SHA-256 fajla nije promenio od poslednje
+sinhronizacije, baza se uopšte ne dira – pogodno za Task Scheduler dok
+portirnica radi.
+
+--full uz to briše povučene vrednosti koje nijedna poseta/kamion u živoj
+bazi ne koristi; korišćene ostaju povučene.
+
+Pokretanje:
+    python load_lookups_from_excel.py ["VEB APP.xlsx"] [--force] [--full]
+"""
+import argparse
+import hashlib
 import os
-from openpyxl import load_workbook
 
 from app import init_db, get_db
 
+SHEET_NAME = "Baza za padajuci meni"
 
-def import_lookups_from_excel(xlsx_path: str) -> None:
-    if not os.path.exists(xlsx_path):
-        raise FileNotFoundError(f"Excel fajl nije pronađen: {xlsx_path}")
+# tip lookup-a -> indeks kolone u sheet-u
+LOOKUP_COLUMNS = {"employee": 0, "object": 2, "destination": 4}
 
-    init_db()
+# izvor u import_files sa hešom poslednjeg sinhronizovanog fajla
+HASH_SOURCE = "lookups_excel"
 
-    wb = load_workbook(xlsx_path, data_only=True)
-    try:
-        ws = wb["Baza za padajuci meni"]
-    except KeyError:
-        raise KeyError("Sheet 'Baza za padajuci meni' nije pronađen u Excel fajlu.")
+SAVE_HASH_SQL = """
+    INSERT INTO import_files (source, sha256) VALUES (?, ?)
+    ON CONFLICT (source) DO UPDATE SET sha256 = excluded.sha256, imported_at = excluded.imported_at
+"""
 
-    employees = set()
-    objects = set()
-    destinations = set()
+# tip lookup-a -> (tabela, kolona) u kojoj se vrednost koristi
+LOOKUP_REFERENCES = {
+    "employee": ("visits", "host_employee"),
+    "object": ("visits", "object_name"),
+    "destination": ("trucks", "destination"),
+}
 
+UPSERT_SQL = """
+    INSERT INTO lookups (type, value) VALUES (?, ?)
+    ON CONFLICT (type, value) DO UPDATE SET active = 1
+"""
 
-    for row in ws.iter_rows(min_row=2):
-        val_emp = row[0].value
-        val_obj = row[2].value
-        val_dest = row[4].value
 
-        if isinstance(val_emp, str) and val_emp.strip():
-            employees.add(val_emp.strip())
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-        if isinstance(val_obj, str) and val_obj.strip():
-            objects.add(val_obj.strip())
 
-        if isinstance(val_dest, str) and val_dest.strip():
-            destinations.add(val_dest.strip())
+def read_lookups(xlsx_path: str) -> dict:
+    """Vraća {tip: set(vrednosti)} iz sheet-a, čitanjem red po red."""
+    from openpyxl import load_workbook
 
-    conn = get_db()
-    cur = conn.cursor()
+    if not os.path.exists(xlsx_path):
+        raise FileNotFoundError(f"Excel fajl nije pronađen: {xlsx_path}")
+
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        try:
+            ws = wb[SHEET_NAME]
+        except KeyError:
+            raise KeyError(f"Sheet '{SHEET_NAME}' nije pronađen u Excel fajlu.")
+
+        values = {lookup_type: set() for lookup_type in LOOKUP_COLUMNS}
+        for row in ws.iter_rows(min_row=2, values_only=True):
+            for lookup_type, index in LOOKUP_COLUMNS.items():
+                value = row[index] if index < len(row) else None
+                if isinstance(value, str) and value.strip():
+                    values[lookup_type].add(value.strip())
+        return values
+    finally:
+        wb.close()
+
+
+def _apply_lookups(conn, wanted: dict, delete_unused: bool = False) -> dict:
+    """Usklađuje tabelu lookups sa {tip: set(vrednosti)} u otvorenoj transakciji.
+
+    Vraća {"inserted", "reactivated", "retired", "deleted"}, svaki {tip: n}.
+    """
+    result = {"inserted": {}, "reactivated": {}, "retired": {}, "deleted": {}}
+    for lookup_type, values in wanted.items():
+        existing = {
+            item["value"]: (item["id"], item["active"])
+            for item in conn.execute(
+                "SELECT id, value, active FROM lookups WHERE type = ?", (lookup_type,)
+            )
+        }
+        to_retire = [
+            (item_id,) for value, (item_id, active) in existing.items()
+            if active and value not in values
+        ]
+        to_upsert = [
+            (lookup_type, v) for v in sorted(values)
+            if v not in existing or not existing[v][1]
+        ]
+        to_delete = []
+        if delete_unused:
+            table, column = LOOKUP_REFERENCES[lookup_type]
+            unused = [v for v in existing if v not in values]
+            if unused:
+                used = {r[0] for r in conn.execute(f"SELECT DISTINCT {column} FROM {table}")}
+                to_delete = [(existing[v][0],) for v in unused if v not in used]
+                deleted_ids = set(to_delete)
+                to_retire = [item for item in to_retire if item not in deleted_ids]
+
+        conn.executemany("UPDATE lookups SET active = 0 WHERE id = ?", to_retire)
+        conn.executemany("DELETE FROM lookups WHERE id = ?", to_delete)
+        conn.executemany(UPSERT_SQL, to_upsert)
+        result["inserted"][lookup_type] = sum(1 for _, v in to_upsert if v not in existing)
+        result["reactivated"][lookup_type] = len(to_upsert) - result["inserted"][lookup_type]
+        result["retired"][lookup_type] = len(to_retire)
+        result["deleted"][lookup_type] = len(to_delete)
+    return result
+
+
+def sync_lookups_from_excel(xlsx_path: str, force: bool = False) -> dict:
+    """Primenjuje samo razlike između sheet-a i tabele lookups.
+
+    Postojeći redovi zadržavaju id; ništa se ne briše, vrednosti kojih
+    nema u sheet-u se povlače. Vraća {"skipped": bool, "inserted": {tip: n},
+    "reactivated": {tip: n}, "retired": {tip: n}, "deleted": {tip: n}}.
+    """
+    if not os.path.exists(xlsx_path):
+        raise FileNotFoundError(f"Excel fajl nije pronađen: {xlsx_path}")
+
+    init_db()
+    digest = file_sha256(xlsx_path)
 
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT sha256 FROM import_files WHERE source = ?", (HASH_SOURCE,)
+        ).fetchone()
+        if not force and row is not None and row["sha256"] == digest:
+            return {"skipped": True, "inserted": {}, "reactivated": {}, "retired": {}, "deleted": {}}
+
+        wanted = read_lookups(xlsx_path)
+
+        # diff se računa i primenjuje u istoj write transakciji
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = _apply_lookups(conn, wanted)
+            conn.execute(SAVE_HASH_SQL, (HASH_SOURCE, digest))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    return {"skipped": False, **result}
+
+
+def import_lookups_from_excel(xlsx_path: str) -> dict:
+    """Pun uvoz: kao sinhronizacija, uz brisanje nekorišćenih vrednosti kojih nema u sheet-u.
+
+    Vrednosti koje posete/kamioni koriste se samo povlače (active = 0).
+    """
+    values = read_lookups(xlsx_path)
 
-    cur.execute("DELETE FROM lookups WHERE type IN ('employee', 'object', 'destination')")
+    init_db()
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = _apply_lookups(conn, values, delete_unused=True)
+            conn.execute(SAVE_HASH_SQL, (HASH_SOURCE, file_sha256(xlsx_path)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    return result
+
+
+def _print_result(result: dict) -> None:
+    for lookup_type in LOOKUP_COLUMNS:
+        line = (
+            f"{lookup_type}: +{result['inserted'][lookup_type]} "
+            f"aktivirano {result['reactivated'][lookup_type]} "
+            f"povučeno {result['retired'][lookup_type]}"
+        )
+        if result["deleted"][lookup_type]:
+            line += f" obrisano {result['deleted'][lookup_type]}"
+        print(line)
+
+
+def main(argv=None) -> None:
+    default_path = os.path.join(os.path.dirname(__file__), "VEB APP.xlsx")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=default_path)
+    parser.add_argument("--force", action="store_true",
+                        help="sinhronizuj i kada se fajl nije promenio")
+    parser.add_argument("--full", action="store_true",
+                        help="uz sinhronizaciju obriši nekorišćene vrednosti kojih nema u sheet-u")
+    args = parser.parse_args(argv)
 
-    cur.executemany(
-        "INSERT INTO lookups (type, value) VALUES ('employee', ?)",
-        [(e,) for e in sorted(employees)],
-    )
-    cur.executemany(
-        "INSERT INTO lookups (type, value) VALUES ('object', ?)",
-        [(o,) for o in sorted(objects)],
-    )
-    cur.executemany(
-        "INSERT INTO lookups (type, value) VALUES ('destination', ?)",
-        [(d,) for d in sorted(destinations)],
-    )
+    if args.full:
+        _print_result(import_lookups_from_excel(args.path))
+        return
 
-    conn.commit()
-    conn.close()
+    result = sync_lookups_from_excel(args.path, force=args.force)
+    if result["skipped"]:
+        print("Excel fajl nije menjan od poslednje sinhronizacije.")
+        return
+    _print_result(result)
 
 
 if __name__ == "__main__":
-    default_path = os.path.join(os.path.dirname(__file__), "VEB APP.xlsx")
-    import_lookups_from_excel(default_path)
-    print("Lookup vrednosti uspešno uvezene iz Excel-a.")
+    main()
@@ -0,0 +1,95 @@
+"""Lokalni statički fajlovi (Bootstrap, jQuery, DataTables...) sa otiskom sadržaja.
+
+URL sadrži heš sadržaja (/assets/<heš>/<putanja>), pa browser fajl čuva
+godinu dana i ne pita server ponovo; posle izmene fajla menja se i URL.
+Za biblioteke u static/vendor/<paket>/ heš se računa nad celim paketom,
+da relativne putanje iz CSS-a (npr. fontovi ikonica) dobiju isti prefiks.
+
+Uz tekstualne fajlove stoje unapred kompresovane .gz varijante. Posle
+izmene u static/ pokrenuti:
+    python static_assets.py
+"""
+import gzip
+import hashlib
+import os
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+VENDOR_PREFIX = "vendor/"
+
+# tipovi koji se isplati kompresovati (slike i woff/woff2 su već kompresovani)
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".json", ".svg")
+
+
+def _walk(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.endswith(".gz"):
+                yield os.path.join(dirpath, name)
+
+
+def _fingerprint_root(filename: str) -> str:
+    """static/vendor/<paket>/... -> paket; ostali fajlovi imaju svoj heš."""
+    if filename.startswith(VENDOR_PREFIX):
+        package = filename[len(VENDOR_PREFIX):].split("/", 1)[0]
+        return VENDOR_PREFIX + package
+    return filename
+
+
+def compute_digests(static_dir: str = STATIC_DIR) -> dict:
+    """{relativna putanja: heš} za sve fajlove u static/ (bez .gz)."""
+    roots = {}
+    for path in _walk(static_dir):
+        filename = os.path.relpath(path, static_dir).replace(os.sep, "/")
+        roots.setdefault(_fingerprint_root(filename), []).append((filename, path))
+
+    digests = {}
+    for files in roots.values():
+        digest = hashlib.sha256()
+        for filename, path in files:
+            digest.update(filename.encode("utf-8") + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        short = digest.hexdigest()[:12]
+        for filename, _ in files:
+            digests[filename] = short
+    return digests
+
+
+def _gzip_bytes(data: bytes) -> bytes:
+    # mtime=0 -> isti ulaz daje isti .gz (stabilan git diff)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def stale_precompressed(static_dir: str = STATIC_DIR) -> list:
+    """Fajlovi čija .gz varijanta nedostaje ili ne odgovara sadržaju."""
+    stale = []
+    for path in _walk(static_dir):
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+            continue
+        try:
+            with open(path + ".gz", "rb") as f:
+                current = gzip.decompress(f.read())
+        except (OSError, EOFError):
+            stale.append(path)
+            continue
+        with open(path, "rb") as f:
+            if f.read() != current:
+                stale.append(path)
+    return stale
+
+
+def build_precompressed(static_dir: str = STATIC_DIR) -> list:
+    built = []
+    for path in stale_precompressed(static_dir):
+        with open(path, "rb") as f:
+            data = _gzip_bytes(f.read())
+        with open(path + ".gz", "wb") as f:
+            f.write(data)
+        built.append(path)
+    return built
+
+
+if __name__ == "__main__":
+    for path in build_precompressed():
+        print(f"{os.path.relpath(path)}.gz")
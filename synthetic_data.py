@@ -0,0 +1,325 @@
+"""Generator sintetičkih podataka za benchmark i testove opterećenja.
+
+Za isti seed i iste parametre uvek daje iste redove: korisnike (domaćini,
+portiri, obezbeđenje), lookup vrednosti, posete i kamione za zadati broj
+godina unazad do danas, plus najave za narednih 30 dana.
+
+Raspodele su grube, ali bliske stvarnoj portirnici:
+- radni dani nose najviše poseta, subota malo, nedelja skoro ništa,
+  a obim raste ~10% godišnje,
+- očekivano vreme dolaska ima dva talasa (oko 9:30 i 13:30), ulaz kasni
+  par minuta, zadržavanje je log-normalno (medijana ~70 min),
+- ~4% najavljenih gostiju ne dođe; danas su deo gostiju i kamiona još unutra,
+- ~15% poseta su ponavljajuće serije (isti gost, domaćin i dan u nedelji
+  od 4 do 26 nedelja), kao najave iz forme sa "recurring" modom.
+
+Redovi se generišu dan po dan i upisuju u blokovima, pa memorija ne
+zavisi od obima (10k – 5M poseta). Upis ide kroz sve trigere (FTS,
+statistika, prisutni), ~5k poseta/s: 5M poseta traje ~20 min, pa se
+baza pravi jednom i koristi ponovo (parametri su u app_meta).
+
+Pokretanje (baza mora biti nova ili prazna):
+    python synthetic_data.py baza.db --visits 1000000 [--trucks N] [--years 5] [--seed 1]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+FIRST_NAMES = [
+    "Marko", "Nikola", "Stefan", "Lazar", "Đorđe", "Miloš", "Nemanja", "Vuk", "Luka", "Filip",
+    "Ana", "Milica", "Jelena", "Marija", "Sanja", "Ivana", "Jovana", "Dragana", "Maja", "Olivera",
+]
+LAST_NAMES = [
+    "Jovanović", "Petrović", "Nikolić", "Marković", "Đorđević", "Stojanović", "Ilić", "Stanković",
+    "Pavlović", "Milošević", "Lazić", "Kovačević", "Laković", "Popović", "Bogunović", "Šarić",
+    "Živković", "Radivojević", "Vuković", "Tomić", "Savić", "Krstić", "Ćirić", "Obradović",
+]
+OBJECTS = [
+    "Upravna zgrada", "Skladište", "Gigatron", "Objekat 9", "Hladnjača", "Magacin A",
+    "Magacin B", "Radionica", "Kantina", "Laboratorija", "Kapija 2", "Parking",
+]
+DESTINATIONS = [
+    "Skladište", "Hladnjača", "Magacin A", "Magacin B", "Rampa 1", "Rampa 2", "Rampa 3",
+    "Gigatron", "Objekat 9", "Otpad",
+]
+PLATE_CITIES = ["BG", "NS", "NI", "KG", "SU", "ČA", "KV", "ŠA", "SM", "PA", "ZR", "VA"]
+
+# ponedeljak ... nedelja
+WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.0, 0.9, 0.25, 0.08)
+YEARLY_GROWTH = 0.10
+SERIES_SHARE = 0.15
+NO_SHOW_SHARE = 0.04
+FUTURE_DAYS = 30
+FUTURE_SHARE = 0.01  # deo poseta koje su najave za narednih FUTURE_DAYS dana
+
+BATCH_SIZE = 10000
+META_KEY = "synthetic_data"
+
+_VISIT_SQL = """
+    INSERT INTO visits (
+        arrival_date, expected_time, host_employee, phone, object_name, guest_name,
+        document_number, vehicle_plate, note, persons_count, entry_time, exit_time, created_by
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_TRUCK_SQL = """
+    INSERT INTO trucks (
+        driver_name, driver_document, codriver_name, codriver_document, driver_phone,
+        plate, destination, arrival_date, arrival_time, departure_datetime, created_by
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def person(rnd) -> str:
+    return f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+
+
+def plate(rnd) -> str:
+    letters = "ABCDEFGHJKLMNPRSTVZ"
+    return f"{rnd.choice(PLATE_CITIES)}-{rnd.randint(100, 9999)}-{rnd.choice(letters)}{rnd.choice(letters)}"
+
+
+def _ascii(text: str) -> str:
+    table = str.maketrans("čćžšđČĆŽŠĐ", "cczsdCCZSD")
+    return text.translate(table).lower().replace(" ", ".")
+
+
+def _daily_targets(total: int, days: list) -> list:
+    """Broj redova po danu: težina dana u nedelji x rast, zaokruženo bez gubitka."""
+    first = days[0]
+    weights = [
+        WEEKDAY_WEIGHTS[d.weekday()] * (1 + YEARLY_GROWTH) ** ((d - first).days / 365)
+        for d in days
+    ]
+    scale = total / sum(weights)
+    targets, carry = [], 0.0
+    for w in weights:
+        carry += w * scale
+        n = int(carry)
+        carry -= n
+        targets.append(n)
+    targets[-1] += total - sum(targets)
+    return targets
+
+
+def _clock(minutes: float) -> str:
+    minutes = int(minutes)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _stamp(day: date, minutes: float) -> str:
+    return (datetime.combine(day, datetime.min.time()) + timedelta(minutes=minutes)).isoformat(
+        sep=" ", timespec="seconds"
+    )
+
+
+def _expected_minutes(rnd) -> float:
+    # dva talasa dolazaka, zaokruženo na 15 min u radnom vremenu 06:00-19:00
+    if rnd.random() < 0.6:
+        m = rnd.gauss(9.5 * 60, 60)
+    else:
+        m = rnd.gauss(13.5 * 60, 75)
+    return min(max(round(m / 15) * 15, 6 * 60), 19 * 60)
+
+
+def _gate_times(rnd, day: date, expected: float, now: datetime, median_dwell: float):
+    """(entry_time, exit_time) za dan; budući/nepristigli -> None."""
+    entry = expected + rnd.gauss(5, 12)
+    dwell = median_dwell * math.exp(rnd.gauss(0, 0.6))
+    entry_at = datetime.combine(day, datetime.min.time()) + timedelta(minutes=entry)
+    if entry_at > now:
+        return None, None
+    exit_at = entry_at + timedelta(minutes=dwell)
+    if exit_at > now:
+        return _stamp(day, entry), None
+    return _stamp(day, entry), _stamp(day, entry + dwell)
+
+
+def _users(rnd, employees: int):
+    """[(email, ime, rola)]; domaćini su zaposleni, uz par portira i šefova."""
+    users, seen = [], set()
+    roles = ["employee"] * employees + ["portirnica"] * max(2, employees // 50) + [
+        "security_chief"
+    ] * max(1, employees // 100)
+    for i, role in enumerate(roles):
+        name = person(rnd)
+        email = f"{_ascii(name)}.{i}@logistar.rs"
+        if email not in seen:
+            seen.add(email)
+            users.append((email, name, role))
+    return users
+
+
+def _visit_rows(rnd, days, targets, hosts, objects, now):
+    """Posete dan po dan; serije se pamte samo dok traju."""
+    series = []  # [weekday, preostalo, gost, domaćin, email, objekat, vreme, telefon, tablica]
+    for day, target in zip(days, targets):
+        weekday = day.weekday()
+        rows = []
+        for item in series:
+            if item[0] == weekday and item[1] > 0:
+                item[1] -= 1
+                rows.append(item[2:])
+        series = [item for item in series if item[1] > 0]
+        # nove serije dok udeo serija u danu ne dostigne SERIES_SHARE
+        while len(rows) < round(target * SERIES_SHARE):
+            host, email = rnd.choice(hosts)
+            item = [
+                weekday, rnd.randint(4, 26) - 1, person(rnd), host, email, rnd.choice(objects),
+                _expected_minutes(rnd), f"06{rnd.randint(0, 99999999):08d}",
+                plate(rnd) if rnd.random() < 0.4 else None,
+            ]
+            series.append(item)
+            rows.append(item[2:])
+        while len(rows) < target:
+            host, email = rnd.choice(hosts)
+            rows.append((
+                person(rnd), host, email, rnd.choice(objects), _expected_minutes(rnd),
+                f"06{rnd.randint(0, 99999999):08d}", plate(rnd) if rnd.random() < 0.4 else None,
+            ))
+
+        for guest, host, email, obj, expected, phone, vehicle in rows:
+            if rnd.random() < NO_SHOW_SHARE:
+                entry = exit_ = None
+            else:
+                entry, exit_ = _gate_times(rnd, day, expected, now, 70)
+            persons = rnd.choices((1, 2, 3, 4, 5), (70, 20, 6, 3, 1))[0]
+            yield (
+                day.isoformat(), _clock(expected), host, phone, obj, guest,
+                f"{rnd.randint(0, 999999999):09d}", vehicle, None, persons, entry, exit_, email,
+            )
+
+
+def _truck_rows(rnd, days, targets, destinations, operators, now):
+    for day, target in zip(days, targets):
+        for _ in range(target):
+            arrival = min(max(rnd.gauss(9 * 60, 150), 5 * 60), 21 * 60)
+            arrival_at = datetime.combine(day, datetime.min.time()) + timedelta(minutes=arrival)
+            if arrival_at > now:
+                continue  # kamioni se ne najavljuju unapred
+            dwell = 50 * math.exp(rnd.gauss(0, 0.7))
+            departure = arrival_at + timedelta(minutes=dwell)
+            codriver = person(rnd) if rnd.random() < 0.3 else ""
+            yield (
+                person(rnd), f"{rnd.randint(0, 999999999):09d}", codriver,
+                f"{rnd.randint(0, 999999999):09d}" if codriver else "",
+                f"06{rnd.randint(0, 99999999):08d}", plate(rnd), rnd.choice(destinations),
+                day.isoformat(), _clock(arrival),
+                departure.isoformat(sep=" ", timespec="seconds") if departure <= now else None,
+                rnd.choice(operators),
+            )
+
+
+def _insert(conn, sql: str, rows) -> int:
+    count, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            conn.executemany(sql, batch)
+            conn.commit()
+            count += len(batch)
+            batch.clear()
+    conn.executemany(sql, batch)
+    conn.commit()
+    return count + len(batch)
+
+
+def generate(conn, visits: int, trucks: int = None, years: int = 5, seed: int = 1,
+             employees: int = None, today: date = None) -> dict:
+    """Puni (praznu) bazu; vraća parametre i broj upisanih redova."""
+    from app import DEFAULT_PASSWORD_HASH
+
+    today = today or date.today()
+    trucks = visits // 3 if trucks is None else trucks
+    employees = employees or min(max(20, visits // 2500), 2000)
+    params = {"visits": visits, "trucks": trucks, "years": years, "seed": seed,
+              "employees": employees, "today": today.isoformat()}
+    rnd = random.Random(seed)
+    now = datetime.combine(today, datetime.min.time()) + timedelta(hours=11)
+
+    users = _users(rnd, employees)
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (email, full_name, password_hash, role) VALUES (?, ?, ?, ?)",
+        [(email, name, DEFAULT_PASSWORD_HASH, role) for email, name, role in users],
+    )
+    hosts = [(name, email) for email, name, role in users if role == "employee"]
+    operators = [email for email, _, role in users if role == "portirnica"]
+    lookups = (
+        [("employee", name) for name, _ in hosts]
+        + [("object", v) for v in OBJECTS]
+        + [("destination", v) for v in DESTINATIONS]
+    )
+    conn.executemany("INSERT OR IGNORE INTO lookups (type, value) VALUES (?, ?)", lookups)
+    conn.commit()
+
+    start = today - timedelta(days=365 * years)
+    past = [start + timedelta(days=i) for i in range((today - start).days + 1)]
+    future = [today + timedelta(days=i) for i in range(1, FUTURE_DAYS + 1)]
+    future_visits = int(visits * FUTURE_SHARE)
+    # redovi idu hronološki, kao u pravoj bazi (id raste sa datumom)
+    visit_days = past + future
+    visit_targets = (
+        _daily_targets(visits - future_visits, past) + _daily_targets(future_visits, future)
+    )
+
+    started = time.perf_counter()
+    inserted_visits = _insert(
+        conn, _VISIT_SQL, _visit_rows(rnd, visit_days, visit_targets, hosts, OBJECTS, now)
+    )
+    inserted_trucks = _insert(
+        conn, _TRUCK_SQL,
+        _truck_rows(rnd, past, _daily_targets(trucks, past), DESTINATIONS, operators, now),
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+        (META_KEY, json.dumps(params, sort_keys=True)),
+    )
+    conn.commit()
+    return {
+        "params": params,
+        "users": len(users),
+        "visits": inserted_visits,
+        "trucks": inserted_trucks,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def generated_params(conn):
+    """Parametri kojima je baza generisana, ili None."""
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (META_KEY,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", help="putanja do nove baze (ne produkciona gate_app.db)")
+    parser.add_argument("--visits", type=int, default=100000)
+    parser.add_argument("--trucks", type=int, default=None)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--employees", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    # app čita GATE_APP_DB pri importu
+    os.environ["GATE_APP_DB"] = os.path.abspath(args.db)
+    from app import init_db, get_db
+
+    init_db()
+    conn = get_db()
+    try:
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM visits)").fetchone()[0]:
+            parser.error(f"baza {args.db} već ima posete")
+        result = generate(conn, args.visits, args.trucks, args.years, args.seed, args.employees)
+    finally:
+        conn.close()
+    print(
+        f"{result['users']} korisnika, {result['visits']} poseta, {result['trucks']} kamiona "
+        f"za {result['seconds']:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
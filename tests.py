@@ -1,9 +1,42 @@
-from app import app, init_db
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Testovi rade nad privremenom bazom, ne diraju gate_app.db
+_TEST_DIR = tempfile.mkdtemp(prefix="gate_app_test_")
+os.environ.setdefault("GATE_APP_DB", os.path.join(_TEST_DIR, "gate_app.db"))
+os.environ.setdefault("GATE_APP_JINJA_CACHE", os.path.join(_TEST_DIR, "jinja"))
+
+import app as gate_app
+import xlsx_stream
+from app import app, init_db, db_pool
+
+ADMIN_EMAIL = "nikola.lakovic@logistar.rs"
+
+
+def _login(client, email: str = ADMIN_EMAIL, password: str = "1") -> None:
+    resp = client.post(
+        "/login",
+        data={"email": email, "password": password},
+        follow_redirects=True,
+    )
+    assert resp.status_code == 200
 
 
 def run_basic_tests() -> None:
     init_db()
     with app.test_client() as client:
+        _login(client)
         for path in [
             "/",
             "/posete/najava",
@@ -17,5 +50,1498 @@ def run_basic_tests() -> None:
     print("Svi osnovni testovi ruta su prošli.")
 
 
+def test_basic_routes() -> None:
+    run_basic_tests()
+
+
+def test_db_pool_reuses_connections() -> None:
+    init_db()
+    with app.test_client() as client:
+        _login(client)
+        client.get("/posete/portirnica")
+        opened_before = db_pool.stats["opened"]
+        for _ in range(20):
+            resp = client.get("/posete/portirnica")
+            assert resp.status_code == 200
+        assert db_pool.stats["opened"] == opened_before, "Pool otvara nove konekcije po zahtevu"
+
+
+def _insert_visits(n: int, arrival_date: str = "") -> None:
+    arrival_date = arrival_date or date.today().isoformat()
+    conn = gate_app.get_db()
+    conn.executemany(
+        """
+        INSERT INTO visits (arrival_date, host_employee, object_name, guest_name, created_by)
+        VALUES (?, 'Maja Bogunović', 'Skladište', ?, ?)
+        """,
+        [(arrival_date, f"Gost {i}", ADMIN_EMAIL) for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+    gate_app.bump_data_version("visit")  # upis mimo ruta
+
+
+def test_wal_readers_do_not_block_gate_writers() -> None:
+    init_db()
+    conn = gate_app.get_db()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert gate_app.check_db_profile(conn) == {}
+    conn.close()
+
+    _insert_visits(3000)
+    conn = gate_app.get_db()
+    ids = [r["id"] for r in conn.execute("SELECT id FROM visits ORDER BY id DESC LIMIT 40")]
+    conn.close()
+
+    stop = threading.Event()
+    errors = []
+
+    def slow_reader():
+        # dugo čitanje drži otvoren read snapshot, kao veliki security pregled
+        reader = gate_app.get_db()
+        while not stop.is_set():
+            cur = reader.execute("SELECT * FROM visits ORDER BY arrival_date DESC")
+            while not stop.is_set() and cur.fetchmany(100):
+                time.sleep(0.002)
+        reader.close()
+
+    readers = [threading.Thread(target=slow_reader) for _ in range(3)]
+    for t in readers:
+        t.start()
+
+    latencies = []
+    try:
+        with app.test_client() as client:
+            _login(client)
+            for visit_id in ids:
+                start = time.perf_counter()
+                resp = client.post(f"/posete/evidentiraj-ulaz/{visit_id}")
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code != 302:
+                    errors.append(resp.status_code)
+    finally:
+        stop.set()
+        for t in readers:
+            t.join()
+
+    assert not errors, errors
+    assert max(latencies) < 0.5, f"Upis je čekao na čitaoce: {max(latencies):.3f}s"
+
+
+@contextlib.contextmanager
+def _traced_sql():
+    """Skuplja sve SQL naredbe poslate preko konekcija otvorenih u bloku."""
+    statements = []
+    original_connect = gate_app._connect
+
+    def tracing_connect():
+        conn = original_connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db_pool.close_all()
+    gate_app._connect = tracing_connect
+    try:
+        yield statements
+    finally:
+        gate_app._connect = original_connect
+        db_pool.close_all()
+
+
+def _capture_sql(paths) -> set:
+    """Izvršava GET/POST zahteve i vraća sve SQL naredbe koje su rute poslale."""
+    with _traced_sql() as statements, app.test_client() as client:
+        _login(client)
+        for method, path in paths:
+            resp = client.open(path, method=method)
+            resp.get_data()  # streaming odgovori (export) izvršavaju SQL tek ovde
+            resp.close()
+            assert resp.status_code in (200, 302), f"{method} {path}: {resp.status_code}"
+    return set(statements)
+
+
+def test_hot_queries_use_indexes() -> None:
+    init_db()
+    _insert_visits(50)
+    today = date.today().isoformat()
+    with app.test_client() as client:
+        _login(client)
+        client.post("/kamioni/unos", data={
+            "driver_name": "Petar", "driver_document": "", "codriver_name": "",
+            "codriver_document": "", "plate": "BG-123-AA", "destination": "Skladište",
+        })
+    paths = [
+        ("GET", "/posete/portirnica"),
+        ("GET", "/kamioni/portirnica"),
+        ("GET", "/moje-najave"),
+        ("GET", f"/moje-najave?date_from={today}&date_to={today}"),
+        ("GET", "/security/posete"),
+        ("GET", f"/security/posete?date_from={today}&date_to={today}"),
+        ("GET", "/security/kamioni"),
+        ("GET", f"/security/kamioni?date_from={today}&date_to={today}"),
+        ("GET", f"/security/posete/export?date_from={today}"),
+        ("GET", f"/security/kamioni/export?date_from={today}"),
+        ("GET", "/security/posete/data?draw=1&start=0&length=25"),
+        ("GET", f"/security/posete/data?draw=1&start=0&length=25&date_from={today}"),
+        ("GET", "/security/kamioni/data?draw=1&start=0&length=25"),
+        ("GET", "/security/posete/data?draw=1&start=0&length=25&host=maja&search[value]=gost"),
+        ("GET", "/security/kamioni/data?draw=1&start=0&length=25&plate=bg&destination=sklad"),
+        ("GET", "/security/posete/export?guest_name=gost"),
+        ("GET", "/security/posete/1/edit"),
+        ("GET", "/security/kamioni/1/edit"),
+        ("POST", "/posete/evidentiraj-ulaz/1"),
+        ("POST", "/posete/evidentiraj-izlaz/1"),
+        ("POST", "/kamioni/evidentiraj-izlaz/1"),
+        ("POST", "/moje-najave/otkazi/2"),
+    ]
+    statements = _capture_sql(paths)
+
+    conn = gate_app.get_db()
+    checked = 0
+    for sql in statements:
+        if not re.search(r"\b(visits|trucks)\b", sql):
+            continue
+        if not re.match(r"\s*(SELECT|UPDATE|DELETE)\b", sql, re.IGNORECASE):
+            continue
+        plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        full_scans = [p for p in plan if re.fullmatch(r"SCAN (visits|trucks)", p)]
+        assert not full_scans, f"Upit radi full table scan:\n{sql}\n{plan}"
+        checked += 1
+    conn.close()
+    assert checked >= 10, checked
+
+
+def test_security_datatables_keyset_paging() -> None:
+    init_db()
+    for day in ("2024-03-01", "2024-03-02", "2024-03-03"):
+        _insert_visits(40, arrival_date=day)
+
+    args = {"date_from": "2024-03-01", "date_to": "2024-03-03", "length": 25}
+    with app.test_client() as client:
+        _login(client)
+
+        offset_ids = []
+        for start in range(0, 120, 25):
+            data = client.get(
+                "/security/posete/data", query_string=dict(args, draw=1, start=start)
+            ).get_json()
+            assert data["recordsFiltered"] == 120
+            offset_ids += [r["id"] for r in data["data"]]
+
+        keyset_ids = []
+        start, cursor = 0, None
+        while True:
+            query = dict(args, draw=2, start=start)
+            if cursor:
+                query["cursor"] = cursor
+            data = client.get("/security/posete/data", query_string=query).get_json()
+            assert data["draw"] == 2
+            keyset_ids += [r["id"] for r in data["data"]]
+            if not data["next_cursor"]:
+                break
+            start, cursor = data["next_start"], data["next_cursor"]
+
+        # izmenjen cursor ne obara zahtev, stranica ide preko OFFSET-a
+        first = client.get("/security/posete/data", query_string=dict(args, draw=5, start=0)).get_json()
+        token = json.loads(first["next_cursor"])
+        for bad_key in ({"a": 1}, 7, "abc", [[1], {}, 2]):
+            query = dict(args, draw=5, start=25, cursor=json.dumps(dict(token, k=bad_key)))
+            resp = client.get("/security/posete/data", query_string=query)
+            assert resp.status_code == 200, bad_key
+            assert [r["id"] for r in resp.get_json()["data"]] == offset_ids[25:50], bad_key
+
+    assert len(offset_ids) == 120
+    assert keyset_ids == offset_ids
+
+    # brojevi se ne računaju ponovo dok se podaci ne promene
+    with app.test_client() as client:
+        _login(client)
+        with _traced_sql() as statements:
+            data = client.get("/security/posete/data", query_string=dict(args, draw=3)).get_json()
+        assert data["recordsFiltered"] == 120 and not data["recordsCapped"]
+        assert not [sql for sql in statements if "COUNT(" in sql], statements
+
+        # filtrirani broj se ne broji preko granice
+        old_limit = gate_app.DATATABLES_COUNT_LIMIT
+        gate_app.DATATABLES_COUNT_LIMIT = 50
+        try:
+            _insert_visits(1, arrival_date="2024-03-02")
+            data = client.get("/security/posete/data", query_string=dict(args, draw=4)).get_json()
+        finally:
+            gate_app.DATATABLES_COUNT_LIMIT = old_limit
+        assert data["recordsFiltered"] == 50 and data["recordsCapped"]
+        assert data["recordsTotal"] >= 121
+
+
+def test_security_export_is_streamed_xlsx() -> None:
+    from openpyxl import load_workbook
+
+    init_db()
+    _insert_visits(30, arrival_date="2023-05-05")
+    with app.test_client() as client:
+        _login(client)
+        resp = client.get("/security/posete/export?date_from=2023-05-05&date_to=2023-05-05")
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        body = resp.get_data()
+
+    ws = load_workbook(io.BytesIO(body), read_only=True).active
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows[0][:3] == ("ID", "Datum najave", "Očekivano vreme")
+    assert len(rows) == 31
+    assert {r[5] for r in rows[1:]} == {f"Gost {i}" for i in range(30)}
+
+
+def test_fts_search_ignores_diacritics_and_tracks_updates() -> None:
+    init_db()
+    conn = gate_app.get_db()
+    cur = conn.execute(
+        """
+        INSERT INTO visits (arrival_date, host_employee, object_name, guest_name)
+        VALUES ('2022-02-02', 'Nikola Laković', 'Upravna zgrada', 'Đorđe Šarić')
+        """
+    )
+    visit_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+
+    def found(**filters):
+        with app.test_client() as client:
+            _login(client)
+            query = dict(filters, draw=1, start=0, length=10, date_from="2022-02-02")
+            data = client.get("/security/posete/data", query_string=query).get_json()
+        return [r["id"] for r in data["data"]]
+
+    assert found(host="lakovic") == [visit_id]
+    assert found(host="Lako", guest_name="djordje sar") == [visit_id]
+    assert found(**{"search[value]": "upravna"}) == [visit_id]
+    assert found(host="popovic") == []
+
+    conn = gate_app.get_db()
+    conn.execute("UPDATE visits SET host_employee = 'Vlado Popović' WHERE id = ?", (visit_id,))
+    conn.commit()
+    assert found(host="lakovic") == []
+    assert found(host="popovic") == [visit_id]
+
+    conn.execute("DELETE FROM visits WHERE id = ?", (visit_id,))
+    conn.commit()
+    conn.close()
+    assert found(host="popovic") == []
+
+
+def test_lookup_cache_serves_forms_without_sql() -> None:
+    init_db()
+    lookup_cache = gate_app.lookup_cache
+    with app.test_client() as client:
+        _login(client)
+        client.get("/posete/najava")
+
+        with _traced_sql() as statements:
+            for path in ("/posete/najava", "/posete/nenajavljena", "/kamioni/unos"):
+                assert client.get(path).status_code == 200
+        assert statements == [], statements
+
+        # upis iz drugog procesa (npr. load_lookups_from_excel.py) menja generaciju
+        conn = gate_app.get_db()
+        conn.execute("INSERT INTO lookups (type, value) VALUES ('object', 'Novi objekat XYZ')")
+        conn.commit()
+        conn.close()
+
+        check_interval = lookup_cache.check_interval
+        lookup_cache.check_interval = 0
+        try:
+            misses = lookup_cache.stats["misses"]
+            assert "Novi objekat XYZ" in client.get("/posete/najava").get_data(as_text=True)
+            assert lookup_cache.stats["misses"] == misses + 1
+            client.get("/posete/najava")
+            assert lookup_cache.stats["misses"] == misses + 1
+        finally:
+            lookup_cache.check_interval = check_interval
+
+        stats = client.get("/admin/cache-stats").get_json()
+        assert stats["lookups"]["hits"] > 0
+
+
+def test_user_identity_cached_and_deactivation_cuts_off() -> None:
+    init_db()
+    employee_email = "vlado.popovic@logistar.rs"
+    conn = gate_app.get_db()
+    employee_id = conn.execute("SELECT id FROM users WHERE email = ?", (employee_email,)).fetchone()[0]
+    conn.execute("UPDATE users SET is_active = 1 WHERE id = ?", (employee_id,))
+    conn.commit()
+    conn.close()
+    gate_app.user_cache.invalidate()
+
+    employee = app.test_client()
+    admin = app.test_client()
+    _login(employee, employee_email)
+    _login(admin)
+
+    with _traced_sql() as statements:
+        for path in ("/", "/posete/najava", "/moje-najave"):
+            assert employee.get(path).status_code == 200
+    assert not [s for s in statements if "users" in s], statements
+
+    # admin deaktivira zaposlenog – isti proces, važi odmah
+    resp = admin.post("/admin/users", data={f"role_{employee_id}": "employee"})
+    assert resp.status_code == 200
+    resp = employee.get("/posete/najava")
+    assert resp.status_code == 302 and "/login" in resp.headers["Location"]
+
+    # izmena iz drugog procesa važi posle TTL-a
+    conn = gate_app.get_db()
+    conn.execute("UPDATE users SET is_active = 1 WHERE id = ?", (employee_id,))
+    conn.commit()
+    with app.test_client() as employee:
+        _login(employee, employee_email)
+        conn.execute("UPDATE users SET role = 'portirnica' WHERE id = ?", (employee_id,))
+        conn.commit()
+        ttl = gate_app.user_cache.ttl
+        gate_app.user_cache.ttl = 0
+        try:
+            assert employee.get("/posete/najava").status_code == 302  # portirnica nema pristup
+            assert employee.get("/posete/portirnica").status_code == 200
+        finally:
+            gate_app.user_cache.ttl = ttl
+    conn.execute("UPDATE users SET role = 'employee' WHERE id = ?", (employee_id,))
+    conn.commit()
+    conn.close()
+    gate_app.user_cache.invalidate()
+
+
+def test_recurring_announcement_expands_weekdays() -> None:
+    start = date(2025, 12, 29)
+    for days, weekdays in ((0, [0]), (6, [5, 6]), (400, [0, 2, 4]), (365, [])):
+        end = start + timedelta(days=days)
+        naive = [
+            (start + timedelta(days=i)).isoformat()
+            for i in range(days + 1)
+            if (start + timedelta(days=i)).weekday() in weekdays
+        ]
+        assert gate_app.expand_weekdays(start, end, weekdays) == naive
+
+    init_db()
+    with app.test_client() as client:
+        _login(client)
+        resp = client.post("/posete/najava", data={
+            "visit_mode": "recurring", "arrival_date": "2026-01-01", "date_end": "2026-03-31",
+            "days": ["1", "3"], "expected_time": "09:00", "host_employee": "Maja Bogunović",
+            "phone": "", "object_name": "Skladište", "guest_name": "Ekipa izvođača",
+            "document_number": "", "vehicle_plate": "", "note": "",
+        })
+        assert resp.status_code == 302
+    conn = gate_app.get_db()
+    dates = [r[0] for r in conn.execute(
+        "SELECT arrival_date FROM visits WHERE guest_name = 'Ekipa izvođača' ORDER BY arrival_date"
+    )]
+    conn.close()
+    assert dates == gate_app.expand_weekdays(date(2026, 1, 1), date(2026, 3, 31), [1, 3])
+    assert len(dates) == 26
+
+
+def test_portirnica_stream_pushes_gate_changes() -> None:
+    init_db()
+    today = date.today().isoformat()
+    conn = gate_app.get_db()
+    visit_id = conn.execute(
+        "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name) "
+        "VALUES (?, '09:00', 'Maja Bogunović', 'Skladište', 'Live Gost')",
+        (today,),
+    ).lastrowid
+    conn.commit()
+    since = gate_app.current_feed_id(conn)
+    conn.close()
+
+    old_seconds, old_poll = gate_app.LIVE_STREAM_SECONDS, gate_app.LIVE_POLL_SECONDS
+    gate_app.LIVE_STREAM_SECONDS, gate_app.LIVE_POLL_SECONDS = 0.2, 0.05
+    try:
+        client = app.test_client()
+        _login(client)
+        headers = {"X-Requested-With": "fetch"}
+        assert client.post(f"/posete/evidentiraj-ulaz/{visit_id}", headers=headers).status_code == 204
+        assert client.post(f"/posete/evidentiraj-izlaz/{visit_id}", headers=headers).status_code == 204
+
+        resp = client.get("/portirnica/stream", query_string={"entity": "visit", "since": since})
+        assert resp.mimetype == "text/event-stream"
+        body = resp.get_data(as_text=True)
+        resp.close()
+    finally:
+        gate_app.LIVE_STREAM_SECONDS, gate_app.LIVE_POLL_SECONDS = old_seconds, old_poll
+
+    events = [
+        json.loads(line[len("data: "):])
+        for line in body.splitlines() if line.startswith("data: ")
+    ]
+    events = [e for e in events if e["id"] == visit_id]
+    assert [e["kind"] for e in events] == ["visit_entry", "visit_exit"]
+    # posle izlaza posete više nema na listi portirnice, pa oba događaja uklanjaju red
+    assert all(e["action"] == "remove" for e in events)
+
+    # Last-Event-ID nastavlja posle poslednjeg poslatog događaja
+    last_id = re.findall(r"^id: (\d+)$", body, re.M)[-1]
+    gate_app.LIVE_STREAM_SECONDS, gate_app.LIVE_POLL_SECONDS = 0.1, 0.05
+    try:
+        conn = gate_app.get_db()
+        conn.execute(
+            "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name) "
+            "VALUES (?, '10:00', 'Maja Bogunović', 'Skladište', 'Drugi Gost')",
+            (today,),
+        )
+        conn.commit()
+        conn.close()
+        resp = client.get("/portirnica/stream", headers={"Last-Event-ID": last_id})
+        body = resp.get_data(as_text=True)
+        resp.close()
+    finally:
+        gate_app.LIVE_STREAM_SECONDS, gate_app.LIVE_POLL_SECONDS = old_seconds, old_poll
+    events = [json.loads(line[6:]) for line in body.splitlines() if line.startswith("data: ")]
+    assert [e["kind"] for e in events] == ["visit_announced"]
+    assert events[0]["action"] == "upsert" and "Drugi Gost" in events[0]["html"]
+
+
+def test_portirnica_stream_is_capped_across_processes() -> None:
+    init_db()
+    slot_dir = tempfile.mkdtemp()
+    old = gate_app.MAX_STREAMS, gate_app.STREAM_SLOT_DIR, gate_app.LIVE_STREAM_SECONDS
+    gate_app.MAX_STREAMS, gate_app.STREAM_SLOT_DIR, gate_app.LIVE_STREAM_SECONDS = 1, slot_dir, 0.1
+    try:
+        client = app.test_client()
+        _login(client)
+        first = client.get("/portirnica/stream")
+        assert first.status_code == 200 and os.listdir(slot_dir) == ["slot0"]
+
+        rejected = client.get("/portirnica/stream")
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == str(gate_app.STREAM_RETRY_AFTER)
+
+        # zatvaranje odgovora oslobađa slot i kada stream nije ni čitan
+        first.close()
+        assert os.listdir(slot_dir) == []
+        second = client.get("/portirnica/stream")
+        assert second.status_code == 200
+        second.close()
+
+        # slot koji je ostao posle pada procesa se preuzima
+        stale = os.path.join(slot_dir, "slot0")
+        open(stale, "w").close()
+        os.utime(stale, (time.time() - 3600, time.time() - 3600))
+        third = client.get("/portirnica/stream")
+        assert third.status_code == 200
+        third.close()
+    finally:
+        gate_app.MAX_STREAMS, gate_app.STREAM_SLOT_DIR, gate_app.LIVE_STREAM_SECONDS = old
+        shutil.rmtree(slot_dir, ignore_errors=True)
+
+
+def test_gate_writer_group_commits_concurrent_clicks() -> None:
+    init_db()
+    today = date.today().isoformat()
+    conn = gate_app.get_db()
+    ids = [
+        conn.execute(
+            "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name) "
+            "VALUES (?, '08:00', 'Maja Bogunović', 'Skladište', ?)",
+            (today, f"Smena {i}"),
+        ).lastrowid
+        for i in range(40)
+    ]
+    conn.commit()
+    conn.close()
+
+    writer = gate_app.GateWriter(batch_ms=20)
+    barrier = threading.Barrier(len(ids))
+    errors = []
+
+    def click(visit_id):
+        barrier.wait()
+        try:
+            rowcount = writer.execute(
+                "UPDATE visits SET entry_time = datetime('now') WHERE id = ?", (visit_id,)
+            )
+            assert rowcount == 1
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=click, args=(i,)) for i in ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert writer.stats["events"] == len(ids)
+    assert writer.stats["batches"] < len(ids), writer.stats
+
+    # neispravan upis u grupi ne obara ostale
+    good = writer.submit("UPDATE visits SET exit_time = datetime('now') WHERE id = ?", (ids[0],))
+    bad = writer.submit("UPDATE visits SET nepostojeca_kolona = 1 WHERE id = ?", (ids[1],))
+    assert good.wait() == 1
+    try:
+        bad.wait()
+        assert False, "greška nije prosleđena pozivaocu"
+    except sqlite3.OperationalError:
+        pass
+
+    # greška van sqlite3.Error (npr. pri vezivanju parametra) ide pozivaocu, writer radi dalje
+    class Broken:
+        def __conform__(self, protocol):
+            raise RuntimeError("neispravan parametar")
+
+    broken = writer.submit("UPDATE visits SET exit_time = ? WHERE id = ?", (Broken(), ids[2]))
+    try:
+        broken.wait()
+        assert False, "greška nije prosleđena pozivaocu"
+    except RuntimeError:
+        pass
+    assert writer.execute("UPDATE visits SET exit_time = datetime('now') WHERE id = ?", (ids[2],)) == 1
+
+    # upis čiji je rok istekao dok je writer čekao lock se povlači i ne upisuje
+    blocker = gate_app._connect()
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        first = writer.submit("UPDATE visits SET exit_time = datetime('now') WHERE id = ?", (ids[3],))
+        time.sleep(0.1)
+        late = writer.submit("UPDATE visits SET guest_name = 'Povučen' WHERE id = ?", (ids[4],))
+        try:
+            late.wait(timeout=0.05)
+            assert False, "upis je potvrđen iako je writer bio blokiran"
+        except sqlite3.OperationalError:
+            pass
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert first.wait() == 1
+    writer.execute("SELECT 1")
+    assert writer.stats["cancelled"] == 1, writer.stats
+    writer.stop()
+
+    conn = gate_app.get_db()
+    assert conn.execute("SELECT guest_name FROM visits WHERE id = ?", (ids[4],)).fetchone()[0] == "Smena 4"
+    entered = conn.execute(
+        f"SELECT COUNT(*) FROM visits WHERE entry_time IS NOT NULL AND id IN ({','.join('?' * len(ids))})",
+        ids,
+    ).fetchone()[0]
+    conn.close()
+    assert entered == len(ids)
+
+
+def test_gate_events_log_and_on_site_table() -> None:
+    init_db()
+    today = date.today().isoformat()
+    conn = gate_app.get_db()
+    visit_id = conn.execute(
+        "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name, persons_count) "
+        "VALUES (?, '11:00', 'Maja Bogunović', 'Hladnjača', 'Dnevnik Gost', 3)",
+        (today,),
+    ).lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    _login(client)
+    writer_events = gate_app.gate_writer.stats["events"]
+    client.post(f"/posete/evidentiraj-ulaz/{visit_id}")
+    client.post(f"/posete/evidentiraj-ulaz/{visit_id}")  # dupli klik
+    # bez GATE_APP_GATE_WRITER=1 upis ide direktno, mimo writer thread-a
+    assert gate_app.gate_writer.stats["events"] == writer_events
+    client.post("/kamioni/unos", data={
+        "driver_name": "Dnevnik Vozač", "driver_document": "", "codriver_name": "",
+        "codriver_document": "", "plate": "NS-777-GE", "destination": "Magacin A",
+    })
+
+    conn = gate_app.get_db()
+    truck_id = conn.execute("SELECT id FROM trucks WHERE plate = 'NS-777-GE'").fetchone()[0]
+    on_site = {
+        (r["entity"], r["entity_id"]): (r["location"], r["persons"])
+        for r in conn.execute("SELECT * FROM on_site")
+    }
+    assert on_site[("visit", visit_id)] == ("Hladnjača", 3)
+    assert on_site[("truck", truck_id)] == ("Magacin A", 1)
+    conn.close()
+
+    client.post(f"/posete/evidentiraj-izlaz/{visit_id}")
+    client.post(f"/kamioni/evidentiraj-izlaz/{truck_id}")
+
+    conn = gate_app.get_db()
+    events = conn.execute(
+        "SELECT entity, direction, operator FROM gate_events "
+        "WHERE (entity = 'visit' AND entity_id = ?) OR (entity = 'truck' AND entity_id = ?) ORDER BY id",
+        (visit_id, truck_id),
+    ).fetchall()
+    assert [tuple(e) for e in events] == [
+        ("visit", "in", ADMIN_EMAIL),
+        ("truck", "in", ADMIN_EMAIL),
+        ("visit", "out", ADMIN_EMAIL),
+        ("truck", "out", ADMIN_EMAIL),
+    ]
+    visit = conn.execute("SELECT entry_time, exit_time FROM visits WHERE id = ?", (visit_id,)).fetchone()
+    assert visit["entry_time"] and visit["exit_time"]
+    assert conn.execute(
+        "SELECT COUNT(*) FROM on_site WHERE (entity = 'visit' AND entity_id = ?) OR (entity = 'truck' AND entity_id = ?)",
+        (visit_id, truck_id),
+    ).fetchone()[0] == 0
+
+    # ulaz kamiona je u dnevniku u istom formatu kao ulaz posete
+    truck_in = conn.execute(
+        "SELECT event_time FROM gate_events WHERE entity = 'truck' AND entity_id = ? AND direction = 'in'",
+        (truck_id,),
+    ).fetchone()[0]
+    assert re.fullmatch(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d", truck_in), truck_in
+    visit = dict(conn.execute("SELECT * FROM visits WHERE id = ?", (visit_id,)).fetchone())
+    truck = dict(conn.execute("SELECT * FROM trucks WHERE id = ?", (truck_id,)).fetchone())
+    conn.close()
+
+    # ručna ispravka u security pregledu vraća posetu u krug i upisuje se u dnevnik
+    form = {k: v or "" for k, v in visit.items()}
+    form["exit_time"] = ""
+    client.post(f"/security/posete/{visit_id}/edit", data=form)
+    form = {k: v or "" for k, v in truck.items()}
+    form["arrival_time"] = "06:15"
+    client.post(f"/security/kamioni/{truck_id}/edit", data=form)
+
+    conn = gate_app.get_db()
+    assert conn.execute(
+        "SELECT 1 FROM on_site WHERE entity = 'visit' AND entity_id = ?", (visit_id,)
+    ).fetchone()
+    fixes = conn.execute(
+        "SELECT entity, direction, event_time, operator FROM gate_events "
+        "WHERE direction LIKE '%_fix' AND ((entity = 'visit' AND entity_id = ?) OR (entity = 'truck' AND entity_id = ?)) "
+        "ORDER BY id",
+        (visit_id, truck_id),
+    ).fetchall()
+    assert [tuple(f) for f in fixes] == [
+        ("visit", "out_fix", None, ADMIN_EMAIL),
+        ("truck", "in_fix", f"{truck['arrival_date']} 06:15:00", ADMIN_EMAIL),
+    ]
+
+    # dnevnik se ne menja i ne briše
+    for sql in ("UPDATE gate_events SET operator = 'x'", "DELETE FROM gate_events"):
+        try:
+            conn.execute(sql)
+            assert False, sql
+        except sqlite3.IntegrityError:
+            pass
+    conn.close()
+
+
+def test_gate_events_migration_keeps_log_and_adds_fixes() -> None:
+    path = os.path.join(_TEST_DIR, "gate_events_v8.db")
+    if os.path.exists(path):
+        os.remove(path)
+    original_path = gate_app.DB_PATH
+    gate_app.DB_PATH = path
+    try:
+        init_db()
+        # baza na verziji 8: gate_events bez ispravki, ulaz kamiona bez sekundi
+        conn = gate_app._connect()
+        conn.executescript("""
+            DROP TRIGGER gate_events_trucks_ai;
+            DROP TRIGGER gate_events_visits_ai;
+            DROP TABLE gate_events;
+            CREATE TABLE gate_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL CHECK (entity IN ('visit', 'truck')),
+                entity_id INTEGER NOT NULL,
+                direction TEXT NOT NULL CHECK (direction IN ('in', 'out')),
+                event_time TEXT NOT NULL,
+                operator TEXT);
+            INSERT INTO gate_events (id, entity, entity_id, direction, event_time, operator)
+            VALUES (7, 'truck', 3, 'in', '2024-03-01 07:30', 'portirnica@logistar.rs');
+            PRAGMA user_version = 8;
+        """)
+        conn.close()
+
+        init_db()
+        conn = gate_app._connect()
+        assert gate_app.schema_version(conn) == gate_app.SCHEMA_VERSION
+        assert tuple(conn.execute("SELECT id, event_time, operator FROM gate_events").fetchone()) == (
+            7, "2024-03-01 07:30:00", "portirnica@logistar.rs",
+        )
+        conn.execute(
+            "INSERT INTO gate_events (entity, entity_id, direction, event_time) VALUES ('truck', 3, 'out_fix', NULL)"
+        )
+        try:
+            conn.execute("DELETE FROM gate_events")
+            assert False, "dnevnik je obrisan posle migracije"
+        except sqlite3.IntegrityError:
+            pass
+        triggers = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        assert {"gate_events_trucks_ai", "gate_events_visits_ai", "gate_events_no_delete"} <= triggers
+        conn.close()
+    finally:
+        gate_app.DB_PATH = original_path
+
+
+def test_occupancy_counters_and_reconcile() -> None:
+    init_db()
+    gate_app.occupancy.reconcile()
+    client = app.test_client()
+    _login(client)
+    before = client.get("/portirnica/prisutni").get_json()
+
+    today = date.today().isoformat()
+    conn = gate_app.get_db()
+    visit_id = conn.execute(
+        "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name, persons_count) "
+        "VALUES (?, '12:00', 'Maja Bogunović', 'Evakuacija', 'Grupa', 4)",
+        (today,),
+    ).lastrowid
+    conn.commit()
+    conn.close()
+
+    client.post(f"/posete/evidentiraj-ulaz/{visit_id}")
+    client.post("/kamioni/unos", data={
+        "driver_name": "Vozač", "driver_document": "", "codriver_name": "Suvozač",
+        "codriver_document": "", "plate": "KG-100-EV", "destination": "Evakuacija",
+    })
+
+    with _traced_sql() as statements:
+        data = client.get("/portirnica/prisutni").get_json()
+    assert not [sql for sql in statements if "on_site" in sql or "visits" in sql]
+    assert data["locations"]["Evakuacija"] == {"persons": 6, "visits": 1, "trucks": 1}
+    assert data["total"]["persons"] == before["total"]["persons"] + 6
+
+    text = client.get("/portirnica/prisutni?format=text").get_data(as_text=True)
+    assert "Evakuacija\tosoba=6\tposeta=1\tkamiona=1" in text
+
+    # izmena iz drugog procesa: brojač zaostaje dok ga poravnanje ne ispravi
+    conn = gate_app.get_db()
+    conn.execute("UPDATE visits SET exit_time = datetime('now') WHERE id = ?", (visit_id,))
+    conn.commit()
+    conn.close()
+    assert client.get("/portirnica/prisutni").get_json()["locations"]["Evakuacija"]["persons"] == 6
+    assert gate_app.occupancy.reconcile() == 1
+    assert client.get("/portirnica/prisutni").get_json()["locations"]["Evakuacija"] == {
+        "persons": 2, "visits": 0, "trucks": 1,
+    }
+
+
+def test_archive_moves_closed_records_and_security_reads_across() -> None:
+    init_db()
+    old_dir = gate_app.ARCHIVE_DIR
+    gate_app.ARCHIVE_DIR = tempfile.mkdtemp(prefix="gate_app_archive_")
+    db_pool.close_all()
+    try:
+        conn = gate_app.get_db()
+        visit_sql = (
+            "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name, "
+            "entry_time, exit_time) VALUES (?, '09:00', 'Maja Bogunović', 'Skladište', ?, ?, ?)"
+        )
+        closed_id = conn.execute(
+            visit_sql, ("2021-03-04", "Arhivski Đorđević", "2021-03-04 09:00:00", "2021-03-04 10:00:00")
+        ).lastrowid
+        open_id = conn.execute(
+            visit_sql, ("2021-03-05", "Zaboravljeni Izlaz", "2021-03-05 09:00:00", None)
+        ).lastrowid
+        truck_id = conn.execute(
+            "INSERT INTO trucks (driver_name, plate, destination, arrival_date, arrival_time, departure_datetime) "
+            "VALUES ('Stari Vozač', 'SU-001-AR', 'Skladište', '2022-06-01', '07:00', '2022-06-01 09:00:00')"
+        ).lastrowid
+        conn.commit()
+        feed_id = gate_app.current_feed_id(conn)
+        conn.close()
+
+        moved = gate_app.archive_closed(365)
+        assert moved[("visits", 2021)] >= 1 and moved[("trucks", 2022)] >= 1
+        assert {2021, 2022} <= set(gate_app.archive_years()), gate_app.archive_years()
+        assert gate_app.archive_closed(365) == {}
+
+        conn = gate_app.get_db()
+        assert not conn.execute("SELECT 1 FROM visits WHERE id = ?", (closed_id,)).fetchone()
+        assert conn.execute("SELECT 1 FROM visits WHERE id = ?", (open_id,)).fetchone()
+        assert gate_app.current_feed_id(conn) == feed_id
+        conn.close()
+
+        client = app.test_client()
+        _login(client)
+        # opseg samo u živoj bazi ne dira arhive
+        with _traced_sql() as statements:
+            client.get("/security/posete/data", query_string={"date_from": date.today().isoformat()})
+        assert not [sql for sql in statements if "archive_" in sql]
+
+        # čitanje arhive je samo ATTACH sa mode=ro, bez DDL-a i commit-a
+        with _traced_sql() as statements:
+            data = client.get("/security/posete/data", query_string={
+                "date_from": "2021-01-01", "date_to": "2021-12-31", "guest_name": "djordjevic",
+            }).get_json()
+        assert [sql for sql in statements if "ATTACH" in sql and "mode=ro" in sql], statements
+        assert not [sql for sql in statements if re.match(r"\s*(CREATE|ALTER|COMMIT)\b", sql, re.I)]
+        assert [r["id"] for r in data["data"]] == [closed_id]
+        assert data["data"][0]["edit_url"] is None
+
+        # bez opsega datuma samo živa baza, arhiva na zahtev
+        data = client.get("/security/kamioni/data", query_string={"plate": "SU-001"}).get_json()
+        assert data["data"] == []
+        data = client.get("/security/kamioni/data", query_string={"plate": "SU-001", "archive": "1"}).get_json()
+        assert [r["id"] for r in data["data"]] == [truck_id]
+
+        # više arhivskih godina nego što SQLite može da ATTACH-uje -> jasna greška
+        conn = gate_app._connect()
+        conn.setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, 1)
+        try:
+            gate_app.archive_schemas(conn, include_archive=True)
+            raise AssertionError("očekivan ValueError")
+        except ValueError:
+            pass
+        assert gate_app.archive_schemas(conn, "2021-01-01", "2021-12-31") == ["main", "archive_2021"]
+        assert gate_app.archive_schemas(conn, "2022-01-01", "2022-12-31") == ["main", "archive_2022"]
+        conn.close()
+
+        resp = client.get("/security/posete/export", query_string={"date_to": "2021-12-31"})
+        body = resp.get_data()
+        resp.close()
+        from openpyxl import load_workbook
+
+        guests = {row[5] for row in load_workbook(io.BytesIO(body), read_only=True).active.iter_rows(values_only=True)}
+        assert {"Arhivski Đorđević", "Zaboravljeni Izlaz"} <= guests
+
+        result = gate_app.incremental_vacuum()
+        assert result["free_pages_after"] <= result["free_pages_before"]
+    finally:
+        db_pool.close_all()
+        gate_app.ARCHIVE_DIR = old_dir
+
+
+def test_stats_rollups_follow_closing_edits_and_archiving() -> None:
+    init_db()
+    conn = gate_app.get_db()
+    visit_sql = (
+        "INSERT INTO visits (arrival_date, expected_time, host_employee, object_name, guest_name, "
+        "persons_count, entry_time, exit_time) VALUES (?, '09:00', ?, 'Stat Objekat', 'Gost', ?, ?, ?)"
+    )
+    a = conn.execute(visit_sql, ("2019-07-01", "Stat Domaćin A", 2, "2019-07-01 09:00:00", "2019-07-01 10:00:00")).lastrowid
+    b = conn.execute(visit_sql, ("2019-07-01", "Stat Domaćin B", 1, "2019-07-01 09:00:00", "2019-07-01 09:30:00")).lastrowid
+    c = conn.execute(visit_sql, ("2019-07-02", "Stat Domaćin A", 3, "2019-07-02 08:00:00", None)).lastrowid
+    truck = conn.execute(
+        "INSERT INTO trucks (driver_name, codriver_name, plate, destination, arrival_date, arrival_time) "
+        "VALUES ('Vozač', 'Suvozač', 'ST-001-AT', 'Stat Magacin', '2019-07-02', '07:00')"
+    ).lastrowid
+    conn.commit()
+    # ispravka trajanja, zatvaranje otvorene posete, brisanje, odlazak kamiona
+    conn.execute("UPDATE visits SET exit_time = '2019-07-01 11:00:00' WHERE id = ?", (a,))
+    conn.execute("UPDATE visits SET exit_time = '2019-07-02 08:20:00' WHERE id = ?", (c,))
+    conn.execute("DELETE FROM visits WHERE id = ?", (b,))
+    conn.execute("UPDATE trucks SET departure_datetime = '2019-07-02 09:00:00' WHERE id = ?", (truck,))
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    _login(client)
+    query = {"date_from": "2019-07-01", "date_to": "2019-07-31"}
+    with _traced_sql() as statements:
+        stats = client.get("/security/statistika/data", query_string=query).get_json()
+    assert not [sql for sql in statements if re.search(r"\bFROM (visits|trucks)\b", sql)]
+
+    assert stats["grain"] == "day"
+    assert stats["visits"] == {"count": 2, "persons": 5, "avg_dwell_minutes": 70.0}
+    assert stats["trucks"] == {"count": 1, "persons": 2, "avg_dwell_minutes": 120.0}
+    assert stats["hosts"] == [{"name": "Stat Domaćin A", "count": 2, "persons": 5, "avg_dwell_minutes": 70.0}]
+    assert [(p["period"], p["visits"], p["trucks"]) for p in stats["series"]] == [
+        ("2019-07-01", 1, 0), ("2019-07-02", 1, 1),
+    ]
+    assert stats["destinations"][0]["name"] == "Stat Magacin"
+
+    # arhiviranje seli redove, ali statistika ostaje ista
+    old_dir = gate_app.ARCHIVE_DIR
+    gate_app.ARCHIVE_DIR = tempfile.mkdtemp(prefix="gate_app_archive_")
+    try:
+        gate_app.archive_closed(365)
+    finally:
+        db_pool.close_all()
+        gate_app.ARCHIVE_DIR = old_dir
+    assert client.get("/security/statistika/data", query_string=query).get_json() == stats
+
+    # ceo mesec iz stats_monthly, ivice opsega iz stats_daily
+    for date_from, date_to in (("2019-06-15", "2019-08-10"), ("2019-07-02", "2019-07-02")):
+        part = client.get("/security/statistika/data", query_string={"date_from": date_from, "date_to": date_to})
+        assert part.get_json()["trucks"] == stats["trucks"]
+    yearly = client.get("/security/statistika/data", query_string={"date_from": "2019-01-01", "date_to": "2019-12-31"})
+    assert yearly.get_json()["grain"] == "month"
+    assert yearly.get_json()["hosts"] == stats["hosts"]
+    assert client.get("/security/statistika", query_string=query).status_code == 200
+
+
+def test_bulk_visit_import_csv_and_xlsx() -> None:
+    init_db()
+    conn = gate_app.get_db()
+    host = conn.execute("SELECT value FROM lookups WHERE type = 'employee' LIMIT 1").fetchone()[0]
+    obj = conn.execute("SELECT value FROM lookups WHERE type = 'object' LIMIT 1").fetchone()[0]
+    conn.close()
+
+    client = app.test_client()
+    _login(client)
+
+    csv_body = "\n".join([
+        "Datum najave;Očekivano vreme;Kod koga dolazi;Objekat;Gost;Broj osoba",
+        f"15.11.2026.;09:30;{host};{obj};Uvoz CSV Prvi;2",
+        f"2026-11-15;;{host};{obj};Uvoz CSV Drugi;",
+        f"2026-11-15;09:30;Nepostojeći Domaćin;{obj};Uvoz CSV Treći;1",
+        f"32.13.2026;09:30;{host};{obj};Uvoz CSV Četvrti;1",
+        ";;;;;",
+    ]).encode("utf-8")
+    resp = client.post(
+        "/posete/najava/uvoz",
+        data={"file": (io.BytesIO(csv_body), "gosti.csv")},
+        content_type="multipart/form-data",
+    )
+    html = resp.get_data(as_text=True)
+    assert resp.status_code == 200
+    assert "Uvezeno poseta: <strong>2</strong>" in html
+    assert "nepoznat domaćin" in html and "neispravan datum" in html
+
+    # export format (xlsx_stream) se može direktno vratiti kao uvoz
+    headers = ["Datum najave", "Očekivano vreme", "Kod koga dolazi", "Objekat", "Gost"]
+    rows = [("2026-11-16", "10:00", host, obj, f"Uvoz XLSX {i}") for i in range(2500)]
+    body = b"".join(xlsx_stream.iter_xlsx("Posete", headers, [rows[:1000], rows[1000:]]))
+    resp = client.post(
+        "/posete/najava/uvoz",
+        data={"file": (io.BytesIO(body), "gosti.xlsx")},
+        content_type="multipart/form-data",
+    )
+    assert "Uvezeno poseta: <strong>2500</strong>" in resp.get_data(as_text=True)
+
+    resp = client.post(
+        "/posete/najava/uvoz",
+        data={"file": (io.BytesIO(b"x"), "gosti.txt")},
+        content_type="multipart/form-data",
+    )
+    assert "Podržani su samo" in resp.get_data(as_text=True)
+
+    conn = gate_app.get_db()
+    imported = conn.execute(
+        "SELECT arrival_date, expected_time, persons_count, created_by FROM visits "
+        "WHERE guest_name = 'Uvoz CSV Prvi'"
+    ).fetchone()
+    assert tuple(imported) == ("2026-11-15", "09:30", 2, ADMIN_EMAIL)
+    assert conn.execute("SELECT COUNT(*) FROM visits WHERE guest_name LIKE 'Uvoz XLSX %'").fetchone()[0] == 2500
+    conn.close()
+
+    # komandna linija: autor je obavezan i mora biti aktivan korisnik
+    import visit_import
+
+    path = os.path.join(_TEST_DIR, "uvoz_cli.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"Datum najave;Kod koga dolazi;Objekat;Gost\n2026-11-17;{host};{obj};Uvoz CLI\n")
+    for argv in ([path], [path, "--created-by", "nepoznat@logistar.rs"]):
+        with contextlib.redirect_stderr(io.StringIO()):
+            try:
+                visit_import.main(argv)
+                assert False, argv
+            except SystemExit as exc:
+                assert exc.code == 2
+    with contextlib.redirect_stdout(io.StringIO()):
+        visit_import.main([path, "--created-by", ADMIN_EMAIL.upper()])
+    conn = gate_app.get_db()
+    assert [tuple(r) for r in conn.execute(
+        "SELECT created_by FROM visits WHERE guest_name = 'Uvoz CLI'"
+    )] == [(ADMIN_EMAIL,)]
+    conn.close()
+
+
+def test_lookup_sync_applies_diff_and_skips_unchanged_file() -> None:
+    from openpyxl import Workbook
+
+    import load_lookups_from_excel as loader
+
+    init_db()
+    conn = gate_app.get_db()
+    before = {
+        (r["type"], r["value"]): r["id"]
+        for r in conn.execute(
+            "SELECT id, type, value FROM lookups WHERE type IN ('employee', 'object', 'destination')"
+        )
+    }
+    conn.close()
+    kept = sorted(v for (t, v) in before if t == "employee")
+    removed = kept.pop()
+
+    def write_sheet(path, employees):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = loader.SHEET_NAME
+        ws.append(["Zaposleni", None, "Objekat", None, "Odredište"])
+        objects = sorted(v for (t, v) in before if t == "object")
+        destinations = sorted(v for (t, v) in before if t == "destination")
+        for i in range(max(len(employees), len(objects), len(destinations))):
+            ws.append([
+                employees[i] if i < len(employees) else None, None,
+                objects[i] if i < len(objects) else None, None,
+                destinations[i] if i < len(destinations) else None,
+            ])
+        wb.save(path)
+
+    path = os.path.join(_TEST_DIR, "lookups.xlsx")
+    write_sheet(path, kept + ["Sinhronizovani Zaposleni"])
+    try:
+        result = loader.sync_lookups_from_excel(path, force=True)
+        assert result["inserted"]["employee"] == 1 and result["retired"]["employee"] == 1
+        assert result["inserted"]["object"] == 0 and result["retired"]["object"] == 0
+        assert not any(result["deleted"].values()) and not any(result["reactivated"].values())
+
+        conn = gate_app.get_db()
+        after = {
+            (r["type"], r["value"]): (r["id"], r["active"])
+            for r in conn.execute("SELECT id, type, value, active FROM lookups")
+        }
+        generation = conn.execute(
+            "SELECT value FROM app_meta WHERE key = 'lookups_generation'"
+        ).fetchone()[0]
+        conn.close()
+        # nepromenjene vrednosti zadržavaju id; vrednost van sheet-a se povlači, ne briše
+        assert all(after[("employee", v)] == (before[("employee", v)], 1) for v in kept)
+        assert after[("employee", removed)] == (before[("employee", removed)], 0)
+        assert after[("employee", "Sinhronizovani Zaposleni")][1] == 1
+
+        # isti fajl -> baza se ne dira
+        assert loader.sync_lookups_from_excel(path)["skipped"] is True
+        conn = gate_app.get_db()
+        assert conn.execute(
+            "SELECT value FROM app_meta WHERE key = 'lookups_generation'"
+        ).fetchone()[0] == generation
+        # heš fajla je tekst u import_files, app_meta ima samo brojače
+        assert conn.execute(
+            "SELECT sha256 FROM import_files WHERE source = ?", (loader.HASH_SOURCE,)
+        ).fetchone()[0] == loader.file_sha256(path)
+        assert conn.execute("SELECT COUNT(*) FROM app_meta WHERE typeof(value) != 'integer'").fetchone()[0] == 0
+        conn.close()
+
+        # vraćena vrednost se aktivira sa istim id-jem
+        write_sheet(path, kept + [removed, "Sinhronizovani Zaposleni"])
+        result = loader.sync_lookups_from_excel(path)
+        assert result["reactivated"]["employee"] == 1 and result["inserted"]["employee"] == 0
+
+        # --full briše samo vrednosti koje nijedna poseta ne koristi
+        conn = gate_app.get_db()
+        conn.execute(
+            "INSERT INTO visits (arrival_date, host_employee, object_name, guest_name) "
+            "VALUES (?, ?, 'Skladište', 'Gost Sinhronizacije')",
+            (date.today().isoformat(), removed),
+        )
+        conn.commit()
+        conn.close()
+        gate_app.bump_data_version("visit")
+        write_sheet(path, kept)
+        result = loader.import_lookups_from_excel(path)
+        assert result["retired"]["employee"] == 1 and result["deleted"]["employee"] == 1
+        conn = gate_app.get_db()
+        rows = {r["value"]: r["active"] for r in conn.execute("SELECT value, active FROM lookups WHERE type = 'employee'")}
+        conn.close()
+        assert rows[removed] == 0 and "Sinhronizovani Zaposleni" not in rows
+    finally:
+        write_sheet(path, kept + [removed])
+        loader.sync_lookups_from_excel(path)
+
+
+def test_lookups_unique_serbian_order_and_retire() -> None:
+    # migracija stare šeme: duplikati se spajaju, redosled po srpskoj abecedi
+    old = sqlite3.connect(":memory:")
+    old.execute("CREATE TABLE lookups (id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, value TEXT NOT NULL)")
+    old.executemany(
+        "INSERT INTO lookups (type, value) VALUES ('employee', ?)",
+        [("Žika",), ("Zoran",), ("Čedomir",), ("Zoran",), ("Ljubica",), ("Luka ",), ("Ćira",), ("Luka",)],
+    )
+    gate_app._init_lookups(old)
+    rows = old.execute("SELECT id, value FROM lookups WHERE type = 'employee'").fetchall()
+    rows.sort(key=lambda row: gate_app.sr_sort_key(row[1]))
+    assert [v for _, v in rows] == ["Čedomir", "Ćira", "Luka", "Ljubica", "Zoran", "Žika"]
+    assert dict((v, i) for i, v in rows)["Zoran"] == 2
+    old.close()
+
+    # tabela sa COLLATE SR u šemi (migracija 6) se prepisuje bez kolacije
+    old = sqlite3.connect(":memory:")
+    old.create_collation("SR", gate_app.sr_collate)
+    old.executescript("""
+        CREATE TABLE app_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT INTO app_meta VALUES ('lookups_generation', 0);
+        CREATE TABLE lookups (id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL,
+            value TEXT NOT NULL COLLATE SR, active INTEGER NOT NULL DEFAULT 1);
+        CREATE UNIQUE INDEX idx_lookups_type_value ON lookups (type, value);
+        INSERT INTO lookups (type, value, active) VALUES ('object', 'Šabac', 0), ('object', 'Zemun', 1);
+    """)
+    gate_app._migrate_lookups_collation(old)
+    assert "COLLATE SR" not in old.execute("SELECT group_concat(sql) FROM sqlite_master").fetchone()[0]
+    assert old.execute(
+        "SELECT value, active FROM lookups WHERE type = 'object' ORDER BY id"
+    ).fetchall() == [("Šabac", 0), ("Zemun", 1)]
+    old.close()
+
+    init_db()
+    # bazu otvara i alat bez kolacije aplikacije (sqlite3 CLI, backup, integrity_check)
+    plain = sqlite3.connect(gate_app.DB_PATH)
+    assert plain.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    plain.execute("SELECT value FROM lookups ORDER BY type, value").fetchall()
+    plain.close()
+
+    conn = gate_app.get_db()
+    for sql in (
+        "SELECT type, value FROM lookups WHERE active = 1 ORDER BY type, value",
+        "SELECT id, value, active FROM lookups WHERE type = 'employee' ORDER BY value",
+    ):
+        plan = " ".join(r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql))
+        assert "USING" in plan and "TEMP B-TREE" not in plan, plan
+    conn.close()
+
+    with app.test_client() as client:
+        _login(client)
+        url = "/admin/lookups?form=kamioni_unos&field=destination"
+        for _ in range(2):
+            client.post(url, data={"new_value": "Rampa Šabac"})
+        conn = gate_app.get_db()
+        rows = conn.execute(
+            "SELECT id, active FROM lookups WHERE type = 'destination' AND value = 'Rampa Šabac'"
+        ).fetchall()
+        conn.close()
+        assert len(rows) == 1
+
+        client.post(url, data={"toggle_id": rows[0]["id"]})
+        assert "Rampa Šabac" not in client.get("/kamioni/unos").get_data(as_text=True)
+        assert "<s>Rampa Šabac</s>" in client.get(url).get_data(as_text=True)
+        client.post(url, data={"new_value": "Rampa Šabac"})
+        assert "Rampa Šabac" in client.get("/kamioni/unos").get_data(as_text=True)
+
+
+def test_init_db_is_versioned_and_cheap_on_current_schema() -> None:
+    init_db()
+    conn = gate_app.get_db()
+    assert gate_app.schema_version(conn) == gate_app.SCHEMA_VERSION
+    conn.close()
+
+    hashed = []
+    original_hash = gate_app.generate_password_hash
+    gate_app.generate_password_hash = lambda *a, **kw: hashed.append(a) or original_hash(*a, **kw)
+    try:
+        with _traced_sql() as statements:
+            init_db()
+    finally:
+        gate_app.generate_password_hash = original_hash
+    assert hashed == []
+    assert not [sql for sql in statements if re.match(r"\s*(CREATE|ALTER|INSERT|UPDATE|DELETE|BEGIN)", sql)], statements
+
+    # stara baza bez user_version i bez novijih kolona se dovodi na tekuću verziju
+    path = os.path.join(_TEST_DIR, "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE visits (id INTEGER PRIMARY KEY AUTOINCREMENT, arrival_date TEXT NOT NULL,
+            expected_time TEXT, host_employee TEXT NOT NULL, phone TEXT, object_name TEXT NOT NULL,
+            guest_name TEXT NOT NULL, document_number TEXT, vehicle_plate TEXT, note TEXT,
+            persons_count INTEGER, entry_time TEXT, exit_time TEXT);
+        CREATE TABLE trucks (id INTEGER PRIMARY KEY AUTOINCREMENT, driver_name TEXT NOT NULL,
+            driver_document TEXT, codriver_name TEXT, codriver_document TEXT, plate TEXT NOT NULL,
+            destination TEXT NOT NULL, arrival_date TEXT NOT NULL, arrival_time TEXT NOT NULL,
+            departure_datetime TEXT);
+        CREATE TABLE lookups (id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, value TEXT NOT NULL);
+        INSERT INTO lookups (type, value) VALUES ('object', 'Skladište'), ('object', 'Skladište');
+        INSERT INTO visits (arrival_date, host_employee, object_name, guest_name)
+        VALUES ('2024-03-01', 'Maja Bogunović', 'Skladište', 'Stari Gost');
+    """)
+    legacy.close()
+
+    original_path = gate_app.DB_PATH
+    gate_app.DB_PATH = path
+    try:
+        init_db()
+        conn = gate_app._connect()
+        assert gate_app.schema_version(conn) == gate_app.SCHEMA_VERSION
+        assert "status" in gate_app._table_columns(conn, "main", "visits")
+        assert "driver_phone" in gate_app._table_columns(conn, "main", "trucks")
+        assert conn.execute("SELECT COUNT(*) FROM lookups WHERE type = 'object'").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == len(gate_app.DEFAULT_USERS)
+        assert conn.execute("SELECT COUNT(*) FROM visits_fts WHERE visits_fts MATCH 'stari'").fetchone()[0] == 1
+        conn.close()
+    finally:
+        gate_app.DB_PATH = original_path
+
+
+# budžet za hladan start FastCGI workera (import run.py, uključujući init_db)
+STARTUP_BUDGET_MS = float(os.environ.get("GATE_APP_STARTUP_BUDGET_MS", "1000"))
+
+
+def _importtime(module: str) -> dict:
+    """python -X importtime u novom procesu -> {modul: kumulativno µs}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            times[match.group(3)] = int(match.group(1))
+    return times
+
+
+def test_cold_start_stays_within_budget() -> None:
+    init_db()
+    _importtime("run")  # prvi prolaz puni __pycache__
+    times = min((_importtime("run") for _ in range(3)), key=lambda t: t["run"])
+    assert times["run"] / 1000 < STARTUP_BUDGET_MS, times["run"]
+    # export/uvoz biblioteke se ne učitavaju pri startu workera
+    for module in ("openpyxl", "xlsx_stream", "visit_import"):
+        assert module not in times, module
+
+    # šabloni se posle migracije/prvog renderovanja čitaju iz bytecode keša
+    gate_app.precompile_templates()
+    assert any(name.endswith(".cache") for name in os.listdir(gate_app.JINJA_CACHE_DIR))
+
+
+def test_portirnica_lists_answer_304_until_their_data_changes() -> None:
+    init_db()
+    _insert_visits(1)
+    gate_app.bump_data_version()  # upis mimo ruta (kao CLI uvoz)
+    conn = gate_app.get_db()
+    visit_id = conn.execute(
+        "SELECT id FROM visits WHERE arrival_date = ? AND entry_time IS NULL ORDER BY id DESC LIMIT 1",
+        (date.today().isoformat(),),
+    ).fetchone()[0]
+    conn.close()
+
+    client = app.test_client()
+    _login(client)
+    first = client.get("/posete/portirnica")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers.get("Last-Modified")
+    assert f'id="visit-{visit_id}"' in first.get_data(as_text=True)
+
+    with _traced_sql() as statements:
+        again = client.get("/posete/portirnica", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.get_data() == b""
+    assert statements == [], statements
+
+    # izmena kamiona ne menja listu poseta
+    client.post("/kamioni/unos", data={
+        "driver_name": "Etag Vozač", "driver_document": "", "codriver_name": "",
+        "codriver_document": "", "plate": "NS-304-ET", "destination": "Skladište",
+    })
+    assert client.get("/posete/portirnica", headers={"If-None-Match": etag}).status_code == 304
+    truck_page = client.get("/kamioni/portirnica")
+    assert "NS-304-ET" in truck_page.get_data(as_text=True)
+
+    # drugi korisnik: nova stranica, ali telo tabele iz keša fragmenata
+    other = app.test_client()
+    _login(other, "dragisa.removic@logistar.rs")
+    with _traced_sql() as statements:
+        resp = other.get("/posete/portirnica", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+    assert not [sql for sql in statements if "visits" in sql], statements
+
+    client.post(f"/posete/evidentiraj-ulaz/{visit_id}")
+    changed = client.get("/posete/portirnica", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert f"/posete/evidentiraj-izlaz/{visit_id}" in changed.get_data(as_text=True)
+
+
+def test_static_assets_are_local_fingerprinted_and_precompressed() -> None:
+    import gzip
+    import static_assets
+
+    init_db()
+    # nijedan šablon ne vuče fajlove sa CDN-a
+    template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+    for name in os.listdir(template_dir):
+        with open(os.path.join(template_dir, name), encoding="utf-8") as f:
+            text = re.sub(r'xmlns(:\w+)?="[^"]*"', "", f.read())
+        assert not re.search(r"https?://", text), name
+    assert static_assets.stale_precompressed() == []
+
+    client = app.test_client()
+    _login(client)
+    page = client.get("/posete/portirnica").get_data(as_text=True)
+    css_url = re.search(r'href="(/assets/[0-9a-f]{12}/vendor/bootstrap/bootstrap\.min\.css)"', page).group(1)
+    assert '"emptyTable"' in page  # prevod DataTables je u stranici
+    # isti fajlovi kao ranije sa CDN-a: bundle sa Popper-om, DataTables core + BS5
+    for name in ("bootstrap.bundle.min.js", "jquery.dataTables.min.js", "dataTables.bootstrap5.min.js",
+                 "dataTables.bootstrap5.min.css"):
+        assert f"/{name}\"" in page, name
+    assert "popper" not in page
+
+    plain = client.get(css_url)
+    assert plain.status_code == 200 and plain.mimetype == "text/css"
+    assert "immutable" in plain.headers["Cache-Control"] and "max-age=31536000" in plain.headers["Cache-Control"]
+    assert "Content-Encoding" not in plain.headers
+    packed = client.get(css_url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert packed.headers["Content-Encoding"] == "gzip" and packed.mimetype == "text/css"
+    assert gzip.decompress(packed.get_data()) == plain.get_data()
+    assert len(packed.get_data()) < len(plain.get_data()) / 3
+
+    # fontovi ikonica dele prefiks sa CSS-om koji ih referencira
+    icons_url = re.search(r'href="(/assets/[^"]+/bootstrap-icons\.min\.css)"', page).group(1)
+    font = client.get(icons_url.rsplit("/", 1)[0] + "/fonts/bootstrap-icons.woff2")
+    assert font.status_code == 200 and "immutable" in font.headers["Cache-Control"]
+
+    stale = client.get(css_url.replace(css_url.split("/")[2], "0" * 12))
+    assert stale.status_code == 200 and "immutable" not in stale.headers["Cache-Control"]
+    assert client.get("/assets/0/../app.py").status_code == 404
+
+
+def test_responses_are_compressed_by_negotiation() -> None:
+    import gzip
+    import zlib
+    import compression
+
+    init_db()
+    _insert_visits(60)
+    assert compression.negotiate("gzip, deflate") == "gzip"
+    assert compression.negotiate("deflate, gzip;q=0.5") == "deflate"
+    assert compression.negotiate("identity, gzip;q=0") is None
+
+    client = app.test_client()
+    _login(client)
+    url = "/security/posete/data?draw=1&start=0&length=50"
+    plain = client.get(url)
+    packed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers and "Accept-Encoding" in plain.headers["Vary"]
+    assert packed.headers["Content-Encoding"] == "gzip"
+    body = packed.get_data()
+    assert int(packed.headers["Content-Length"]) == len(body)
+    assert gzip.decompress(body) == plain.get_data()
+    assert len(body) * 4 < len(plain.get_data())
+    saved = gate_app.compression.snapshot()["security_posete_data"]
+    assert saved["bytes_saved"] >= len(plain.get_data()) - len(body)
+
+    # XLSX je već zip, .gz statički fajl već ima Content-Encoding
+    export = client.get("/security/posete/export", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in export.headers
+    export.close()
+
+    # portirnica: sabijena strana nosi slab ETag i i dalje dobija 304
+    page = client.get("/posete/portirnica", headers={"Accept-Encoding": "gzip"})
+    etag = page.headers["ETag"]
+    assert etag.startswith("W/") and page.headers["Content-Encoding"] == "gzip"
+    again = client.get("/posete/portirnica", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+
+    # odgovor bez dužine: svaki blok se može raspakovati čim stigne
+    def streaming_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/event-stream")])
+        return iter([b"data: prvi\n\n", b"data: drugi\n\n"])
+
+    middleware = compression.CompressionMiddleware(streaming_app)
+    body = middleware({"HTTP_ACCEPT_ENCODING": "deflate"}, lambda status, headers, exc_info=None: None)
+    decoder = zlib.decompressobj()
+    chunks = [decoder.decompress(chunk) for chunk in body]
+    body.close()
+    assert chunks[:2] == [b"data: prvi\n\n", b"data: drugi\n\n"]
+    assert middleware.snapshot()["-"]["bytes_in"] == len(b"".join(chunks))
+
+
+def test_request_metrics_in_prometheus_format() -> None:
+    import logging
+    import instrumentation
+
+    init_db()
+    db_pool.close_all()  # konekcije iz _traced_sql imaju drugi trace callback
+    gate_app.request_metrics.reset()
+    client = app.test_client()
+    _login(client)
+    client.get("/posete/portirnica")
+
+    slow = []
+    handler = logging.Handler()
+    handler.emit = lambda record: slow.append(record.getMessage())
+    instrumentation.log.addHandler(handler)
+    threshold, instrumentation.SLOW_QUERY_MS = instrumentation.SLOW_QUERY_MS, 0
+    try:
+        client.get("/security/posete/data?draw=1&start=0&length=10&host=lakovic")
+    finally:
+        instrumentation.SLOW_QUERY_MS = threshold
+        instrumentation.log.removeHandler(handler)
+    # oblik parametara, ne vrednosti
+    assert any("params=(str" in line for line in slow), slow
+    assert not any("lakovic" in line.split("params=")[1] for line in slow)
+
+    resp = client.get("/admin/metrics")
+    assert resp.mimetype == "text/plain"
+    metrics = {}
+    for line in resp.get_data(as_text=True).splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            metrics[name] = float(value)
+    label = '{endpoint="posete_portirnica"}'
+    assert metrics["gate_app_request_duration_seconds_count" + label] == 1
+    assert metrics['gate_app_request_duration_seconds_bucket{endpoint="posete_portirnica",le="+Inf"}'] == 1
+    assert metrics['gate_app_request_sql_statements_sum{endpoint="security_posete_data"}'] >= 3
+    assert metrics['gate_app_request_connections_total{endpoint="security_posete_data"}'] == 1
+    assert metrics["gate_app_request_render_seconds_total" + label] > 0
+    assert metrics["gate_app_request_auth_seconds_total" + label] > 0
+    assert metrics['gate_app_request_slow_queries_total{endpoint="security_posete_data"}'] >= 1
+    assert metrics["gate_app_db_pool_acquired_total"] >= 2
+
+    other = app.test_client()
+    _login(other, "dragisa.removic@logistar.rs")
+    assert other.get("/admin/metrics").status_code == 302
+
+
+def test_synthetic_data_is_deterministic_and_realistic() -> None:
+    import synthetic_data
+
+    today = date(2026, 3, 4)  # sreda
+
+    def build(name):
+        path = os.path.join(_TEST_DIR, name)
+        original_path = gate_app.DB_PATH
+        gate_app.DB_PATH = path
+        try:
+            init_db()
+            conn = gate_app._connect()
+            result = synthetic_data.generate(conn, 3000, years=1, seed=7, today=today)
+            assert synthetic_data.generated_params(conn) == result["params"]
+            return conn, result
+        finally:
+            gate_app.DB_PATH = original_path
+
+    first, result = build("synthetic_a.db")
+    second, _ = build("synthetic_b.db")
+    dump = "SELECT * FROM visits ORDER BY id"
+    assert first.execute(dump).fetchall() == second.execute(dump).fetchall()
+    second.close()
+    assert result["visits"] >= 3000 and result["trucks"] > 0
+
+    weekend = first.execute(
+        "SELECT COUNT(*) FROM visits WHERE strftime('%w', arrival_date) IN ('0', '6')"
+    ).fetchone()[0]
+    assert weekend < result["visits"] * 0.1
+    # ponavljajuće serije: isti gost kod istog domaćina bar 4 puta
+    assert first.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM visits GROUP BY guest_name, host_employee, object_name "
+        "HAVING COUNT(*) >= 4)"
+    ).fetchone()[0] > 0
+    # danas: deo gostiju je još unutra, budući dani su samo najave
+    assert first.execute("SELECT COUNT(*) FROM on_site WHERE entity = 'visit'").fetchone()[0] > 0
+    assert first.execute(
+        "SELECT COUNT(*) FROM visits WHERE arrival_date > ? AND entry_time IS NOT NULL", (today.isoformat(),)
+    ).fetchone()[0] == 0
+    first.close()
+
+
 if __name__ == "__main__":
     run_basic_tests()
+    test_db_pool_reuses_connections()
+    test_wal_readers_do_not_block_gate_writers()
+    test_hot_queries_use_indexes()
+    test_security_datatables_keyset_paging()
+    test_security_export_is_streamed_xlsx()
+    test_fts_search_ignores_diacritics_and_tracks_updates()
+    test_lookup_cache_serves_forms_without_sql()
+    test_user_identity_cached_and_deactivation_cuts_off()
+    test_recurring_announcement_expands_weekdays()
+    test_portirnica_stream_pushes_gate_changes()
+    test_portirnica_stream_is_capped_across_processes()
+    test_gate_writer_group_commits_concurrent_clicks()
+    test_gate_events_log_and_on_site_table()
+    test_gate_events_migration_keeps_log_and_adds_fixes()
+    test_occupancy_counters_and_reconcile()
+    test_archive_moves_closed_records_and_security_reads_across()
+    test_stats_rollups_follow_closing_edits_and_archiving()
+    test_bulk_visit_import_csv_and_xlsx()
+    test_lookup_sync_applies_diff_and_skips_unchanged_file()
+    test_lookups_unique_serbian_order_and_retire()
+    test_init_db_is_versioned_and_cheap_on_current_schema()
+    test_cold_start_stays_within_budget()
+    test_portirnica_lists_answer_304_until_their_data_changes()
+    test_static_assets_are_local_fingerprinted_and_precompressed()
+    test_responses_are_compressed_by_negotiation()
+    test_request_metrics_in_prometheus_format()
+    test_synthetic_data_is_deterministic_and_realistic()
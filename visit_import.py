@@ -0,0 +1,255 @@
+"""Masovni uvoz najavljenih poseta iz XLSX ili CSV fajla.
+
+Zaglavlja su ista kao u exportu "Baza poseta" (Datum najave, Očekivano
+vreme, Kod koga dolazi, Objekat, Gost, ...), pa se export može izmeniti i
+vratiti. Redovi se čitaju jedan po jedan (openpyxl read-only / csv), a
+upisuju u blokovima po IMPORT_BATCH_SIZE u zasebnim transakcijama.
+
+Pokretanje iz komandne linije:
+    python visit_import.py fajl.xlsx --created-by ime.prezime@logistar.rs
+"""
+import csv
+import io
+import os
+import re
+from datetime import date, datetime, time
+
+IMPORT_BATCH_SIZE = 1000
+# greške se pamte do ove granice (ukupan broj se i dalje broji)
+IMPORT_MAX_ERRORS = 500
+
+# kolona u bazi -> prihvaćena zaglavlja (mala slova)
+IMPORT_COLUMNS = {
+    "arrival_date": ("datum najave", "datum"),
+    "expected_time": ("očekivano vreme", "vreme"),
+    "host_employee": ("kod koga dolazi", "domaćin"),
+    "object_name": ("objekat",),
+    "guest_name": ("gost", "ime gosta"),
+    "phone": ("telefon",),
+    "document_number": ("broj dokumenta", "dokument"),
+    "vehicle_plate": ("registracija",),
+    "persons_count": ("broj osoba",),
+    "note": ("napomena",),
+}
+REQUIRED_COLUMNS = ("arrival_date", "host_employee", "object_name", "guest_name")
+
+_INSERT_SQL = """
+    INSERT INTO visits (
+        created_by, arrival_date, expected_time, host_employee, phone, object_name,
+        guest_name, document_number, vehicle_plate, note, persons_count
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class VisitImportError(ValueError):
+    """Fajl se ne može uvesti (format, zaglavlje)."""
+
+
+def _iter_xlsx(stream):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        text.detach()
+
+
+def iter_rows(filename: str, stream):
+    """Redovi fajla kao tuple vrednosti (prvi red je zaglavlje)."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".xlsx":
+        return _iter_xlsx(stream)
+    if ext == ".csv":
+        return _iter_csv(stream)
+    raise VisitImportError("Podržani su samo .xlsx i .csv fajlovi.")
+
+
+def _header_map(header) -> dict:
+    names = [str(h or "").strip().lower() for h in header]
+    mapping = {}
+    for column, aliases in IMPORT_COLUMNS.items():
+        for i, name in enumerate(names):
+            if name in aliases:
+                mapping[column] = i
+                break
+    missing = [IMPORT_COLUMNS[c][0] for c in REQUIRED_COLUMNS if c not in mapping]
+    if missing:
+        raise VisitImportError("Nedostaju kolone: " + ", ".join(missing))
+    return mapping
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+_DMY = re.compile(r"^(\d{1,2})[./](\d{1,2})[./](\d{4})$")
+_HM = re.compile(r"^(\d{1,2})[:.](\d{2})(?::\d{2})?$")
+
+
+def parse_date(value) -> str:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    text = _text(value).rstrip(".")
+    try:
+        m = _DMY.match(text)
+        if m:
+            return date(int(m.group(3)), int(m.group(2)), int(m.group(1))).isoformat()
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        raise ValueError(f"neispravan datum '{_text(value)}'") from None
+
+
+def parse_time(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (datetime, time)):
+        return value.strftime("%H:%M")
+    text = _text(value)
+    m = _HM.match(text)
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+        raise ValueError(f"neispravno vreme '{text}'")
+    return f"{int(m.group(1)):02d}:{m.group(2)}"
+
+
+def _validate(values, mapping, employees, objects, created_by):
+    def get(column):
+        i = mapping.get(column)
+        return values[i] if i is not None and i < len(values) else None
+
+    arrival_date = parse_date(get("arrival_date"))
+    host = _text(get("host_employee"))
+    object_name = _text(get("object_name"))
+    guest = _text(get("guest_name"))
+    if not host or not object_name or not guest:
+        raise ValueError("domaćin, objekat i gost su obavezni")
+    if host not in employees:
+        raise ValueError(f"nepoznat domaćin '{host}'")
+    if object_name not in objects:
+        raise ValueError(f"nepoznat objekat '{object_name}'")
+
+    persons = _text(get("persons_count"))
+    if persons:
+        if not persons.isdigit() or int(persons) < 1:
+            raise ValueError(f"neispravan broj osoba '{persons}'")
+        persons = int(persons)
+
+    return (
+        created_by,
+        arrival_date,
+        parse_time(get("expected_time")),
+        host,
+        _text(get("phone")),
+        object_name,
+        guest,
+        _text(get("document_number")),
+        _text(get("vehicle_plate")),
+        _text(get("note")),
+        persons or None,
+    )
+
+
+def import_visits(conn, rows, created_by, employees, objects, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Validira i upisuje redove; vraća {"inserted", "error_count", "errors": [(red, poruka)]}.
+
+    employees/objects su skupovi dozvoljenih vrednosti iz lookups tabele.
+    Ispravni redovi se upisuju i kada neki drugi redovi imaju greške.
+    """
+    rows = iter(rows)
+    try:
+        mapping = _header_map(next(rows))
+    except StopIteration:
+        raise VisitImportError("Fajl je prazan.")
+
+    result = {"inserted": 0, "error_count": 0, "errors": []}
+    batch = []
+
+    def flush():
+        conn.executemany(_INSERT_SQL, batch)
+        conn.commit()
+        result["inserted"] += len(batch)
+        batch.clear()
+
+    for row_number, values in enumerate(rows, start=2):
+        if not any(_text(v) for v in values):
+            continue
+        try:
+            batch.append(_validate(values, mapping, employees, objects, created_by))
+        except ValueError as exc:
+            result["error_count"] += 1
+            if len(result["errors"]) < IMPORT_MAX_ERRORS:
+                result["errors"].append((row_number, str(exc)))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def lookup_values(conn, lookup_type: str) -> set:
+    return {r[0] for r in conn.execute("SELECT value FROM lookups WHERE type = ? AND active = 1", (lookup_type,))}
+
+
+def main(argv=None) -> None:
+    import argparse
+
+    from app import bump_data_version, get_db, init_db
+
+    parser = argparse.ArgumentParser(description="Masovni uvoz najavljenih poseta (XLSX/CSV).")
+    parser.add_argument("path")
+    parser.add_argument(
+        "--created-by", required=True,
+        help="email aktivnog korisnika koji se upisuje kao autor najave (vidi ih u Moje najave)",
+    )
+    args = parser.parse_args(argv)
+    created_by = args.created_by.strip().lower()
+
+    init_db()
+    conn = get_db()
+    try:
+        if not conn.execute(
+            "SELECT 1 FROM users WHERE email = ? AND is_active = 1", (created_by,)
+        ).fetchone():
+            parser.error(f"--created-by: nema aktivnog korisnika {created_by}")
+        with open(args.path, "rb") as f:
+            result = import_visits(
+                conn,
+                iter_rows(args.path, f),
+                created_by,
+                lookup_values(conn, "employee"),
+                lookup_values(conn, "object"),
+            )
+    finally:
+        conn.close()
+    if result["inserted"]:
+        bump_data_version("visit")
+
+    for row_number, message in result["errors"]:
+        print(f"red {row_number}: {message}")
+    print(f"Uvezeno poseta: {result['inserted']}, redova sa greškom: {result['error_count']}")
+
+
+if __name__ == "__main__":
+    main()
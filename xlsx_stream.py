@@ -0,0 +1,125 @@
+"""Streaming XLSX writer za velike exporte.
+
+Radni list se piše direktno kao SpreadsheetML (inline stringovi) u zip
+arhivu koja se ne premotava, tako da se bajtovi mogu slati klijentu dok
+se redovi još čitaju iz baze. Memorija zavisi od veličine jednog bloka
+redova, a ne od ukupnog broja redova.
+"""
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# znakovi koji nisu dozvoljeni u XML 1.0
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+_SHEET_HEAD = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+
+_SHEET_TAIL = "</sheetData></worksheet>"
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Fajl-objekat koji samo skuplja upisane bajtove do sledećeg yield-a."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+_COLUMN_LETTERS = [_column_letter(i) for i in range(64)]
+
+
+def _cell_xml(ref: str, value) -> str:
+    # prazne ćelije se preskaču, zato svaka ćelija nosi svoju adresu (r="B7")
+    if value is None or value == "":
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row_xml(row_number: int, values) -> str:
+    cells = "".join(
+        _cell_xml(f"{_COLUMN_LETTERS[i]}{row_number}", v) for i, v in enumerate(values)
+    )
+    return f'<row r="{row_number}">{cells}</row>'
+
+
+def iter_xlsx(sheet_title: str, headers, row_chunks):
+    """Generator bajtova XLSX fajla.
+
+    row_chunks je iterabla blokova redova (npr. rezultati cursor.fetchmany),
+    posle svakog bloka šalje se ono što je kompresovano do tada.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(title=escape(sheet_title, {'"': "&quot;"})))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_HEAD + _row_xml(1, headers)).encode("utf-8"))
+            row_number = 1
+            for chunk in row_chunks:
+                parts = []
+                for values in chunk:
+                    row_number += 1
+                    parts.append(_row_xml(row_number, values))
+                sheet.write("".join(parts).encode("utf-8"))
+                data = sink.pop()
+                if data:
+                    yield data
+            sheet.write(_SHEET_TAIL.encode("utf-8"))
+
+    yield sink.pop()